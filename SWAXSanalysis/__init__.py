@@ -31,6 +31,8 @@ DTC_PATH: Path      = ENV_PATH / "Data Treatment Center"
 CONF_PATH: Path     = DTC_PATH / "Configs"
 TREATED_PATH: Path  = DTC_PATH / "Treated Data"
 IPYNB_PATH: Path    = DTC_PATH / "Jupyter notebooks"
+INDEX_PATH: Path    = DTC_PATH / "conversion_index.jsonl"
+COST_PATH: Path     = DTC_PATH / "process_costs.json"
 
 QUEUE_PATH: Path    = ENV_PATH / "Treatment Queue"
 
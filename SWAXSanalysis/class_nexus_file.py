@@ -4,25 +4,60 @@ to treat raw data contained in a .h5 file formated according
 to the NXcanSAS standard
 """
 import copy
+import csv
+import functools
 import inspect
+import math
 import os
 import re
 import shutil
 import time
 import warnings
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
+from typing import Callable
 
 import matplotlib.pyplot as plt
-from matplotlib.cm import ScalarMappable
+from matplotlib.collections import LineCollection
 from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
 
 from smi_analysis import SMI_beamline
 
 from . import PLT_CMAP, PLT_CMAP_OBJ, FONT_PLT
+from .integration import get_csr_integrator
 from .utils import *
 
 plt.rcParams.update(FONT_PLT)
 
+# Fraction of a file that has to be unused for nexus_close to repack it
+REPACK_FREE_SPACE_RATIO = 0.25
+
+# Number of geometries whose integrators are kept, see set_integrators
+GEOMETRY_CACHE_SIZE = 16
+_integrator_cache = OrderedDict()
+
+# Number of frames integrated by a single product with the csr engine
+CSR_BATCH_SIZE = 64
+
+# Number of values used to compute the color range of a 2D display
+PERCENTILE_SAMPLES = 2 ** 18
+
+# Formats in which the displays can be exported, see NexusFile
+EXPORT_FORMATS = ("png", "svg", "pdf")
+
+# Maximum length of the name of the display in the name of an exported figure
+EXPORT_NAME_LENGTH = 64
+
+# Number of exported figures waiting for a worker, per worker
+EXPORT_QUEUE_SIZE = 2
+
+# Number of direct beam files whose count rate is kept, see db_count_rate
+DB_CACHE_SIZE = 16
+_db_count_rate_cache = OrderedDict()
+
 
 def repack_hdf5(
         input_file: str | Path,
@@ -39,7 +74,7 @@ def repack_hdf5(
     output_file :
         Path to the output (repacked) HDF5 file.
     """
-    with h5py.File(input_file, 'r') as src, h5py.File(output_file, 'w') as dest:
+    with h5py.File(input_file, 'r') as src, h5py.File(output_file, 'w', **H5_FILE_SPACE_OPTIONS) as dest:
         src.copy("/ENTRY", dest)
     os.remove(input_file)
     shutil.move(output_file, input_file)
@@ -85,7 +120,9 @@ def create_process(
 
 def extract_smi_param(
         h5obj: h5py.File,
-        input_data_group: str
+        input_data_group: str,
+        load_raw_data: bool = True,
+        frame: None | int = None
 ) -> dict:
     """
     Extract the parameters used by SMI from an hdf5 object.
@@ -98,6 +135,14 @@ def extract_smi_param(
     input_data_group :
         Data group used to extract parameters
 
+    load_raw_data :
+        If False, the intensity and positions of the data group are not
+        read, only their shape is checked
+
+    frame :
+        Index of the frame used if the data group is a stack of frames,
+        only this frame is read. None if the data group is a single frame
+
     Returns :
         parameters used by SMI
     -------
@@ -113,17 +158,32 @@ def extract_smi_param(
             f"is not a node of the current file"
         )
 
-    intensity_data = [h5obj[f"ENTRY/{input_data_group}/I"][:]]
-
-    if len(np.shape(intensity_data[0])) != 2:
+    intensity_shape = h5obj[f"ENTRY/{input_data_group}/I"].shape
+    if frame is None and len(intensity_shape) != 2:
         raise TypeError(
             f"The shape of the data in ENTRY/{input_data_group} "
-            f"is not 2 dimensional"
+            f"is not 2 dimensional, give the frame to use if it is a stack"
         )
+    if frame is not None:
+        if len(intensity_shape) != 3:
+            raise TypeError(
+                f"The data in ENTRY/{input_data_group} is not a stack of frames"
+            )
+        if not 0 <= frame < intensity_shape[0]:
+            raise IndexError(
+                f"The frame {frame} is not in ENTRY/{input_data_group}, "
+                f"it contains {intensity_shape[0]} frames"
+            )
 
-    position_data = [h5obj[f"ENTRY/{input_data_group}/Q"][:]]
-    dict_parameters["I raw data"] = intensity_data
-    dict_parameters["R raw data"] = position_data
+    if load_raw_data:
+        intensity_selection = None if frame is None else np.s_[frame]
+        intensity_data = [
+            extract_from_h5(h5obj, f"ENTRY/{input_data_group}/I", selection=intensity_selection)
+        ]
+        position_data = [extract_from_h5(h5obj, f"ENTRY/{input_data_group}/Q")]
+        dict_parameters["I raw data"] = intensity_data
+        dict_parameters["R raw data"] = position_data
+    dict_parameters["compact grid"] = is_compact_grid(h5obj[f"ENTRY/{input_data_group}/Q"])
 
     # Concerning the source
     wavelength = extract_from_h5(h5obj, "ENTRY/INSTRUMENT/SOURCE/incident_wavelength")
@@ -179,6 +239,663 @@ def extract_smi_param(
     return dict_parameters
 
 
+def geometry_key(
+        dict_parameters: dict
+) -> tuple:
+    """
+    Builds the key identifying the geometry of a file, files sharing
+    the same key can share their integrators
+
+    Parameters
+    ----------
+    dict_parameters :
+        Parameters of the file, as returned by extract_smi_param
+
+    Returns
+    -------
+    The key of the geometry
+    """
+    return (
+        dict_parameters["detector name"],
+        float(dict_parameters["distance"]),
+        float(dict_parameters["wavelength"]),
+        tuple(float(value) for value in dict_parameters["beam center"]),
+        tuple(
+            tuple(float(angle) for angle in np.ravel(rotation))
+            for rotation in dict_parameters["detector rotation"]
+        )
+    )
+
+
+def set_integrators(
+        smi_data: SMI_beamline.SMI_geometry,
+        dict_parameters: dict
+) -> None:
+    """
+    Gives its transmission integrators to an SMI geometry. They are computed
+    once per geometry and then shared by every file and process using it,
+    along with the q maps pyFAI caches in them
+
+    Parameters
+    ----------
+    smi_data :
+        The SMI geometry
+
+    dict_parameters :
+        Parameters of the file, as returned by extract_smi_param
+    """
+    key = geometry_key(dict_parameters)
+    integrators = _integrator_cache.get(key)
+    if integrators is None:
+        smi_data.calculate_integrator_trans(dict_parameters["detector rotation"])
+        _integrator_cache[key] = smi_data.ai
+        if len(_integrator_cache) > GEOMETRY_CACHE_SIZE:
+            _integrator_cache.popitem(last=False)
+    else:
+        _integrator_cache.move_to_end(key)
+        smi_data.ai = list(integrators)
+
+
+def beam_roi_size(
+        h5obj: h5py.File
+) -> tuple[int, int]:
+    """
+    Gives the half width and half height in pixels of the region of interest
+    covering the beam, from the beam size of the source and the pixel size
+    of the detector. It is at least 1 pixel
+
+    Parameters
+    ----------
+    h5obj :
+        opened h5 file that contains the parameters
+
+    Returns
+    -------
+    The (x, y) half sizes in pixels
+    """
+    roi_size = []
+    for axis in ["x", "y"]:
+        beam_path = f"ENTRY/INSTRUMENT/SOURCE/beam_size_{axis}"
+        pixel_path = f"ENTRY/INSTRUMENT/DETECTOR/{axis}_pixel_size"
+        beam_size = float(extract_from_h5(h5obj, beam_path))
+        pixel_size = float(extract_from_h5(h5obj, pixel_path))
+        beam_unit = extract_from_h5(h5obj, beam_path, "attribute", "units") or "arbitrary"
+        pixel_unit = extract_from_h5(h5obj, pixel_path, "attribute", "units") or "arbitrary"
+
+        beam_size = convert(beam_size, str(beam_unit), str(pixel_unit))
+        if beam_size <= 0:
+            warnings.warn(
+                f"The beam size along {axis} is {beam_size}, the region of interest is reduced to 1 pixel"
+            )
+        roi_size.append(max(math.ceil(beam_size / 2 / pixel_size), 1))
+    return roi_size[0], roi_size[1]
+
+
+def roi_window(
+        beam_center: tuple[float, float] | list[float],
+        roi_size: tuple[float, float] | list[float],
+        shape: tuple[int, int]
+) -> tuple[slice, slice]:
+    """
+    Gives the window of a region of interest centered on the beam,
+    clipped to the frame
+
+    Parameters
+    ----------
+    beam_center :
+        Position (x, y) of the beam center in pixels
+
+    roi_size :
+        Half width and half height (x, y) of the region of interest in pixels,
+        they are rounded up
+
+    shape :
+        Shape (height, width) of the frame
+
+    Returns
+    -------
+    The (row, column) slices of the region of interest
+    """
+    if roi_size[0] <= 0 or roi_size[1] <= 0:
+        raise ValueError(
+            f"The half sizes of the region of interest are given in pixels and must be positive, "
+            f"got ({roi_size[0]}, {roi_size[1]}) pixels"
+        )
+
+    half_width, half_height = math.ceil(roi_size[0]), math.ceil(roi_size[1])
+    center_x, center_y = int(round(beam_center[0])), int(round(beam_center[1]))
+    rows = slice(max(center_y - half_height, 0), min(center_y + half_height, shape[0]))
+    columns = slice(max(center_x - half_width, 0), min(center_x + half_width, shape[1]))
+    if rows.start >= rows.stop or columns.start >= columns.stop:
+        raise ValueError(
+            f"The region of interest around the beam center {beam_center} is outside the frame"
+        )
+    return rows, columns
+
+
+def db_count_rate(
+        db_path: str | Path,
+        roi_size: tuple[int, int] | None = None
+) -> float:
+    """
+    Gives the count rate of a direct beam file, the sum of its intensity
+    divided by its exposition time. It is computed once per file, modification
+    time and region of interest
+
+    Parameters
+    ----------
+    db_path :
+        Path of the hdf5 file of the direct beam
+
+    roi_size :
+        Half width and half height in pixels of the region of interest around
+        the beam center, only this region is read. If None, the whole frame is used
+
+    Returns
+    -------
+    The count rate of the direct beam
+    """
+    db_path = Path(db_path).absolute()
+    key = (str(db_path), db_path.stat().st_mtime_ns, None if roi_size is None else tuple(roi_size))
+    count_rate = _db_count_rate_cache.get(key)
+    if count_rate is None:
+        with h5py.File(db_path) as h5obj:
+            if roi_size is None:
+                raw_db = extract_from_h5(h5obj, "ENTRY/DATA/I")
+            else:
+                beam_center = (
+                    extract_from_h5(h5obj, "ENTRY/INSTRUMENT/DETECTOR/beam_center_x"),
+                    extract_from_h5(h5obj, "ENTRY/INSTRUMENT/DETECTOR/beam_center_y")
+                )
+                window = roi_window(beam_center, roi_size, h5obj["ENTRY/DATA/I"].shape)
+                raw_db = extract_from_h5(h5obj, "ENTRY/DATA/I", selection=window)
+            time_db = extract_from_h5(h5obj, "ENTRY/COLLECTION/exposition_time")
+            if time_db == 0:
+                warnings.warn("Exposition time for DB data was 0, changed to 1")
+                time_db = 1
+
+        count_rate = np.sum(raw_db) / time_db
+        _db_count_rate_cache[key] = count_rate
+        if len(_db_count_rate_cache) > DB_CACHE_SIZE:
+            _db_count_rate_cache.popitem(last=False)
+    else:
+        _db_count_rate_cache.move_to_end(key)
+    return count_rate
+
+
+def display_range_max(
+        values: np.ndarray,
+        percentile: float | int
+) -> float:
+    """
+    Gives the upper limit of the color range of a 2D display. The percentile is
+    computed on a strided view of the data holding about PERCENTILE_SAMPLES values
+
+    Parameters
+    ----------
+    values :
+        The 2D data displayed
+
+    percentile :
+        Percentile of the values, NaN excluded, used as the upper limit
+
+    Returns
+    -------
+    The upper limit
+    """
+    step = max(1, int(np.ceil(np.sqrt(np.size(values) / PERCENTILE_SAMPLES))))
+    return np.nanpercentile(values[::step, ::step], percentile)
+
+
+def setup_axes(
+        ax: plt.Axes,
+        scale_x: str = "log",
+        scale_y: str = "log",
+        label_x: str = "",
+        label_y: str = "",
+        title: str = "",
+        xmin: None | float | int = None,
+        xmax: None | float | int = None,
+        ymin: None | float | int = None,
+        ymax: None | float | int = None
+) -> None:
+    """
+    Sets the scales, labels and ranges of the axis of a 1D display
+
+    Parameters
+    ----------
+    ax :
+        Axis of the display
+
+    scale_x :
+        Scale of the x axis "linear" or "log"
+
+    scale_y :
+        Scale of the y axis "linear" or "log"
+
+    label_x :
+        Title of the x axis
+
+    label_y :
+        Title of the y axis
+
+    title :
+        Title of the plot
+
+    xmin, xmax :
+        x range, only set if both are given
+
+    ymin, ymax :
+        y range, only set if both are given
+    """
+    ax.set_xscale(scale_x)
+    ax.set_yscale(scale_y)
+
+    ax.set_xlabel(label_x)
+    ax.set_ylabel(label_y)
+    ax.set_title(title)
+
+    if xmin is not None and xmax is not None:
+        ax.set_xlim(xmin, xmax)
+
+    if ymin is not None and ymax is not None:
+        ax.set_ylim(ymin, ymax)
+
+
+def draw_curves(
+        ax: plt.Axes,
+        curves: list[tuple],
+        file_number: int,
+        legend: bool = False,
+        colorbar: bool = True
+) -> None:
+    """
+    Draws 1D curves as a single collection of lines. The curves are decimated
+    to the width of the axis and colored by their file number
+
+    Parameters
+    ----------
+    ax :
+        Axis of the display
+
+    curves :
+        (abscissa, values, label, file index) of every curve
+
+    file_number :
+        Number of files, it sets the range of the colors
+
+    legend :
+        If True, a legend gives the label of each curve
+
+    colorbar :
+        If True and there is no legend, a colorbar gives the file number of the colors
+    """
+    norm = Normalize(vmin=1, vmax=file_number)
+    points = max(int(ax.get_window_extent().width), 1)
+
+    segments = []
+    for param_data, value_data, _, _ in curves:
+        param_data, value_data = decimate_min_max(
+            np.asarray(param_data),
+            np.asarray(value_data),
+            points
+        )
+        segments.append(np.column_stack([param_data, value_data]))
+
+    collection = LineCollection(segments, cmap=PLT_CMAP_OBJ, norm=norm)
+    collection.set_array(np.array([index for _, _, _, index in curves]))
+    ax.add_collection(collection)
+    ax.autoscale_view()
+
+    if legend:
+        handles = [
+            Line2D([], [], color=PLT_CMAP_OBJ(norm(index)))
+            for _, _, _, index in curves
+        ]
+        ax.legend(handles, [label for _, _, label, _ in curves])
+    elif colorbar:
+        cbar = ax.figure.colorbar(collection, ax=ax)
+        cbar.set_label("File N°")
+
+
+def draw_map(
+        ax: plt.Axes,
+        param_data: np.ndarray,
+        value_data: np.ndarray,
+        percentile: int | float = 99,
+        label_x: str = "",
+        label_y: str = "",
+        title: str = ""
+) -> None:
+    """
+    Draws a 2D display with its colorbar
+
+    Parameters
+    ----------
+    ax :
+        Axis of the display
+
+    param_data :
+        (2, H, W) coordinates of the map, or the axes (x_list, y_list) of a regular grid
+
+    value_data :
+        (H, W) values of the map
+
+    percentile :
+        Controls the intensity range. It will go from 0 to percentile / 100 * (max intensity)
+
+    label_x :
+        Title of the x axis
+
+    label_y :
+        Title of the y axis
+
+    title :
+        Title of the plot
+    """
+    ax.set_box_aspect(1)
+    ax.set_xlabel(label_x)
+    ax.set_ylabel(label_y)
+    ax.set_title(title)
+
+    cplot = render_2d(ax, param_data, value_data, display_range_max(value_data, percentile))
+    cbar = ax.figure.colorbar(cplot, ax=ax)
+    cbar.set_label("Intensity")
+
+
+def export_figure(
+        figure_spec: dict,
+        export_path: str | Path
+) -> str:
+    """
+    Draws a display with the Agg backend and saves it, it is run by the export
+    workers of NexusFile and does not need a GUI
+
+    Parameters
+    ----------
+    figure_spec :
+        Content of the figure. "dimension" is 1 for curves and 2 for maps,
+        "items" are the curves or the (coordinates, values) of the maps,
+        "batch" tells if the items share a figure and "file_number" is the
+        number of files. The other keys are the options of the display
+
+    export_path :
+        Path of the exported figure, its suffix gives the format
+
+    Returns
+    -------
+    The path of the exported figure
+    """
+    items = figure_spec["items"]
+    if figure_spec["dimension"] == 1:
+        fig = Figure(figsize=(12, 7))
+        ax = fig.add_subplot()
+        setup_axes(ax, **figure_spec["axes_options"])
+        if figure_spec["batch"]:
+            draw_curves(ax, items, figure_spec["file_number"], figure_spec["legend"])
+        else:
+            draw_curves(ax, items, figure_spec["file_number"], figure_spec["legend"], colorbar=False)
+    else:
+        dims = int(np.ceil(np.sqrt(figure_spec["file_number"]))) if figure_spec["batch"] else 1
+        fig = Figure(figsize=(6.4 * dims, 4.8 * dims))
+        axes = fig.subplots(dims, dims, squeeze=False)
+        for index, (param_data, value_data) in enumerate(items):
+            draw_map(
+                axes[index // dims, index % dims],
+                param_data,
+                value_data,
+                figure_spec["percentile"],
+                figure_spec["label_x"],
+                figure_spec["label_y"],
+                figure_spec["title"]
+            )
+        for index in range(len(items), dims * dims):
+            axes[index // dims, index % dims].set_visible(False)
+
+    fig.tight_layout()
+    fig.savefig(export_path)
+    return str(export_path)
+
+
+def decimate_min_max(
+        param_data: np.ndarray,
+        value_data: np.ndarray,
+        points: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Decimates a curve for its display. The curve is split in points consecutive
+    buckets and only the minimum and maximum of each bucket are kept, so that the
+    peaks stay visible
+
+    Parameters
+    ----------
+    param_data :
+        Abscissa of the curve
+
+    value_data :
+        Values of the curve
+
+    points :
+        Number of buckets, usually the width of the axis in pixels
+
+    Returns
+    -------
+    The abscissa and values that are kept
+    """
+    length = len(value_data)
+    if length <= 2 * points:
+        return param_data, value_data
+
+    bucket_size = int(np.ceil(length / points))
+    full_length = length // bucket_size * bucket_size
+    buckets = value_data[:full_length].reshape(-1, bucket_size)
+    nan_buckets = np.isnan(buckets)
+    starts = np.arange(0, full_length, bucket_size)
+
+    # The NaN are ignored, a bucket containing only NaN keeps a NaN
+    kept = np.concatenate([
+        starts + np.argmin(np.where(nan_buckets, np.inf, buckets), axis=1),
+        starts + np.argmax(np.where(nan_buckets, -np.inf, buckets), axis=1),
+        np.arange(full_length, length)
+    ])
+    kept = np.unique(kept)
+    return param_data[kept], value_data[kept]
+
+
+def render_2d(
+        ax,
+        param_data: np.ndarray | tuple[np.ndarray, np.ndarray],
+        values: np.ndarray,
+        vmax: float
+):
+    """
+    Draws 2D data on an axis. The data on an evenly spaced grid is drawn as an image,
+    downsampled to the resolution of the axis, the other grids use pcolormesh
+
+    Parameters
+    ----------
+    ax :
+        Axis on which the data is drawn
+
+    param_data :
+        (2, H, W) coordinates of the data, or the axes (x_list, y_list) of a regular grid
+
+    values :
+        (H, W) data to draw
+
+    vmax :
+        Upper limit of the color range
+
+    Returns
+    -------
+    The artist drawn, to be given to the colorbar
+    """
+    # The axes of a compact grid are used as they are
+    axes = param_data if isinstance(param_data, tuple) else grid_axes(param_data)
+    if axes is not None:
+        x_list, y_list = axes
+        evenly_spaced = len(x_list) > 1 and len(y_list) > 1 and all(
+            np.allclose(np.diff(axis), (axis[-1] - axis[0]) / (len(axis) - 1), rtol=1e-3, atol=0)
+            for axis in [x_list, y_list]
+        )
+    else:
+        evenly_spaced = False
+
+    if not evenly_spaced:
+        if axes is not None:
+            x_coords, y_coords = axes
+        else:
+            x_coords, y_coords = param_data[0, ...], param_data[1, ...]
+        return ax.pcolormesh(
+            x_coords,
+            y_coords,
+            values,
+            vmin=0,
+            vmax=vmax,
+            cmap=PLT_CMAP
+        )
+
+    # The image goes from the lowest to the highest coordinates
+    if x_list[0] > x_list[-1]:
+        x_list, values = x_list[::-1], values[:, ::-1]
+    if y_list[0] > y_list[-1]:
+        y_list, values = y_list[::-1], values[::-1, :]
+
+    # There is no need to draw more pixels than the axis has
+    bbox = ax.get_window_extent()
+    stride_x = max(1, int(len(x_list) // max(bbox.width, 1)))
+    stride_y = max(1, int(len(y_list) // max(bbox.height, 1)))
+    values = values[::stride_y, ::stride_x]
+
+    half_x = (x_list[-1] - x_list[0]) / (len(x_list) - 1) / 2
+    half_y = (y_list[-1] - y_list[0]) / (len(y_list) - 1) / 2
+    return ax.imshow(
+        values,
+        origin="lower",
+        extent=(x_list[0] - half_x, x_list[-1] + half_x, y_list[0] - half_y, y_list[-1] + half_y),
+        aspect="auto",
+        interpolation="nearest",
+        vmin=0,
+        vmax=vmax,
+        cmap=PLT_CMAP
+    )
+
+
+def save_transmission_table(
+        transmission_table: dict[str, list | np.ndarray],
+        table_path: str | Path
+) -> None:
+    """
+    Writes the transmission table returned by process_absolute_intensity.
+    It is written as a CSV file, or as an hdf5 file with one dataset per
+    column if the extension of the path is .h5 or .hdf5
+
+    Parameters
+    ----------
+    transmission_table :
+        Table to write, each key is a column
+
+    table_path :
+        Path of the file to create
+    """
+    table_path = Path(table_path)
+    if table_path.suffix in [".h5", ".hdf5"]:
+        with h5py.File(table_path, "w") as table_file:
+            for column, values in transmission_table.items():
+                if column == "file":
+                    values = np.array(values, dtype=h5py.string_dtype(encoding="utf-8"))
+                table_file.create_dataset(column, data=values)
+        return
+
+    columns = list(transmission_table.keys())
+    with open(table_path, "w", encoding="utf-8", newline="") as table_file:
+        writer = csv.writer(table_file)
+        writer.writerow(columns)
+        writer.writerows(zip(*(transmission_table[column] for column in columns)))
+
+
+def _nbytes(
+        value: np.ndarray | tuple[np.ndarray, ...]
+) -> int:
+    """
+    Memory used by an array or by the axes of a compact grid, in bytes
+    """
+    if isinstance(value, tuple):
+        return sum(np.asarray(axis).nbytes for axis in value)
+    return np.asarray(value).nbytes
+
+
+class RawDataCache:
+    """
+    Least recently used cache of the raw data of the files. The data is read on
+    first use and the least recently used arrays are dropped once the memory
+    budget is exceeded
+
+    Attributes
+    ----------
+    memory_budget :
+        Maximum memory used by the cached arrays in bytes, None for no limit
+
+    entries :
+        Cached arrays, from the least to the most recently used
+
+    memory :
+        Memory currently used by the cached arrays in bytes
+    """
+
+    def __init__(
+            self,
+            memory_budget: float | None = None
+    ) -> None:
+        """
+        Parameters
+        ----------
+        memory_budget :
+            Maximum memory used by the cached arrays in MB, None for no limit
+        """
+        self.memory_budget = None if memory_budget is None else memory_budget * 1e6
+        self.entries = OrderedDict()
+        self.memory = 0
+
+    def get(
+            self,
+            key: tuple,
+            loader
+    ) -> np.ndarray:
+        """
+        Get an array from the cache, it is loaded if it is not cached
+
+        Parameters
+        ----------
+        key :
+            Key of the array
+
+        loader :
+            Callable returning the array if it is not cached
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        value = loader()
+        self.entries[key] = value
+        self.memory += _nbytes(value)
+
+        # The array that was just loaded is always kept
+        while self.memory_budget is not None and \
+                self.memory > self.memory_budget and len(self.entries) > 1:
+            _, old_value = self.entries.popitem(last=False)
+            self.memory -= _nbytes(old_value)
+        return value
+
+    def clear(self) -> None:
+        """
+        Empties the cache
+        """
+        self.entries.clear()
+        self.memory = 0
+
+
 class NexusFile:
     """
     A class that can load and treat data formated in the NXcanSAS standard
@@ -200,9 +917,18 @@ class NexusFile:
 
     def __init__(
             self,
-            h5_paths: list[str] | list[Path],
+            h5_paths: list[str] | list[Path] | list[h5py.File],
             do_batch: bool = False,
-            input_data_group: str = "DATA"
+            input_data_group: str = "DATA",
+            compact_grids: bool | None = None,
+            compression_policy: dict | None = None,
+            raw_data_budget: float | None = None,
+            export_dir: None | str | Path = None,
+            export_format: str = "png",
+            export_workers: None | int = None,
+            progress_handler: None | Callable[[int, int], None] = None,
+            display_handler: None | Callable[[Callable[[], None]], None] = None,
+            frame: None | int = None
     ) -> None:
         """
         The init of this class consists of extracting every releavant parameters
@@ -211,14 +937,69 @@ class NexusFile:
         Parameters
         ----------
         h5_paths
-            The path of the h5 files we want to open passed as a list of strings
+            The path of the h5 files we want to open passed as a list of strings.
+            Files that are already opened can be passed instead, they are then
+            used as is and left open by nexus_close
 
         do_batch :
             Determines wether the data is assembled in a new file or not and whether it is
             displayed a single figure or not
+
+        input_data_group :
+            Data group used as input of the processes
+
+        compact_grids :
+            If True, the 2D results only store the axes of their Q grid, if False
+            they store the full grid. If None, the results are stored the same way
+            as the Q grid of the input data group
+
+        compression_policy :
+            Compression of each role of dataset (intensity, coordinates, mask,
+            uncertainties) in the saved results, see utils.COMPRESSION_POLICY
+
+        raw_data_budget :
+            The raw data of the files is only read when needed, this is the
+            maximum memory in MB used to keep it. None for no limit. With a budget,
+            the frames are also released by the SMI geometries once a file is processed
+
+        export_dir :
+            If given, the displays are not shown but exported to this folder,
+            they are drawn without a GUI by worker processes
+
+        export_format :
+            Format of the exported figures, one of EXPORT_FORMATS
+
+        export_workers :
+            Number of worker processes drawing the exported figures.
+            None to use every CPU
+
+        progress_handler :
+            Called with the number of files done and the number of files every
+            time a process is done with a file. An exception raised by it stops
+            the process
+
+        display_handler :
+            If given, the displays are not drawn but passed to it as a function
+            without argument drawing them. This allows running the processes out
+            of the thread of the GUI and drawing in it
+
+        frame :
+            If the input data group is a stack of frames (see the stack output mode
+            of the conversion), index of the frame processed. Only this frame is
+            read from the files
         """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(
+                f"The export format {export_format} is not one of {EXPORT_FORMATS}"
+            )
+
+        self.opened_files = {}
         if isinstance(h5_paths, list):
             for index, path in enumerate(h5_paths):
+                if isinstance(path, h5py.File):
+                    h5_paths[index] = Path(path.filename)
+                    self.opened_files[h5_paths[index].name] = path
+                    continue
                 if not isinstance(path, str) and not isinstance(path, Path):
                     raise TypeError(
                         f"Your list of path contains something other than a string or Path :"
@@ -239,19 +1020,194 @@ class NexusFile:
         self.ax = None
         self.do_batch = do_batch
         self.input_data_group = input_data_group
+        self.compact_grids = compact_grids
+        self.compression_policy = compression_policy
+        self.raw_data = RawDataCache(raw_data_budget)
 
         self.dicts_parameters = {}
         self.list_smi_data = {}
+        self.batch_curves = []
+        self.batch_drawn = False
+
+        self.export_dir = None if export_dir is None else Path(export_dir)
+        self.export_format = export_format
+        self.export_workers = export_workers or os.cpu_count() or 1
+        self.export_executor = None
+        self.export_futures = []
+        self.export_names = set()
+        self.export_items = []
+        self.export_batch = None
+        self.progress_handler = progress_handler
+        self.display_handler = display_handler
+        self.frame = frame
+        if self.export_dir is not None:
+            self.export_dir.mkdir(parents=True, exist_ok=True)
 
         self.nx_files = {}
 
         for file_path in self.file_paths:
-            nx_file = h5py.File(file_path, "r+")
+            nx_file = self.opened_files.get(file_path.name)
+            if nx_file is None:
+                nx_file = h5py.File(file_path, "r+")
             self.nx_files[file_path.name] = nx_file
 
-            dict_parameters = extract_smi_param(nx_file, self.input_data_group)
+            dict_parameters = extract_smi_param(
+                nx_file, self.input_data_group, load_raw_data=False, frame=self.frame
+            )
             self.dicts_parameters[file_path.name] = dict_parameters
 
+    def _track_progress(
+            self,
+            items,
+            start: int = 0,
+            total: None | int = None
+    ):
+        """
+        Yields the items of the loop of a process over the files and reports
+        to the progress handler once each of them is done
+
+        Parameters
+        ----------
+        items :
+            Items of the loop, one per file
+
+        start :
+            Number of files already done, when the files are processed by chunks
+
+        total :
+            Number of files of the process, the number of items by default
+        """
+        items = list(items)
+        total = len(items) if total is None else total
+        for done, item in enumerate(items, start=start + 1):
+            yield item
+            if self.progress_handler is not None:
+                self.progress_handler(done, total)
+
+    def _raw_data(
+            self,
+            file_name: str,
+            dataset_name: str
+    ) -> np.ndarray | tuple[np.ndarray, np.ndarray]:
+        """
+        Get a dataset of the input data group of a file, it is read
+        on first use and kept in the raw data cache. A Q stored as a
+        compact grid is given as its axes (x_list, y_list)
+
+        Parameters
+        ----------
+        file_name :
+            Name of the file
+
+        dataset_name :
+            Name of the dataset, I, Q or mask
+        """
+        return self.raw_data.get(
+            (file_name, dataset_name),
+            lambda: extract_from_h5(
+                self.nx_files[file_name],
+                f"ENTRY/{self.input_data_group}/{dataset_name}",
+                selection=self._frame_selection(dataset_name),
+                grid_as_axes=True
+            )
+        )
+
+    def _frame_selection(
+            self,
+            dataset_name: str,
+            window: tuple = ()
+    ) -> tuple | None:
+        """
+        Get the hyperslab of a dataset of the input data group belonging
+        to the processed frame of a stack
+
+        Parameters
+        ----------
+        dataset_name :
+            Name of the dataset, I, Q or mask
+
+        window :
+            Selection in the frame, the whole frame by default
+
+        Returns
+        -------
+        The selection, None for the whole dataset
+        """
+        if self.frame is None or dataset_name == "Q":
+            return window or None
+        if dataset_name == "mask":
+            # The mask of a single frame has a leading axis of length 1
+            return (slice(self.frame, self.frame + 1),) + window
+        return (self.frame,) + window
+
+    def _batch_integrate(
+            self,
+            file_ranges: dict[str, tuple[list, list, int, int]],
+            axis: str
+    ) -> None:
+        """
+        Integrates files with the csr engine. The files sharing the same geometry,
+        mask and ranges are integrated together, CSR_BATCH_SIZE frames at a time.
+        The results are stored in the SMI geometries like the ones of smi_analysis
+
+        Parameters
+        ----------
+        file_ranges :
+            For each file name, the radial range, azimuthal range, number of
+            radial points and number of azimuthal points
+
+        axis :
+            "radial" or "azimuthal"
+        """
+        batches = {}
+        for file_name, (radial_range, azimuth_range, npt_rad, npt_azim) in file_ranges.items():
+            smi_data = self.list_smi_data[file_name]
+            frame_shape = np.shape(self._raw_data(file_name, "I"))
+            if len(smi_data.ai) != 1 or len(frame_shape) != 2:
+                raise ValueError(
+                    f"The csr engine can only integrate files containing one frame, "
+                    f"{file_name} contains {len(smi_data.ai)}"
+                )
+            csr_integrator = get_csr_integrator(
+                smi_data.ai[0],
+                geometry_key(self.dicts_parameters[file_name]),
+                frame_shape,
+                np.reshape(self._raw_data(file_name, "mask"), frame_shape),
+                radial_range,
+                azimuth_range,
+                npt_rad,
+                npt_azim,
+                axis
+            )
+            batches.setdefault(id(csr_integrator), (csr_integrator, []))[1].append(file_name)
+
+        for csr_integrator, file_names in batches.values():
+            for start in range(0, len(file_names), CSR_BATCH_SIZE):
+                batch_names = file_names[start:start + CSR_BATCH_SIZE]
+                frames = np.stack([self._raw_data(name, "I") for name in batch_names])
+                intensities = csr_integrator.integrate(frames)
+                for file_name, intensity in zip(batch_names, intensities):
+                    smi_data = self.list_smi_data[file_name]
+                    if axis == "radial":
+                        smi_data.q_rad, smi_data.I_rad = csr_integrator.bins, intensity
+                    else:
+                        # smi_analysis returns the chi axis of the cake reversed,
+                        # we keep the same convention
+                        smi_data.chi_azi, smi_data.I_azi = csr_integrator.bins[::-1], intensity
+
+    def _use_compact_grid(self, file_name: str) -> bool:
+        """
+        Tells whether the 2D results of a file are saved with compact grids
+
+        Parameters
+        ----------
+        file_name :
+            Name of the file
+        """
+        if self.compact_grids is None:
+            return self.dicts_parameters[file_name]["compact grid"]
+        return self.compact_grids
+
     def _stitching(self):
         self.list_smi_data = {}
         for file_name, dict_param in self.dicts_parameters.items():
@@ -268,10 +1224,52 @@ class NexusFile:
                 detector=dict_parameters["detector name"],
                 det_angles=dict_parameters["detector rotation"]
             )
-            smi_data.open_data_db(dict_parameters["I raw data"])
+            # The frames are opened and stitched by the processes using them, see _smi_frames
+            self.list_smi_data[file_name] = smi_data
+
+    def _smi_frames(
+            self,
+            file_name: str
+    ) -> SMI_beamline.SMI_geometry:
+        """
+        Get the SMI geometry of a file with its frame opened and stitched.
+        The frame is opened again if it was released
+
+        Parameters
+        ----------
+        file_name :
+            Name of the file
+        """
+        smi_data = self.list_smi_data[file_name]
+        if np.array_equal(smi_data.imgs, []):
+            smi_data.masks = []
+            smi_data.open_data_db([self._raw_data(file_name, "I")])
+            if smi_data.geometry == "Transmission":
+                set_integrators(smi_data, self.dicts_parameters[file_name])
             smi_data.stitching_data()
+        return smi_data
 
-            self.list_smi_data[file_name] = smi_data
+    def _release_frames(
+            self,
+            file_name: str
+    ) -> None:
+        """
+        Drops the arrays of the size of a frame held by the SMI geometry of a file,
+        so that the raw data cache eviction frees their memory. Only done when
+        the raw data cache has a budget, the geometry and the 1D results are kept
+
+        Parameters
+        ----------
+        file_name :
+            Name of the file
+        """
+        if self.raw_data.memory_budget is None:
+            return
+        smi_data = self.list_smi_data[file_name]
+        smi_data.imgs, smi_data.masks = [], []
+        smi_data.img_st, smi_data.mask_st = [], []
+        smi_data.inpaints, smi_data.mask_inpaints = [], []
+        smi_data.cake = []
 
     def show_method(
             self,
@@ -350,12 +1348,15 @@ class NexusFile:
             nx_file = h5py.File(file_path, "r+")
             self.nx_files[file_path.name] = nx_file
 
-            dict_parameters = extract_smi_param(nx_file, self.input_data_group)
+            dict_parameters = extract_smi_param(
+                nx_file, self.input_data_group, load_raw_data=False, frame=self.frame
+            )
             self.dicts_parameters[file_path.name] = dict_parameters
 
     def get_raw_data(
             self,
-            group_name: str = "DATA_Q_SPACE"
+            group_name: str = "DATA_Q_SPACE",
+            selection: tuple | slice | None = None
     ) -> tuple[dict[str, np.ndarray | None], dict[str, np.ndarray]]:
         """
         Get raw data of the group name. The parameter and intensity are returned as python dict :
@@ -367,6 +1368,10 @@ class NexusFile:
         group_name :
             name of the group that contains the data to extract
 
+        selection :
+            Part of the intensity to read, for example np.s_[100:200, :]. The
+            same part of the parameter is read. Default is the whole data
+
         Returns
         -------
         2 dict :
@@ -379,19 +1384,23 @@ class NexusFile:
         for index, (file_name, nxfile) in enumerate(self.nx_files.items()):
             file_path = Path(self.file_paths[index])
             file_name = file_path.name
+            # The coordinates of 2D data have an additional first axis (qx, qy)
+            param_selection = selection
+            if selection is not None and f"ENTRY/{group_name}/I" in nxfile and \
+                    len(nxfile[f"ENTRY/{group_name}/I"].shape) == 2:
+                if not isinstance(selection, tuple):
+                    selection = (selection,)
+                param_selection = (slice(None),) + tuple(selection)
+
             if f"ENTRY/{group_name}" in nxfile:
                 extracted_value_data[file_name] = \
-                    np.array(extract_from_h5(nxfile, f"ENTRY/{group_name}/I"))
-
-            if f"ENTRY/{group_name}/R" in nxfile:
-                extracted_param_data[file_name] = \
-                    np.array(extract_from_h5(nxfile, f"ENTRY/{group_name}/R"))
-            elif f"ENTRY/{group_name}/Q" in nxfile:
-                extracted_param_data[file_name] = \
-                    np.array(extract_from_h5(nxfile, f"ENTRY/{group_name}/Q"))
-            elif f"ENTRY/{group_name}/Chi" in nxfile:
-                extracted_param_data[file_name] = \
-                    np.array(extract_from_h5(nxfile, f"ENTRY/{group_name}/Chi"))
+                    extract_from_h5(nxfile, f"ENTRY/{group_name}/I", selection=selection)
+
+            for symbol in ["R", "Q", "Chi"]:
+                if f"ENTRY/{group_name}/{symbol}" in nxfile:
+                    extracted_param_data[file_name] = \
+                        extract_from_h5(nxfile, f"ENTRY/{group_name}/{symbol}", selection=param_selection)
+                    break
             else:
                 extracted_param_data[file_name] = None
 
@@ -469,28 +1478,19 @@ class NexusFile:
         if len(self.file_paths) != len(self.list_smi_data):
             self._stitching()
 
-        for index, (file_name, smi_data) in enumerate(self.list_smi_data.items()):
-            smi_data.masks = extract_from_h5(
-                self.nx_files[file_name],
-                f"/ENTRY/{self.input_data_group}/mask"
-            )
-            smi_data.calculate_integrator_trans(
-                self.dicts_parameters[file_name]["detector rotation"]
-            )
-
-            dim = np.shape(self.dicts_parameters[file_name]["R raw data"][0])
-            qx_list = np.linspace(smi_data.qp[0], smi_data.qp[-1], dim[2])
-            qy_list = np.linspace(smi_data.qz[-1], smi_data.qz[0], dim[1])
-            qx_grid, qy_grid = np.meshgrid(qx_list, qy_list)
-
-            mesh_q = np.stack((qx_grid, qy_grid), axis=-1)
+        for index, (file_name, smi_data) in enumerate(self._track_progress(self.list_smi_data.items())):
+            smi_data = self._smi_frames(file_name)
+            smi_data.masks = self._raw_data(file_name, "mask")
+            set_integrators(smi_data, self.dicts_parameters[file_name])
 
-            mesh_q = np.moveaxis(mesh_q, (0, 1, 2), (1, 2, 0))
+            height, width = self.nx_files[file_name][f"ENTRY/{self.input_data_group}/I"].shape[-2:]
+            qx_list = np.linspace(smi_data.qp[0], smi_data.qp[-1], width)
+            qy_list = np.linspace(smi_data.qz[-1], smi_data.qz[0], height)
 
             if display:
                 self._display_data(
                     index, self.nx_files[file_name],
-                    extracted_param_data=mesh_q,
+                    extracted_param_data=(qx_list, qy_list),
                     extracted_value_data=smi_data.img_st,
                     label_x="$q_{hor} (A^{-1})$",
                     label_y="$q_{ver} (A^{-1})$",
@@ -502,7 +1502,11 @@ class NexusFile:
             if save:
                 mask = smi_data.masks
 
-                save_data(self.nx_files[file_name], group_name, "Q", mesh_q, smi_data.img_st, mask)
+                save_data(
+                    self.nx_files[file_name], group_name, "Q", (qx_list, qy_list), smi_data.img_st, mask,
+                    compact_grid=self._use_compact_grid(file_name),
+                    compression_policy=self.compression_policy
+                )
 
                 create_process(
                     self.nx_files[file_name],
@@ -513,6 +1517,8 @@ class NexusFile:
                     "Each element of the array Q is a vector containing qx and qy"
                 )
 
+            self._release_frames(file_name)
+
     def process_caking(
             self,
             display: bool = False,
@@ -577,8 +1583,9 @@ class NexusFile:
             "pts_rad": points_rad is None,
         }
 
-        for index, (file_name, smi_data) in enumerate(self.list_smi_data.items()):
-            smi_data.calculate_integrator_trans(self.dicts_parameters[file_name]["detector rotation"])
+        for index, (file_name, smi_data) in enumerate(self._track_progress(self.list_smi_data.items())):
+            smi_data = self._smi_frames(file_name)
+            set_integrators(smi_data, self.dicts_parameters[file_name])
 
             opposite_qp = np.sign(smi_data.qp[0]) != np.sign(smi_data.qp[-1])
             opposite_qz = np.sign(smi_data.qz[0]) != np.sign(smi_data.qz[-1])
@@ -632,16 +1639,11 @@ class NexusFile:
 
             q_list = smi_data.q_cake
             chi_list = smi_data.chi_cake
-            q_grid, chi_grid = np.meshgrid(q_list, chi_list)
-
-            mesh_cake = np.stack((q_grid, chi_grid), axis=-1)
-
-            mesh_cake = np.moveaxis(mesh_cake, (0, 1, 2), (1, 2, 0))
 
             if display:
                 self._display_data(
                     index, self.nx_files[file_name],
-                    extracted_param_data=mesh_cake,
+                    extracted_param_data=(q_list, chi_list),
                     extracted_value_data=smi_data.cake,
                     scale_x="log", scale_y="log",
                     label_x="$q_r (A^{-1})$",
@@ -653,7 +1655,11 @@ class NexusFile:
             if save:
                 mask = smi_data.masks
 
-                save_data(self.nx_files[file_name], group_name, "Q", mesh_cake, smi_data.cake, mask)
+                save_data(
+                    self.nx_files[file_name], group_name, "Q", (q_list, chi_list), smi_data.cake, mask,
+                    compact_grid=self._use_compact_grid(file_name),
+                    compression_policy=self.compression_policy
+                )
 
                 create_process(
                     self.nx_files[file_name],
@@ -667,6 +1673,8 @@ class NexusFile:
                     f"   - Radial Q range : [{rad_min:.4f}, {rad_max:.4f}] with {points_rad} points\n"
                 )
 
+            self._release_frames(file_name)
+
     def process_radial_average(
             self,
             display: bool = False,
@@ -676,7 +1684,8 @@ class NexusFile:
             rad_max: None | float | int = None,
             azi_min: None | float | int = None,
             azi_max: None | float | int = None,
-            points_azi: None | int = None
+            points_azi: None | int = None,
+            engine: str = "smi"
     ) -> None:
         """
         Method used to perform radial averaging of data in Fourier space.
@@ -704,105 +1713,137 @@ class NexusFile:
             Minimum angle for averaging.
 
         azi_max : float, optional
-            Maximum angle for averaging.
-
-        points_azi : int, optional
-            Number of points for the averaging process.
-        """
-        self.init_plot = True
-
-        if len(self.file_paths) != len(self.list_smi_data):
-            self._stitching()
-
-        initial_none_flags = {
-            "rad_min": rad_min is None,
-            "rad_max": rad_max is None,
-            "azi_min": azi_min is None,
-            "azi_max": azi_max is None,
-            "pts": points_azi is None,
-        }
-
-        for index, (file_name, smi_data) in enumerate(self.list_smi_data.items()):
-            smi_data.masks = extract_from_h5(
-                self.nx_files[file_name],
-                f"/ENTRY/{self.input_data_group}/mask"
-            )
-
-            smi_data.calculate_integrator_trans(self.dicts_parameters[file_name]["detector rotation"])
-
-            opposite_qp = np.sign(smi_data.qp[0]) != np.sign(smi_data.qp[-1])
-            opposite_qz = np.sign(smi_data.qz[0]) != np.sign(smi_data.qz[-1])
-
-            if opposite_qp and opposite_qz:
-                default_r_min = 0
-            elif opposite_qp and not opposite_qz:
-                default_r_min = np.sqrt(
-                    min(np.abs(smi_data.qp)) ** 2 + 0
-                )
-            elif not opposite_qp and opposite_qz:
-                default_r_min = np.sqrt(
-                    0 + min(np.abs(smi_data.qz)) ** 2
-                )
-            else:
-                default_r_min = np.sqrt(
-                    min(np.abs(smi_data.qp)) ** 2 + min(np.abs(smi_data.qz)) ** 2
-                )
+            Maximum angle for averaging.
 
-            defaults = {
-                "rad_max": np.sqrt(
-                    max(np.abs(smi_data.qp)) ** 2 + max(np.abs(smi_data.qz)) ** 2
-                ),
-                "rad_min": default_r_min,
-                "azi_min": -180,
-                "azi_max": 180,
-                "pts": 2000
-            }
+        points_azi : int, optional
+            Number of points for the averaging process.
 
-            if initial_none_flags["rad_min"]:
-                rad_min = defaults["rad_min"]
-            if initial_none_flags["rad_max"]:
-                rad_max = defaults["rad_max"]
-            if initial_none_flags["azi_min"]:
-                azi_min = defaults["azi_min"]
-            if initial_none_flags["azi_max"]:
-                azi_max = defaults["azi_max"]
-            if initial_none_flags["pts"]:
-                points_azi = defaults["pts"]
+        engine : str, optional
+            "smi" to integrate each file with pyFAI through smi_analysis,
+            "csr" to integrate together the files sharing the same geometry,
+            see integration.CSRIntegrator
+        """
+        if engine not in ["smi", "csr"]:
+            raise ValueError(f"Unknown integration engine : {engine}")
 
-            smi_data.radial_averaging(
-                azimuth_range=[azi_min, azi_max],
-                npt=points_azi,
-                radial_range=[rad_min, rad_max]
-            )
+        self.init_plot = True
 
-            if display:
-                self._display_data(
-                    index, self.nx_files[file_name],
-                    extracted_param_data=smi_data.q_rad, extracted_value_data=smi_data.I_rad,
-                    scale_x="log", scale_y="log",
-                    label_x="$q_r (A^{-1})$",
-                    label_y="Intensity (a.u.)",
-                    title=f"Radial integration over the regions \n "
-                          f"$\\chi$ : [{azi_min:.4f}, {azi_max:.4f}] and $q_r$ : [{rad_min:.4f}, {rad_max:.4f}]"
-                )
+        if len(self.file_paths) != len(self.list_smi_data):
+            self._stitching()
 
-            if save:
-                q_list = smi_data.q_rad
-                q_list = q_list
-                i_list = smi_data.I_rad
-                mask = smi_data.masks
-                save_data(self.nx_files[file_name], group_name, "Q", q_list, i_list, mask)
+        initial_none_flags = {
+            "rad_min": rad_min is None,
+            "rad_max": rad_max is None,
+            "azi_min": azi_min is None,
+            "azi_max": azi_max is None,
+            "pts": points_azi is None,
+        }
 
-                create_process(
-                    self.nx_files[file_name],
-                    f"/ENTRY/PROCESS_{group_name.removeprefix('DATA_')}",
-                    "Radial averaging",
-                    "This process integrates the intensity signal over a specified azimuthal angle range "
-                    "and radial q range.\n"
-                    "Parameters used :\n"
-                    f"   - Azimuthal range : [{azi_min:.4f}, {azi_max:.4f}]\n"
-                    f"   - Radial Q range : [{rad_min:.4f}, {rad_max:.4f}] with {points_azi} points\n"
-                )
+        file_names = list(self.list_smi_data.keys())
+        file_ranges = {}
+        used_parameters = {}
+
+        # The files are integrated then saved by chunks, so that the progress follows the integration.
+        # The csr engine integrates the files of a chunk together
+        chunk_size = CSR_BATCH_SIZE if engine == "csr" else 1
+        for chunk_start in range(0, len(file_names), chunk_size):
+            chunk_names = file_names[chunk_start:chunk_start + chunk_size]
+            for file_name in chunk_names:
+                smi_data = self._smi_frames(file_name)
+                smi_data.masks = self._raw_data(file_name, "mask")
+
+                set_integrators(smi_data, self.dicts_parameters[file_name])
+
+                opposite_qp = np.sign(smi_data.qp[0]) != np.sign(smi_data.qp[-1])
+                opposite_qz = np.sign(smi_data.qz[0]) != np.sign(smi_data.qz[-1])
+
+                if opposite_qp and opposite_qz:
+                    default_r_min = 0
+                elif opposite_qp and not opposite_qz:
+                    default_r_min = np.sqrt(
+                        min(np.abs(smi_data.qp)) ** 2 + 0
+                    )
+                elif not opposite_qp and opposite_qz:
+                    default_r_min = np.sqrt(
+                        0 + min(np.abs(smi_data.qz)) ** 2
+                    )
+                else:
+                    default_r_min = np.sqrt(
+                        min(np.abs(smi_data.qp)) ** 2 + min(np.abs(smi_data.qz)) ** 2
+                    )
+
+                defaults = {
+                    "rad_max": np.sqrt(
+                        max(np.abs(smi_data.qp)) ** 2 + max(np.abs(smi_data.qz)) ** 2
+                    ),
+                    "rad_min": default_r_min,
+                    "azi_min": -180,
+                    "azi_max": 180,
+                    "pts": 2000
+                }
+
+                if initial_none_flags["rad_min"]:
+                    rad_min = defaults["rad_min"]
+                if initial_none_flags["rad_max"]:
+                    rad_max = defaults["rad_max"]
+                if initial_none_flags["azi_min"]:
+                    azi_min = defaults["azi_min"]
+                if initial_none_flags["azi_max"]:
+                    azi_max = defaults["azi_max"]
+                if initial_none_flags["pts"]:
+                    points_azi = defaults["pts"]
+
+                if engine == "csr":
+                    file_ranges[file_name] = ([rad_min, rad_max], [azi_min, azi_max], points_azi, 1)
+                else:
+                    smi_data.radial_averaging(
+                        azimuth_range=[azi_min, azi_max],
+                        npt=points_azi,
+                        radial_range=[rad_min, rad_max]
+                    )
+                used_parameters[file_name] = (rad_min, rad_max, azi_min, azi_max, points_azi)
+
+                self._release_frames(file_name)
+
+            if engine == "csr":
+                self._batch_integrate({name: file_ranges[name] for name in chunk_names}, "radial")
+
+            tracked_names = self._track_progress(chunk_names, chunk_start, len(file_names))
+            for index, file_name in enumerate(tracked_names, start=chunk_start):
+                smi_data = self.list_smi_data[file_name]
+                rad_min, rad_max, azi_min, azi_max, points_azi = used_parameters[file_name]
+
+                if display:
+                    self._display_data(
+                        index, self.nx_files[file_name],
+                        extracted_param_data=smi_data.q_rad, extracted_value_data=smi_data.I_rad,
+                        scale_x="log", scale_y="log",
+                        label_x="$q_r (A^{-1})$",
+                        label_y="Intensity (a.u.)",
+                        title=f"Radial integration over the regions \n "
+                              f"$\\chi$ : [{azi_min:.4f}, {azi_max:.4f}] and $q_r$ : [{rad_min:.4f}, {rad_max:.4f}]"
+                    )
+
+                if save:
+                    q_list = smi_data.q_rad
+                    q_list = q_list
+                    i_list = smi_data.I_rad
+                    mask = self._raw_data(file_name, "mask")
+                    save_data(
+                        self.nx_files[file_name], group_name, "Q", q_list, i_list, mask,
+                        compression_policy=self.compression_policy
+                    )
+
+                    create_process(
+                        self.nx_files[file_name],
+                        f"/ENTRY/PROCESS_{group_name.removeprefix('DATA_')}",
+                        "Radial averaging",
+                        "This process integrates the intensity signal over a specified azimuthal angle range "
+                        "and radial q range.\n"
+                        "Parameters used :\n"
+                        f"   - Azimuthal range : [{azi_min:.4f}, {azi_max:.4f}]\n"
+                        f"   - Radial Q range : [{rad_min:.4f}, {rad_max:.4f}] with {points_azi} points\n"
+                    )
 
     def process_azimuthal_average(
             self,
@@ -814,7 +1855,8 @@ class NexusFile:
             points_rad: None | int = None,
             azi_min: None | float | int = None,
             azi_max: None | float | int = None,
-            points_azi: None | int = None
+            points_azi: None | int = None,
+            engine: str = "smi"
     ) -> None:
         """
         Method used to do the radial average of the data in fourier space
@@ -847,7 +1889,14 @@ class NexusFile:
 
         group_name:
             Name of the group that will contain the data
+
+        engine :
+            "smi" to average the caked data of each file with smi_analysis,
+            "csr" to integrate together the files sharing the same geometry,
+            see integration.CSRIntegrator
         """
+        if engine not in ["smi", "csr"]:
+            raise ValueError(f"Unknown integration engine : {engine}")
 
         self.init_plot = True
 
@@ -863,87 +1912,111 @@ class NexusFile:
             "npt_azi": points_azi is None
         }
 
-        for index, (file_name, smi_data) in enumerate(self.list_smi_data.items()):
-            smi_data.masks = extract_from_h5(
-                self.nx_files[file_name],
-                f"/ENTRY/{self.input_data_group}/mask"
-            )
-            smi_data.calculate_integrator_trans(self.dicts_parameters[file_name]["detector rotation"])
-
-            opposite_qp = np.sign(smi_data.qp[0]) != np.sign(smi_data.qp[-1])
-            opposite_qz = np.sign(smi_data.qz[0]) != np.sign(smi_data.qz[-1])
-
-            if opposite_qp and opposite_qz:
-                default_r_min = 0
-            elif opposite_qp and not opposite_qz:
-                default_r_min = np.sqrt(
-                    min(np.abs(smi_data.qp)) ** 2 + 0
-                )
-            elif not opposite_qp and opposite_qz:
-                default_r_min = np.sqrt(
-                    0 + min(np.abs(smi_data.qz)) ** 2
-                )
-            else:
-                default_r_min = np.sqrt(
-                    min(np.abs(smi_data.qp)) ** 2 + min(np.abs(smi_data.qz)) ** 2
-                )
-
-            defaults = {
-                "rad_max": np.sqrt(max(np.abs(smi_data.qp)) ** 2 + max(np.abs(smi_data.qz)) ** 2),
-                "rad_min": default_r_min,
-                "npt_rad": 500,
-                "azi_min": -180,
-                "azi_max": 180,
-                "npt_azi": 500
-            }
-
-            if initial_none_flags["rad_min"]:
-                rad_min = defaults["rad_min"]
-            if initial_none_flags["rad_max"]:
-                rad_max = defaults["rad_max"]
-            if initial_none_flags["npt_rad"]:
-                points_rad = defaults["npt_rad"]
-            if initial_none_flags["azi_min"]:
-                azi_min = defaults["azi_min"]
-            if initial_none_flags["azi_max"]:
-                azi_max = defaults["azi_max"]
-            if initial_none_flags["npt_azi"]:
-                points_azi = defaults["npt_azi"]
-
-            smi_data.azimuthal_averaging(
-                azimuth_range=[azi_min, azi_max],
-                npt_azim=points_azi,
-                radial_range=[rad_min, rad_max],
-                npt_rad=points_rad
-            )
+        file_names = list(self.list_smi_data.keys())
+        file_ranges = {}
+        used_parameters = {}
+
+        # The files are integrated then saved by chunks, so that the progress follows the integration.
+        # The csr engine integrates the files of a chunk together
+        chunk_size = CSR_BATCH_SIZE if engine == "csr" else 1
+        for chunk_start in range(0, len(file_names), chunk_size):
+            chunk_names = file_names[chunk_start:chunk_start + chunk_size]
+            for file_name in chunk_names:
+                smi_data = self._smi_frames(file_name)
+                smi_data.masks = self._raw_data(file_name, "mask")
+                set_integrators(smi_data, self.dicts_parameters[file_name])
+
+                opposite_qp = np.sign(smi_data.qp[0]) != np.sign(smi_data.qp[-1])
+                opposite_qz = np.sign(smi_data.qz[0]) != np.sign(smi_data.qz[-1])
+
+                if opposite_qp and opposite_qz:
+                    default_r_min = 0
+                elif opposite_qp and not opposite_qz:
+                    default_r_min = np.sqrt(
+                        min(np.abs(smi_data.qp)) ** 2 + 0
+                    )
+                elif not opposite_qp and opposite_qz:
+                    default_r_min = np.sqrt(
+                        0 + min(np.abs(smi_data.qz)) ** 2
+                    )
+                else:
+                    default_r_min = np.sqrt(
+                        min(np.abs(smi_data.qp)) ** 2 + min(np.abs(smi_data.qz)) ** 2
+                    )
 
-            if display:
-                self._display_data(
-                    index, self.nx_files[file_name],
-                    extracted_param_data=np.deg2rad(smi_data.chi_azi),
-                    extracted_value_data=smi_data.I_azi,
-                    scale_x="linear", scale_y="log",
-                    label_x="$\\chi (rad)$",
-                    label_y="Intensity (a.u.)",
-                    title=f"Azimuthal integration over the regions \n "
-                          f"$\\chi$ : [{azi_min:.4f}, {azi_max:.4f}] and $q_r$ : [{rad_min:.4f}, {rad_max:.4f}]"
-                )
+                defaults = {
+                    "rad_max": np.sqrt(max(np.abs(smi_data.qp)) ** 2 + max(np.abs(smi_data.qz)) ** 2),
+                    "rad_min": default_r_min,
+                    "npt_rad": 500,
+                    "azi_min": -180,
+                    "azi_max": 180,
+                    "npt_azi": 500
+                }
+
+                if initial_none_flags["rad_min"]:
+                    rad_min = defaults["rad_min"]
+                if initial_none_flags["rad_max"]:
+                    rad_max = defaults["rad_max"]
+                if initial_none_flags["npt_rad"]:
+                    points_rad = defaults["npt_rad"]
+                if initial_none_flags["azi_min"]:
+                    azi_min = defaults["azi_min"]
+                if initial_none_flags["azi_max"]:
+                    azi_max = defaults["azi_max"]
+                if initial_none_flags["npt_azi"]:
+                    points_azi = defaults["npt_azi"]
+
+                if engine == "csr":
+                    file_ranges[file_name] = ([rad_min, rad_max], [azi_min, azi_max], points_rad, points_azi)
+                else:
+                    smi_data.azimuthal_averaging(
+                        azimuth_range=[azi_min, azi_max],
+                        npt_azim=points_azi,
+                        radial_range=[rad_min, rad_max],
+                        npt_rad=points_rad
+                    )
+                used_parameters[file_name] = (rad_min, rad_max, points_rad, azi_min, azi_max, points_azi)
+
+                self._release_frames(file_name)
+
+            if engine == "csr":
+                self._batch_integrate({name: file_ranges[name] for name in chunk_names}, "azimuthal")
+
+            tracked_names = self._track_progress(chunk_names, chunk_start, len(file_names))
+            for index, file_name in enumerate(tracked_names, start=chunk_start):
+                smi_data = self.list_smi_data[file_name]
+                rad_min, rad_max, points_rad, azi_min, azi_max, points_azi = used_parameters[file_name]
+
+                if display:
+                    self._display_data(
+                        index, self.nx_files[file_name],
+                        extracted_param_data=np.deg2rad(smi_data.chi_azi),
+                        extracted_value_data=smi_data.I_azi,
+                        scale_x="linear", scale_y="log",
+                        label_x="$\\chi (rad)$",
+                        label_y="Intensity (a.u.)",
+                        title=f"Azimuthal integration over the regions \n "
+                              f"$\\chi$ : [{azi_min:.4f}, {azi_max:.4f}] and $q_r$ : [{rad_min:.4f}, {rad_max:.4f}]"
+                    )
 
-            if save:
-                chi_list = np.deg2rad(smi_data.chi_azi)
-                i_list = smi_data.I_azi
-                mask = smi_data.masks
-                save_data(self.nx_files[file_name], group_name, "Chi", chi_list, i_list, mask)
-                create_process(
-                    self.nx_files[file_name],
-                    f"/ENTRY/PROCESS_{group_name.removeprefix('DATA_')}",
-                    "Azimuthal averaging",
-                    "This process integrates the intensity signal over a specified azimuthal angle range"
-                    " and radial q range.\n"
-                    "Parameters used :\n"
-                    f"   - Azimuthal range : [{azi_min:.4f}, {azi_max:.4f}] with {points_azi} points\n"
-                    f"   - Radial Q range : [{rad_min:.4f}, {rad_max:.4f}] with {points_rad} points\n"
-                )
+                if save:
+                    chi_list = np.deg2rad(smi_data.chi_azi)
+                    i_list = smi_data.I_azi
+                    mask = self._raw_data(file_name, "mask")
+                    save_data(
+                        self.nx_files[file_name], group_name, "Chi", chi_list, i_list, mask,
+                        compression_policy=self.compression_policy
+                    )
+                    create_process(
+                        self.nx_files[file_name],
+                        f"/ENTRY/PROCESS_{group_name.removeprefix('DATA_')}",
+                        "Azimuthal averaging",
+                        "This process integrates the intensity signal over a specified azimuthal angle range"
+                        " and radial q range.\n"
+                        "Parameters used :\n"
+                        f"   - Azimuthal range : [{azi_min:.4f}, {azi_max:.4f}] with {points_azi} points\n"
+                        f"   - Radial Q range : [{rad_min:.4f}, {rad_max:.4f}] with {points_rad} points\n"
+                    )
 
     def process_horizontal_integration(
             self,
@@ -994,11 +2067,9 @@ class NexusFile:
             "qy_max": qy_max is None,
         }
 
-        for index, (file_name, smi_data) in enumerate(self.list_smi_data.items()):
-            smi_data.masks = extract_from_h5(
-                self.nx_files[file_name],
-                f"/ENTRY/{self.input_data_group}/mask"
-            )
+        for index, (file_name, smi_data) in enumerate(self._track_progress(self.list_smi_data.items())):
+            smi_data = self._smi_frames(file_name)
+            smi_data.masks = self._raw_data(file_name, "mask")
 
             defaults = {
                 "qx_min": smi_data.qp[0],
@@ -1037,7 +2108,10 @@ class NexusFile:
                 q_list = q_list
                 i_list = smi_data.I_hor
                 mask = smi_data.masks
-                save_data(self.nx_files[file_name], group_name, "Q", q_list, i_list, mask)
+                save_data(
+                    self.nx_files[file_name], group_name, "Q", q_list, i_list, mask,
+                    compression_policy=self.compression_policy
+                )
 
                 create_process(
                     self.nx_files[file_name],
@@ -1051,6 +2125,8 @@ class NexusFile:
                     f"   - Vertical Q range : [{qx_min:.4f}, {qx_max:.4f}]\n"
                 )
 
+            self._release_frames(file_name)
+
     def process_vertical_integration(
             self,
             display: bool = False,
@@ -1099,11 +2175,9 @@ class NexusFile:
             "qy_max": qy_max is None,
         }
 
-        for index, (file_name, smi_data) in enumerate(self.list_smi_data.items()):
-            smi_data.masks = extract_from_h5(
-                self.nx_files[file_name],
-                f"/ENTRY/{self.input_data_group}/mask"
-            )
+        for index, (file_name, smi_data) in enumerate(self._track_progress(self.list_smi_data.items())):
+            smi_data = self._smi_frames(file_name)
+            smi_data.masks = self._raw_data(file_name, "mask")
             # smi_data.calculate_integrator_trans(self.dicts_parameters[file_name]["detector rotation"])
 
             defaults = {
@@ -1144,7 +2218,10 @@ class NexusFile:
                 q_list = q_list
                 i_list = smi_data.I_ver
                 mask = smi_data.masks
-                save_data(self.nx_files[file_name], group_name, "Q", q_list, i_list, mask)
+                save_data(
+                    self.nx_files[file_name], group_name, "Q", q_list, i_list, mask,
+                    compression_policy=self.compression_policy
+                )
 
                 create_process(
                     self.nx_files[file_name],
@@ -1157,18 +2234,22 @@ class NexusFile:
                     f"   - Vertical Q range : [{qx_min:.4f}, {qx_max:.4f}]\n"
                 )
 
+            self._release_frames(file_name)
+
     def process_absolute_intensity(
             self,
             db_path: Path | str = "",
             group_name: str = "DATA_ABS",
             display: bool = False,
             save: bool = False,
-            # roi_size_x: int = 30,
-            # roi_size_y: int = 30,
+            use_roi: bool = False,
+            roi_size_x: None | int = None,
+            roi_size_y: None | int = None,
             sample_thickness: float = 1,
-    ):
+    ) -> dict[str, list | np.ndarray]:
         """
         This process convert the intensities in your file into absolute intensities.
+        The scaling factors of all the files are computed together
 
         Parameters
         ----------
@@ -1187,11 +2268,23 @@ class NexusFile:
         db_path :
             path of the direct beam data
 
+        use_roi :
+            If True, the transmission is computed from a region of interest around the
+            beam center instead of the whole frame, only this region is read
+
         roi_size_x :
-            Horizontal size of the region of interest. By default gets the beam size of the HDF5
+            Half width of the region of interest in pixels. By default, half the beam size
+            of the HDF5 converted to pixels, see beam_roi_size
 
         roi_size_y :
-            Vertical size of the region of interest. By default gets the beam size of the HDF5
+            Half height of the region of interest in pixels. By default, half the beam size
+            of the HDF5 converted to pixels, see beam_roi_size
+
+        Returns
+        -------
+        The transmission table, for each file its exposition time, thickness,
+        sum of the frame (or of its region of interest), transmission and scaling factor. It can be written
+        with save_transmission_table
         """
         if db_path is None:
             raise TypeError("No direct beam data path provided")
@@ -1200,88 +2293,93 @@ class NexusFile:
             self._stitching()
 
         initial_none_flags = {
-            # "roi_size_x": roi_size_x is None,
-            # "roi_size_y": roi_size_y is None,
+            "roi_size_x": roi_size_x is None,
+            "roi_size_y": roi_size_y is None,
             "sample_thickness": sample_thickness is None,
         }
 
-        self.init_plot = True
+        # The parameters of every file are gathered first so that
+        # the scaling factors are computed in a single pass
+        file_names = list(self.nx_files.keys())
+        # The thicknesses keep their type, it is the one written in the files
+        thicknesses = [1] * len(file_names)
+        expo_times = np.ones(len(file_names))
+        frame_sums = np.zeros(len(file_names))
+        roi_sizes = []
         for index, (file_name, nx_file) in enumerate(self.nx_files.items()):
 
             defaults = {
-                # "roi_size_x": extract_from_h5(nx_file, "ENTRY/INSTRUMENT/SOURCE/beam_size_x"),
-                # "roi_size_y": extract_from_h5(nx_file, "ENTRY/INSTRUMENT/SOURCE/beam_size_y"),
                 "sample_thickness": extract_from_h5(nx_file, "ENTRY/SAMPLE/thickness"),
             }
+            if use_roi and (initial_none_flags["roi_size_x"] or initial_none_flags["roi_size_y"]):
+                defaults["roi_size_x"], defaults["roi_size_y"] = beam_roi_size(nx_file)
 
-            # if initial_none_flags["roi_size_x"]:
-            #     roi_size_x = defaults["roi_size_x"]
-            # if initial_none_flags["roi_size_y"]:
-            #     roi_size_y = defaults["roi_size_y"]
+            if use_roi and initial_none_flags["roi_size_x"]:
+                roi_size_x = defaults["roi_size_x"]
+            if use_roi and initial_none_flags["roi_size_y"]:
+                roi_size_y = defaults["roi_size_y"]
             if initial_none_flags["sample_thickness"]:
                 sample_thickness = defaults["sample_thickness"]
                 if sample_thickness == 0:
                     sample_thickness = 1
+            thicknesses[index] = sample_thickness
 
-            positions = self.dicts_parameters[file_name]["R raw data"][0]
-
-            raw_data = self.dicts_parameters[file_name]["I raw data"][0]
-            # beam_center_x = int(self.dicts_parameters[file_name]["beam center"][0])
-            # beam_center_y = int(self.dicts_parameters[file_name]["beam center"][1])
             expo_time = extract_from_h5(nx_file, "ENTRY/COLLECTION/exposition_time")
             if expo_time == 0:
                 warnings.warn("Exposition time for data was 0, changed to 1")
                 expo_time = 1
+            expo_times[index] = expo_time
+
+            if use_roi:
+                # Only the region of interest is read from the file
+                roi_sizes.append((roi_size_x, roi_size_y))
+                intensity_path = f"ENTRY/{self.input_data_group}/I"
+                window = roi_window(
+                    self.dicts_parameters[file_name]["beam center"],
+                    roi_sizes[-1],
+                    nx_file[intensity_path].shape[-2:]
+                )
+                frame_sums[index] = np.sum(
+                    extract_from_h5(nx_file, intensity_path, selection=self._frame_selection("I", window))
+                )
+            else:
+                frame_sums[index] = np.sum(self._raw_data(file_name, "I"))
 
-            i_roi_data = np.sum(
-                raw_data
-                # raw_data[
-                # beam_center_y - roi_size_y:beam_center_y + roi_size_y,
-                # beam_center_x - roi_size_x:beam_center_x + roi_size_x
-                # ]
+        # The region of interest of the direct beam is the one of the files
+        if use_roi and len(set(roi_sizes)) > 1:
+            raise ValueError(
+                f"The files do not have the same beam size, give roi_size_x and roi_size_y : {set(roi_sizes)}"
             )
-            i_roi_data = i_roi_data / expo_time
+        db_roi_size = roi_sizes[0] if use_roi else None
+
+        # The direct beam is only read the first time it is used
+        i_roi_db = db_count_rate(db_path, db_roi_size)
+
+        i_roi_data = frame_sums / expo_times
+        transmissions = i_roi_data / i_roi_db
+        thickness_values = np.asarray(thicknesses, dtype=np.float64)
+        scaling_factors = 1 / (transmissions * thickness_values * i_roi_db * expo_times)
+
+        transmission_table = {
+            "file": file_names,
+            "exposition_time": expo_times,
+            "thickness": thickness_values,
+            "frame_sum": frame_sums,
+            "transmission": transmissions,
+            "scaling_factor": scaling_factors
+        }
 
-            with h5py.File(db_path) as h5obj:
-                raw_db = extract_from_h5(h5obj, "ENTRY/DATA/I")
-                # beam_center_x_db = \
-                #     int(extract_from_h5(h5obj, "ENTRY/INSTRUMENT/DETECTOR/beam_center_x"))
-                # beam_center_y_db = \
-                #     int(extract_from_h5(h5obj, "ENTRY/INSTRUMENT/DETECTOR/beam_center_y"))
-                time_db = extract_from_h5(h5obj, "ENTRY/COLLECTION/exposition_time")
-                if time_db == 0:
-                    warnings.warn("Exposition time for DB data was 0, changed to 1")
-                    time_db = 1
-
-            i_roi_db = np.sum(
-                raw_db
-                # raw_db[
-                # beam_center_y_db - roi_size_y:beam_center_y_db + roi_size_y,
-                # beam_center_x_db - roi_size_x:beam_center_x_db + roi_size_x
-                # ]
-            )
-            i_roi_db = i_roi_db / time_db
-
-            transmission = i_roi_data / i_roi_db
-            replace_h5_dataset(nx_file, "ENTRY/SAMPLE/thickness", sample_thickness)
-            replace_h5_dataset(nx_file, "ENTRY/SAMPLE/transmission", transmission)
-            scaling_factor = 1 / (transmission * sample_thickness * i_roi_db * expo_time)
-
-            # print(
-            #     f"Absolute intensity parameters :\n"
-            #     f"  - db path : {db_path}\n"
-            #     f"  - I_ROI_DATA : {i_roi_data}\n"
-            #     f"  - I_ROI_DB : {i_roi_db}\n"
-            #     f"  - time : {expo_time}\n"
-            #     f"  - time_db : {time_db}\n"
-            #     f"  - transmission : {transmission}\n"
-            #     f"  - SF : {scaling_factor}\n"
-            #     f"  - sum img : {np.sum(raw_data)}\n"
-            #     f"  - ratio ROI/IMG : {(i_roi_data * expo_time) / np.sum(raw_data)}\n"
-            #     f"  - test facteur : {1 / (i_roi_data * sample_thickness * expo_time)}"
-            # )
-
-            abs_data = raw_data * scaling_factor
+        self.init_plot = True
+        for index, (file_name, nx_file) in enumerate(self._track_progress(self.nx_files.items())):
+            # The transmission is written with the precision of the intensity it comes from
+            intensity_dtype = nx_file[f"ENTRY/{self.input_data_group}/I"].dtype
+            transmission_dtype = np.result_type(intensity_dtype, 1.0)
+            replace_h5_dataset(nx_file, "ENTRY/SAMPLE/thickness", thicknesses[index])
+            replace_h5_dataset(nx_file, "ENTRY/SAMPLE/transmission", transmission_dtype.type(transmissions[index]))
+
+            positions = self._raw_data(file_name, "Q")
+            raw_data = self._raw_data(file_name, "I")
+            abs_data = (raw_data * scaling_factors[index]).astype(raw_data.dtype, copy=False)
 
             if display:
                 self._display_data(
@@ -1296,10 +2394,14 @@ class NexusFile:
 
             if save:
                 q_list = positions
-                q_list = q_list
                 i_list = abs_data
-                mask = self.list_smi_data[file_name].masks
-                save_data(nx_file, group_name, "Q", q_list, i_list, mask)
+                mask = self._smi_frames(file_name).masks
+                save_data(
+                    nx_file, group_name, "Q", q_list, i_list, mask,
+                    compact_grid=self._use_compact_grid(file_name),
+                    compression_policy=self.compression_policy
+                )
+                self._release_frames(file_name)
 
                 create_process(
                     nx_file,
@@ -1309,10 +2411,13 @@ class NexusFile:
                     "direct beam data file\n"
                     "Parameters used :\n"
                     f"   - Path of the file : {db_path}"
-                    f"   - Sample thickness : {sample_thickness:.4f}"
-                    f"   - Region of interest size : full picture"
+                    f"   - Sample thickness : {thicknesses[index]:.4f}"
+                    f"   - Region of interest size : "
+                    f"{'full picture' if db_roi_size is None else db_roi_size}"
                 )
 
+        return transmission_table
+
     def process_display(
             self,
             group_name: str = "DATA_Q_SPACE",
@@ -1374,7 +2479,7 @@ class NexusFile:
             Name of the data group to be displayed
         """
         self.init_plot = True
-        for index, (file_name, nxfile) in enumerate(self.nx_files.items()):
+        for index, (file_name, nxfile) in enumerate(self._track_progress(self.nx_files.items())):
             self._display_data(
                 index=index, nxfile=nxfile,
                 group_name=group_name,
@@ -1393,7 +2498,7 @@ class NexusFile:
             self,
             group_names: None | list[str] = None
     ) -> None:
-        for index, (file_name, nxfile) in enumerate(self.nx_files.items()):
+        for index, (file_name, nxfile) in enumerate(self._track_progress(self.nx_files.items())):
             q_list = []
             i_list = []
             for group in group_names:
@@ -1424,7 +2529,10 @@ class NexusFile:
             print(i_list)
 
             mask = self.list_smi_data[file_name].masks
-            save_data(nxfile, "Q", q_list, "DATA_CONCAT", i_list, mask)
+            save_data(
+                nxfile, "Q", q_list, "DATA_CONCAT", i_list, mask,
+                compression_policy=self.compression_policy
+            )
 
             create_process(self.nx_files[file_name],
                            f"/ENTRY/PROCESS_CONCAT",
@@ -1530,7 +2638,7 @@ class NexusFile:
         group_name:
             Data_group to delete
         """
-        for file_name, nxfile in self.nx_files.items():
+        for file_name, nxfile in self._track_progress(self.nx_files.items()):
             delete_data(nxfile, group_name)
 
     def _detect_variables(self):
@@ -1665,6 +2773,14 @@ class NexusFile:
         value_not_inserted = extracted_param_data is None
 
         group_name_inserted = group_name is not None
+        last_of_batch = self.do_batch and index == len(self.nx_files) - 1
+
+        # A file lacking the group is skipped, the batch is still drawn with the others
+        if group_name_inserted and f"ENTRY/{group_name}" not in nxfile:
+            warnings.warn(f"{group_name} is not in {nxfile.filename}, it is not displayed")
+            if last_of_batch:
+                self._dispatch_draw(functools.partial(self._draw_batch, group_name or title, legend))
+            return
 
         # We extract the data
         if value_not_inserted and group_name_inserted:
@@ -1691,46 +2807,122 @@ class NexusFile:
                 "attribute",
                 "Q_indices"
             )
-            for symbol_index in symbols_to_use:
-                symbol = parameter_symbols[symbol_index]
-                extracted_param_data = extract_from_h5(
-                    nxfile,
-                    f"ENTRY/{group_name}/{symbol}"
-                )
+            # The parameter of the last index is the one used, it is only read once
+            symbol = parameter_symbols[symbols_to_use[-1]]
+            extracted_param_data = extract_from_h5(
+                nxfile,
+                f"ENTRY/{group_name}/{symbol}",
+                grid_as_axes=True
+            )
 
         # If the intensity value is a scalar we pass
         if np.isscalar(extracted_value_data):
-            pass
+            if last_of_batch:
+                self._dispatch_draw(functools.partial(self._draw_batch, group_name or title, legend))
+            return
+
+        # The options are taken now, the drawing can be delayed by the display handler
+        new_figure, self.init_plot = self.init_plot, False
+        draw = functools.partial(
+            self._draw_data,
+            index, extracted_param_data, extracted_value_data,
+            self.do_batch, new_figure,
+            group_name=group_name,
+            scale_x=scale_x, scale_y=scale_y,
+            label_x=label_x, label_y=label_y,
+            title=title, legend=legend,
+            xmin=xmin, xmax=xmax,
+            ymin=ymin, ymax=ymax,
+            percentile=percentile,
+            optimize_range=optimize_range,
+            pause=self.display_handler is None
+        )
+        self._dispatch_draw(draw)
+        if last_of_batch:
+            self._dispatch_draw(functools.partial(self._draw_batch, group_name or title, legend))
 
-        # If the intensity value is a 1D array we plot it
-        elif len(np.shape(extracted_value_data)) == 1:
-            # Separation required because in the batch case we need to have the graphs
-            # in the same figure
-            if self.do_batch:
-                if self.init_plot:
-                    self.fig, self.ax = plt.subplots(figsize=(12, 7))
-                    self.init_plot = False
-            else:
-                self.fig, self.ax = plt.subplots(figsize=(12, 7))
-            self.ax.set_xscale(scale_x)
-            self.ax.set_yscale(scale_y)
+    def _dispatch_draw(self, draw: Callable[[], None]) -> None:
+        """
+        Draws now, or gives the drawing to the display handler when there is one
+
+        Parameters
+        ----------
+        draw :
+            Function doing the drawing
+        """
+        if self.display_handler is not None and self.export_dir is None:
+            self.display_handler(draw)
+        else:
+            draw()
+
+    def _draw_batch(self, display_name: str, legend: bool = False) -> None:
+        """
+        Draws, or exports, the figure gathering the data of a batch. Only the
+        files that provided data are in it, whichever file is the last one
 
-            self.ax.set_xlabel(label_x)
-            self.ax.set_ylabel(label_y)
-            self.ax.set_title(title)
+        Parameters
+        ----------
+        display_name :
+            Name of the displayed data, used to name the exported file
 
-            if xmin is not None and xmax is not None:
-                self.ax.set_xlim(xmin, xmax)
+        legend :
+            Whether to show the legend of the curves
+        """
+        if self.export_dir is not None:
+            if self.export_items:
+                items, self.export_items = self.export_items, []
+                self._submit_export(display_name, "batch", dict(self.export_batch, items=items, batch=True))
+            return
+
+        if self.batch_curves:
+            draw_curves(self.ax, self.batch_curves, len(self.nx_files), legend)
+            self.batch_curves = []
+        if self.batch_drawn:
+            self.batch_drawn = False
+            plt.tight_layout()
+            plt.show(block=False)
+
+    def _draw_data(
+            self,
+            index: None | int,
+            extracted_param_data: np.ndarray,
+            extracted_value_data: np.ndarray,
+            do_batch: bool,
+            new_figure: bool,
+            group_name: None | str = None,
+            scale_x: str = "log",
+            scale_y: str = "log",
+            label_x: str = "",
+            label_y: str = "",
+            title: str = "",
+            legend: bool = False,
+            xmin: None | float | int = None,
+            xmax: None | float | int = None,
+            ymin: None | float | int = None,
+            ymax: None | float | int = None,
+            percentile: int | float = 99,
+            optimize_range: bool = False,
+            pause: bool = True
+    ) -> None:
+        """
+        Draws or exports the data extracted by _display_data, the parameters
+        not described here are the ones of _display_data
 
-            if ymin is not None and ymax is not None:
-                self.ax.set_ylim(ymin, ymax)
+        Parameters
+        ----------
+        do_batch :
+            Whether the data of every file is displayed in a single figure
 
-            norm = Normalize(vmin=1, vmax=len(self.nx_files))
-            plot_color = PLT_CMAP_OBJ(norm(index))
+        new_figure :
+            Whether this is the first display of the figure
 
-            sm = ScalarMappable(cmap=PLT_CMAP_OBJ, norm=norm)
-            sm.set_array([])
+        pause :
+            Whether to wait after showing a figure, so that it is drawn when
+            no GUI event loop is running
+        """
 
+        # If the intensity value is a 1D array we plot it
+        if len(np.shape(extracted_value_data)) == 1:
             file_path = Path(self.file_paths[index])
             split_file_name = file_path.name.split("_")
             label = file_path.name.removesuffix(split_file_name[-1] + "_")
@@ -1743,37 +2935,77 @@ class NexusFile:
                     first_index, last_index = indices_high_var[0], indices_high_var[-2]
                 elif len(indices_high_var) == 2:
                     first_index, last_index = indices_high_var[0], indices_high_var[-1]
-            self.ax.plot(
+
+            curve = (
                 extracted_param_data[first_index:last_index],
                 extracted_value_data[first_index:last_index],
-                label=f"{label}",
-                color=plot_color
+                label,
+                index
             )
+            axes_options = {
+                "scale_x": scale_x, "scale_y": scale_y,
+                "label_x": label_x, "label_y": label_y,
+                "title": title,
+                "xmin": xmin, "xmax": xmax,
+                "ymin": ymin, "ymax": ymax
+            }
 
-            if self.do_batch:
-                if index == len(self.nx_files) - 1:
-                    if legend:
-                        self.ax.legend()
-                    else:
-                        cbar = self.fig.colorbar(sm, ax=self.ax)
-                        cbar.set_label("File N°")
-                    plt.tight_layout()
-                    plt.show(block=False)
+            if self.export_dir is not None:
+                self._export_display(
+                    index, group_name or title, curve,
+                    {"dimension": 1, "legend": legend, "axes_options": axes_options},
+                    do_batch, new_figure
+                )
+                return
+
+            # Separation required because in the batch case we need to have the graphs
+            # in the same figure
+            if do_batch:
+                if new_figure:
+                    self.fig, self.ax = plt.subplots(figsize=(12, 7))
+                    self.batch_curves = []
+            else:
+                self.fig, self.ax = plt.subplots(figsize=(12, 7))
+            setup_axes(self.ax, **axes_options)
+
+            if do_batch:
+                # The curves are drawn together by _draw_batch
+                self.batch_curves.append(curve)
+                self.batch_drawn = True
             else:
+                norm = Normalize(vmin=1, vmax=len(self.nx_files))
+                self.ax.plot(
+                    curve[0],
+                    curve[1],
+                    label=f"{label}",
+                    color=PLT_CMAP_OBJ(norm(index))
+                )
                 if legend:
                     self.ax.legend()
                 plt.tight_layout()
                 plt.show(block=False)
-                time.sleep(0.5)
+                if pause:
+                    time.sleep(0.5)
 
         # If the intensity value is a 2D array we imshow it
         elif len(np.shape(extracted_value_data)) == 2:
-            if self.do_batch:
+            if self.export_dir is not None:
+                self._export_display(
+                    index, group_name or title,
+                    (extracted_param_data, extracted_value_data),
+                    {
+                        "dimension": 2, "percentile": percentile,
+                        "label_x": label_x, "label_y": label_y, "title": title
+                    },
+                    do_batch, new_figure
+                )
+                return
+
+            if do_batch:
                 file_number = len(self.nx_files)
                 dims = int(np.ceil(np.sqrt(file_number)))
-                if self.init_plot:
+                if new_figure:
                     self.fig, self.ax = plt.subplots(dims, dims)
-                    self.init_plot = False
 
                 if dims != 1 and index is not None:
                     current_ax = self.ax[int(index // dims), int(index % dims)]
@@ -1783,40 +3015,152 @@ class NexusFile:
                 _, ax = plt.subplots()
                 current_ax = ax
 
-            current_ax.set_box_aspect(1)
-            current_ax.set_xlabel(label_x)
-            current_ax.set_ylabel(label_y)
-            current_ax.set_title(title)
-
-            cplot = current_ax.pcolormesh(
-                extracted_param_data[0, ...],
-                extracted_param_data[1, ...],
+            draw_map(
+                current_ax,
+                extracted_param_data,
                 extracted_value_data,
-                vmin=0,
-                vmax=np.percentile(
-                    extracted_value_data[~np.isnan(extracted_value_data)],
-                    percentile),
-                cmap=PLT_CMAP
+                percentile,
+                label_x,
+                label_y,
+                title
             )
-            cbar = plt.colorbar(cplot, ax=current_ax)
-            cbar.set_label("Intensity")
 
-            if self.do_batch:
-                if index == len(self.nx_files) - 1:
-                    plt.tight_layout()
-                    plt.show(block=False)
+            if do_batch:
+                self.batch_drawn = True
             else:
                 plt.tight_layout()
                 plt.show(block=False)
-                time.sleep(0.1)
+                if pause:
+                    time.sleep(0.1)
+
+    def _export_display(
+            self,
+            index: None | int,
+            display_name: str,
+            item: tuple,
+            figure_spec: dict,
+            do_batch: bool,
+            new_figure: bool
+    ) -> None:
+        """
+        Sends a display to the export workers instead of showing it. In the batch
+        case, the items of every file are gathered and sent as a single figure
+        by _draw_batch
+
+        Parameters
+        ----------
+        index :
+            Index of the file
+
+        display_name :
+            Name of the displayed data, used to name the exported file
+
+        item :
+            Curve or map of the file
+
+        figure_spec :
+            Options of the figure, see export_figure
+
+        do_batch :
+            Whether the items of every file form a single figure
+
+        new_figure :
+            Whether this is the first item of the figure
+        """
+        figure_spec = dict(figure_spec, file_number=len(self.nx_files))
+        if do_batch and index is not None:
+            if new_figure:
+                self.export_items = []
+            self.export_items.append(item)
+            self.export_batch = figure_spec
+            return
+
+        file_stem = "all_files" if index is None else Path(self.file_paths[index]).stem
+        self._submit_export(display_name, file_stem, dict(figure_spec, items=[item], batch=False))
+
+    def _submit_export(self, display_name: str, file_stem: str, figure_spec: dict) -> None:
+        """
+        Submits a figure to the export workers
+
+        Parameters
+        ----------
+        display_name :
+            Name of the displayed data, used to name the exported file
+
+        file_stem :
+            Name of the file(s) of the figure, used to name the exported file
 
-    def nexus_close(self):
+        figure_spec :
+            Options and items of the figure, see export_figure
         """
-        Method used to close the loaded file correctly by repacking it and then closing it
+        # The figures of a same object are never overwritten
+        display_name = re.sub(r"\W+", "_", display_name or "display").strip("_")[:EXPORT_NAME_LENGTH]
+        export_name = f"{file_stem}_{display_name}"
+        name, copy_number = export_name, 1
+        while name in self.export_names:
+            copy_number += 1
+            name = f"{export_name}_{copy_number}"
+        self.export_names.add(name)
+        export_path = self.export_dir / f"{name}.{self.export_format}"
+
+        if self.export_executor is None:
+            self.export_executor = ProcessPoolExecutor(max_workers=self.export_workers)
+
+        # The data of the waiting figures is kept in memory, so their number is bounded
+        pending = [future for future in self.export_futures if not future.done()]
+        if len(pending) >= EXPORT_QUEUE_SIZE * self.export_workers:
+            wait(pending, return_when=FIRST_COMPLETED)
+
+        self.export_futures.append(
+            self.export_executor.submit(export_figure, figure_spec, export_path)
+        )
+
+    def wait_exports(self) -> list[str]:
+        """
+        Waits for the exported figures to be written
+
+        Returns
+        -------
+        The paths of the exported figures
+        """
+        futures, self.export_futures = self.export_futures, []
+        return [future.result() for future in futures]
+
+    def nexus_close(self, repack: bool | None = None):
         """
+        Method used to close the loaded files correctly, they are repacked if needed.
+        The files that were passed already opened are only flushed
+
+        Parameters
+        ----------
+        repack :
+            If True, every file is repacked, if False none is. If None, a file is
+            only repacked if more than REPACK_FREE_SPACE_RATIO of it is unused
+        """
+        try:
+            self.wait_exports()
+        finally:
+            if self.export_executor is not None:
+                self.export_executor.shutdown()
+                self.export_executor = None
+
+        self.raw_data.clear()
         for index, (file_name, file_obj) in enumerate(self.nx_files.items()):
+            if file_name in self.opened_files:
+                file_obj.flush()
+                continue
+
+            if repack is None:
+                file_obj.flush()
+                free_space = file_obj.id.get_freespace()
+                file_size = file_obj.id.get_filesize()
+                do_repack = free_space > REPACK_FREE_SPACE_RATIO * file_size
+            else:
+                do_repack = repack
+
             file_obj.close()
-            repack_hdf5(self.file_paths[index], str(self.file_paths[index]) + ".tmp")
+            if do_repack:
+                repack_hdf5(self.file_paths[index], str(self.file_paths[index]) + ".tmp")
 
 
 if __name__ == "__main__":
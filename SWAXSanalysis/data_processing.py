@@ -1,24 +1,191 @@
 """
 This module is meant to help the user process their data
 """
-import copy
 import inspect
+import json
+import os
 import pathlib
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from typing import Any
-import matplotlib.pyplot as plt
 
 import h5py
 import time
 
-import numpy as np
-
-from . import DESKTOP_PATH, ICON_PATH
+from . import DESKTOP_PATH, ICON_PATH, COST_PATH
 from . import FONT_TITLE, FONT_BUTTON, FONT_TEXT, FONT_LOG
 from .class_nexus_file import NexusFile
 from .utils import string_2_value, extract_from_h5, VerticalScrolledFrame
 
+# Time in ms between two readings of the events sent by a running process
+EVENT_POLL_INTERVAL = 100
+
+# Weight of a new run in the costs learned by ProcessCostModel
+COST_SMOOTHING = 0.3
+
+# Number of files the learned cost is worth when it is refined by a running process
+COST_PRIOR_WEIGHT = 2
+
+
+class ProcessCancelled(Exception):
+    """
+    Raised in the thread of a process to stop it when the user cancels it
+    """
+
+
+class ProcessCostModel:
+    """
+    Learns the cost of each process from the past runs to estimate
+    the duration of the next ones. The costs are kept in a JSON file
+
+    Attributes
+    ----------
+    cost_path :
+        Path of the JSON file
+
+    costs :
+        key : process name
+        value : seconds per pixel and seconds per file of the process,
+        and number of runs they were learned from
+    """
+
+    def __init__(
+            self,
+            cost_path: str | pathlib.Path = COST_PATH
+    ) -> None:
+        self.cost_path = pathlib.Path(cost_path)
+        self.costs = {}
+        self.load()
+
+    def load(self) -> None:
+        """
+        Loads the cost file, the costs are forgotten if it can't be read
+        """
+        self.costs = {}
+        if not self.cost_path.exists():
+            return
+
+        try:
+            with open(self.cost_path, "r", encoding="utf-8") as cost_file:
+                self.costs = json.load(cost_file)
+        except (json.JSONDecodeError, OSError):
+            self.costs = {}
+
+    def save(self) -> None:
+        """
+        Writes the cost file
+        """
+        self.cost_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cost_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as cost_file:
+            json.dump(self.costs, cost_file, indent=4)
+        os.replace(tmp_path, self.cost_path)
+
+    def estimate(
+            self,
+            process_name: str,
+            file_number: int,
+            pixel_number: int = 0
+    ) -> float | None:
+        """
+        Estimates the duration of a process
+
+        Parameters
+        ----------
+        process_name :
+            Name of the process
+
+        file_number :
+            Number of files processed
+
+        pixel_number :
+            Total number of pixels of the input data of the files,
+            0 if it is unknown
+
+        Returns
+        -------
+        The estimated duration in seconds, None if the process never ran
+        """
+        cost = self.costs.get(process_name)
+        if cost is None:
+            return None
+        if pixel_number > 0 and cost.get("seconds_per_pixel"):
+            return pixel_number * cost["seconds_per_pixel"]
+        return file_number * cost["seconds_per_file"]
+
+    def record(
+            self,
+            process_name: str,
+            file_number: int,
+            pixel_number: int,
+            duration: float
+    ) -> None:
+        """
+        Learns the cost of a process from a run and saves it
+
+        Parameters
+        ----------
+        process_name :
+            Name of the process
+
+        file_number :
+            Number of files processed
+
+        pixel_number :
+            Total number of pixels of the input data of the files
+
+        duration :
+            Duration of the run in seconds
+        """
+        if file_number <= 0 or duration <= 0:
+            return
+
+        observed = {"seconds_per_file": duration / file_number}
+        if pixel_number > 0:
+            observed["seconds_per_pixel"] = duration / pixel_number
+
+        cost = self.costs.get(process_name)
+        if cost is None:
+            cost = dict(observed, runs=0)
+        for key, value in observed.items():
+            previous = cost.get(key, value)
+            cost[key] = (1 - COST_SMOOTHING) * previous + COST_SMOOTHING * value
+        cost["runs"] += 1
+
+        self.costs[process_name] = cost
+        self.save()
+
+
+def count_pixels(
+        file_list: list[pathlib.Path] | list[str],
+        group_name: str
+) -> int:
+    """
+    Counts the pixels of the intensity of a data group in several files,
+    only the shapes of the datasets are read
+
+    Parameters
+    ----------
+    file_list :
+        List of the files' paths
+
+    group_name :
+        Name of the data group
+
+    Returns
+    -------
+    The total number of pixels, the files without this group are ignored
+    """
+    pixel_number = 0
+    for file_path in file_list:
+        with h5py.File(file_path, "r") as file_object:
+            dataset = file_object.get(f"ENTRY/{group_name}/I")
+            if isinstance(dataset, h5py.Dataset):
+                pixel_number += dataset.size
+    return pixel_number
+
 
 def get_group_names(
         file_list: list[pathlib.Path] | list[str]
@@ -87,14 +254,52 @@ class GUI_process(tk.Frame):
     progress_label :
         Label displaying the status of the application
 
+    progress_bar :
+        Bar displaying the number of files processed
+
     to_process:
         files that are to be processed
+
+    events :
+        Queue of the events sent by the thread of the running process,
+        it is read by the Tk loop
+
+    cancel_event :
+        Set to stop the running process once its current file is done
+
+    cost_model :
+        Costs of the processes learned from the past runs, used to estimate
+        the duration of a process before it starts
+
+    raw_data_budget_var :
+        Maximum memory in MB used to keep the raw data of the processed files,
+        empty for no limit, see NexusFile
     """
 
-    def __init__(self, parent) -> None:
+    def __init__(
+            self,
+            parent,
+            raw_data_budget: float | None = None
+    ) -> None:
+        """
+        Parameters
+        ----------
+        parent :
+            Parent widget
+
+        raw_data_budget :
+            Initial raw data budget in MB, None for no limit
+        """
         self.selected_files = None
         self.process = {}
         self.to_process = []
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = None
+        self.start_time = None
+        self.cost_model = ProcessCostModel()
+        self.file_estimate = None
+        self.raw_data_budget_var = tk.StringVar(value="" if raw_data_budget is None else str(raw_data_budget))
         for name, method in inspect.getmembers(NexusFile, predicate=inspect.isfunction):
             if name.startswith("process_"):
                 self.process[name.removeprefix("process_")] = method
@@ -121,13 +326,36 @@ class GUI_process(tk.Frame):
         self.frame_log.grid(row=0, rowspan=3, column=2, sticky="nsew", pady=5, padx=5)
         self._build_log()
 
+        self.frame_progress = tk.Frame(self)
+        self.frame_progress.grid(column=1, row=2, sticky="we", padx=5, pady=5)
+        self.frame_progress.columnconfigure(0, weight=1)
+
         self.progress_label = tk.Label(
-            self,
+            self.frame_progress,
             text="No processing in progress",
             font=FONT_TITLE,
             fg="#6DB06E"
         )
-        self.progress_label.grid(column=1, row=2, sticky="e", padx=5, pady=5)
+        self.progress_label.grid(column=0, row=0, columnspan=2, sticky="e")
+
+        self.progress_details = tk.Label(
+            self.frame_progress,
+            text="",
+            font=FONT_TEXT
+        )
+        self.progress_details.grid(column=0, row=1, columnspan=2, sticky="e")
+
+        self.progress_bar = ttk.Progressbar(self.frame_progress, mode="determinate")
+        self.progress_bar.grid(column=0, row=2, sticky="we", padx=5)
+
+        self.cancel_button = tk.Button(
+            self.frame_progress,
+            text="Cancel",
+            font=FONT_BUTTON,
+            command=self.cancel_processing,
+            state=tk.DISABLED
+        )
+        self.cancel_button.grid(column=1, row=2, sticky="e")
 
     def _inputs_building(self) -> None:
         """
@@ -182,14 +410,28 @@ class GUI_process(tk.Frame):
         )
         self.do_batch.grid(column=0, row=4, sticky="we", columnspan=2)
 
+        label_budget = tk.Label(
+            self.frame_inputs.interior,
+            text="Raw data budget (MB)",
+            font=FONT_TEXT
+        )
+        label_budget.grid(column=0, row=5, sticky="w", padx=5)
+
+        entry_budget = tk.Entry(
+            self.frame_inputs.interior,
+            textvariable=self.raw_data_budget_var,
+            font=FONT_TEXT
+        )
+        entry_budget.grid(column=1, row=5, sticky="we", padx=5)
+
         frame_title = tk.Label(
             self.frame_inputs.interior,
             text="Process options",
             font=FONT_TITLE
         )
-        frame_title.grid(column=0, row=5, sticky="w", pady=(5, 20), padx=5)
+        frame_title.grid(column=0, row=6, sticky="w", pady=(5, 20), padx=5)
 
-        current_row = 6
+        current_row = 7
         current_column = 0
 
         for process_name in self.process.keys():
@@ -341,7 +583,7 @@ class GUI_process(tk.Frame):
             self.frame_params.interior,
             text="Confirm",
             font=FONT_BUTTON,
-            command=lambda process=method: self.after(0, self._start_processing(process))
+            command=lambda process=method: self._start_processing(process)
         )
         confirm_button.grid(column=0, columnspan=2, row=current_row,
                             pady=15, padx=15)
@@ -390,39 +632,28 @@ class GUI_process(tk.Frame):
             self,
             message: str
     ) -> None:
-        """Function to print logs in the Tkinter Text widget."""
-
-        def print_message():
-            self.log_text.insert(tk.END, message + "\n\n")
-            self.log_text.see(tk.END)
-
-        self.after(
-            0,
-            print_message()
-        )
-
-        self.log_text.update_idletasks()
+        """Function to print logs in the Tkinter Text widget, it must be called by the Tk thread."""
+        self.log_text.insert(tk.END, message + "\n\n")
+        self.log_text.see(tk.END)
 
     def _start_processing(
             self,
             process
     ) -> None:
         """
-        Starting the selected process with the parameters filled out
+        Starting the selected process with the parameters filled out.
+        The process runs in its own thread, see _run_process
 
         Parameters
         ----------
         process :
             Callable method that needs to be applied
         """
-        self.progress_label.configure(
-            text="Processing in progress, please wait...",
-            fg="#C16200"
-        )
-        self.print_log(
-            "You're free to tab out of the window, but clicking on it might stop the log updates"
-        )
-        self.update()
+        if self.worker is not None and self.worker.is_alive():
+            self.print_log(
+                "A process is already running, wait for it to end or cancel it"
+            )
+            return
 
         # We get the selected file
         self.to_process = []
@@ -431,6 +662,12 @@ class GUI_process(tk.Frame):
         for index in selected_index:
             self.to_process += [self.selected_files[index]]
 
+        if len(self.to_process) == 0:
+            self.print_log(
+                "You didn't select any file to process."
+            )
+            return
+
         # We get the parameters and convert them
         param_dict = {}
         for widget in self.frame_params.interior.winfo_children():
@@ -447,65 +684,270 @@ class GUI_process(tk.Frame):
 
         # We fill out the parameters for every file
         do_batch_state = bool(self.do_batch_var.get())
-        # #############################
-        # profiler = cProfile.Profile()
-        # profiler.enable()
-        # #############################
+        process_name = process.__name__.removeprefix('process_').replace('_', ' ')
 
-        self.print_log(
-            f"Starting {process.__name__.removeprefix('process_').replace('_', ' ')}..."
+        do_process, reason = self._pre_process_tests(
+            param_dict=param_dict,
+            process=process,
+            do_batch_state=do_batch_state
         )
+        if not do_process:
+            self.print_log(
+                f"{process_name} has been canceled. Reason :\n{reason}"
+            )
+            return
 
-        if len(self.to_process) > 2:
-            single_time = self._estimate_time(process, param_dict)
-
+        # An empty raw data budget means no limit
+        budget_text = self.raw_data_budget_var.get().strip()
+        if budget_text and not (budget_text.replace(".", "", 1).isdigit() and float(budget_text) > 0):
             self.print_log(
-                f"Estimated process time :\n"
-                f"{single_time * len(self.to_process)} seconds"
+                f"{process_name} has been canceled. Reason :\n"
+                f"The raw data budget must be a positive number of MB or empty, got {budget_text}"
             )
+            return
+        raw_data_budget = float(budget_text) if budget_text else None
+
+        self.print_log(
+            f"Starting {process_name}..."
+        )
+
+        # The estimate is given by the worker once it has counted the pixels
+        self.file_estimate = None
+        self.progress_label.configure(
+            text="Processing in progress, please wait...",
+            fg="#C16200"
+        )
+        self.progress_details.configure(text=f"0/{len(self.to_process)} files")
+        self.progress_bar.configure(maximum=len(self.to_process), value=0)
+        self.cancel_button.configure(state=tk.NORMAL)
+        self.cancel_event.clear()
+        self.start_time = time.time()
+
+        self.worker = threading.Thread(
+            target=self._run_process,
+            args=(
+                process, param_dict, list(self.to_process),
+                do_batch_state, self.input_data.get(), raw_data_budget
+            ),
+            daemon=True
+        )
+        self.worker.start()
+        self.after(EVENT_POLL_INTERVAL, self._poll_events)
+
+    def _run_process(
+            self,
+            process,
+            param_dict: dict,
+            files: list[str],
+            do_batch_state: bool,
+            input_data_group: str,
+            raw_data_budget: float | None = None
+    ) -> None:
+        """
+        Runs a process, it is the target of the thread started by _start_processing.
+        Nothing is done on the widgets here, the logs, the progress and the
+        displays are sent to the Tk loop through the event queue
+
+        Parameters
+        ----------
+        process :
+            Callable method that needs to be applied
+
+        param_dict :
+            Parameters of the process
+
+        files :
+            Files to process
 
+        do_batch_state :
+            Whether the files are joined
+
+        input_data_group :
+            Data group used as input of the process
+
+        raw_data_budget :
+            Maximum memory in MB used to keep the raw data, None for no limit
+        """
+        process_name = process.__name__.removeprefix('process_').replace('_', ' ')
         nxfiles = None
         try:
-            nxfiles = NexusFile(self.to_process, do_batch_state, input_data_group=self.input_data.get())
-            do_process, reason = self._pre_process_tests(
-                param_dict=param_dict,
-                process=process,
-                do_batch_state=do_batch_state
+            # Opening every file to count the pixels is kept off the Tk thread
+            try:
+                pixel_number = count_pixels(files, input_data_group)
+            except OSError:
+                pixel_number = 0
+            self.events.put(("estimate", (process.__name__, len(files), pixel_number)))
+
+            nxfiles = NexusFile(
+                files,
+                do_batch_state,
+                input_data_group=input_data_group,
+                raw_data_budget=raw_data_budget,
+                progress_handler=self._report_progress,
+                display_handler=lambda draw: self.events.put(("display", draw))
             )
+            process(nxfiles, **param_dict)
+            self.events.put(("log", f"{process_name} done"))
+            self.events.put(("cost", (process.__name__, len(files), pixel_number)))
+        except ProcessCancelled as cancellation:
+            self.events.put(("log", str(cancellation)))
+        except Exception as exception:
+            self.events.put(("log", str(exception)))
+            raise exception
+        finally:
+            try:
+                if nxfiles is not None:
+                    nxfiles.nexus_close()
+            finally:
+                self.events.put(("done", None))
 
-            if do_process:
-                process(nxfiles, **param_dict)
+    def _report_progress(
+            self,
+            done: int,
+            total: int
+    ) -> None:
+        """
+        Progress handler of the running process, it is called in its thread
 
-                self.print_log(
-                    f"{process.__name__.removeprefix('process_').replace('_', ' ')} "
-                    f"done"
-                )
-            else:
-                self.print_log(
-                    f"{process.__name__.removeprefix('process_').replace('_', ' ')} "
-                    f"has been canceled. Reason :\n{reason}"
-                )
+        Parameters
+        ----------
+        done :
+            Number of files done
 
-        except Exception as exception:
-            self.print_log(
-                str(exception)
+        total :
+            Number of files
+        """
+        self.events.put(("progress", (done, total)))
+        if self.cancel_event.is_set() and done < total:
+            raise ProcessCancelled(
+                f"The process has been canceled after {done} of the {total} files"
             )
-            raise exception
-        finally:
-            if nxfiles is not None:
-                nxfiles.nexus_close()
-            self.after(
-                0,
-                self.progress_label.configure(
-                    text="No processing in progress",
-                    fg="#6DB06E"
-                )
+
+    def _poll_events(self) -> None:
+        """
+        Reads the events sent by the running process, it is called by the Tk loop
+        until the process is over
+        """
+        finished = False
+        while True:
+            try:
+                kind, content = self.events.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "log":
+                self.print_log(content)
+            elif kind == "progress":
+                self._show_progress(*content)
+            elif kind == "estimate":
+                self._show_estimate(*content)
+            elif kind == "cost":
+                self.cost_model.record(*content, time.time() - self.start_time)
+            elif kind == "display":
+                try:
+                    content()
+                except Exception as error:
+                    self.print_log(f"Error while displaying :\n{error}")
+            elif kind == "done":
+                finished = True
+
+        if finished:
+            self._end_processing()
+        else:
+            self.after(EVENT_POLL_INTERVAL, self._poll_events)
+
+    def _show_estimate(
+            self,
+            process_name: str,
+            file_number: int,
+            pixel_number: int
+    ) -> None:
+        """
+        Displays the time estimated by the cost model for the running process
+
+        Parameters
+        ----------
+        process_name :
+            Name of the process method
+
+        file_number :
+            Number of files to process
+
+        pixel_number :
+            Total number of pixels of the input data
+        """
+        time_estimate = self.cost_model.estimate(process_name, file_number, pixel_number)
+        if time_estimate is None:
+            self.file_estimate = None
+            self.print_log(
+                "Estimated process time :\n"
+                "unknown until the first file is done"
             )
-        # ####################################################
-        # profiler.disable()
-        # stats = pstats.Stats(profiler).sort_stats('tottime')
-        # stats.print_stats()
-        # ####################################################
+            return
+
+        self.file_estimate = time_estimate / file_number
+        self.print_log(
+            f"Estimated process time :\n"
+            f"{time_estimate:.0f} seconds"
+        )
+        # The estimate is sent before any progress, no file is done yet
+        self.progress_details.configure(
+            text=f"0/{file_number} files - {time_estimate:.0f} s remaining"
+        )
+
+    def _show_progress(
+            self,
+            done: int,
+            total: int
+    ) -> None:
+        """
+        Displays the number of files done, the throughput and the remaining time.
+        The time per file learned by the cost model is refined by the files done
+
+        Parameters
+        ----------
+        done :
+            Number of files done
+
+        total :
+            Number of files
+        """
+        elapsed_time = time.time() - self.start_time
+        throughput = done / elapsed_time if elapsed_time > 0 else 0
+        if self.file_estimate is None:
+            file_time = elapsed_time / done if done > 0 else 0
+        else:
+            file_time = (COST_PRIOR_WEIGHT * self.file_estimate + elapsed_time) / (COST_PRIOR_WEIGHT + done)
+        remaining_time = (total - done) * file_time
+
+        self.progress_bar.configure(maximum=total, value=done)
+        self.progress_details.configure(
+            text=f"{done}/{total} files - {throughput:.2f} files/s - "
+                 f"{remaining_time:.0f} s remaining"
+        )
+
+    def _end_processing(self) -> None:
+        """
+        Resets the progress widgets once the process is over
+        """
+        self.worker = None
+        self.cancel_button.configure(state=tk.DISABLED)
+        self.progress_label.configure(
+            text="No processing in progress",
+            fg="#6DB06E"
+        )
+
+    def cancel_processing(self) -> None:
+        """
+        Asks the running process to stop once its current file is done
+        """
+        if self.worker is None:
+            return
+        self.cancel_event.set()
+        self.cancel_button.configure(state=tk.DISABLED)
+        self.print_log(
+            "Canceling, the process stops once the current file is done"
+        )
 
     def _pre_process_tests(
             self,
@@ -539,54 +981,6 @@ class GUI_process(tk.Frame):
 
         return do_process, reason
 
-    def _estimate_time(
-            self,
-            process,
-            param_dict: dict,
-    ) -> float:
-        """
-        Function to estimate process time of one file
-        Parameters
-        ----------
-        process :
-            The process to estimate
-
-        test_file :
-            The file to test the execution time
-
-        Returns :
-            execution time of one file
-        -------
-
-        """
-        param_dict_single = copy.deepcopy(param_dict)
-        if "display" in param_dict_single.keys():
-            param_dict_single["display"] = False
-        if "save" in param_dict_single.keys():
-            param_dict_single["save"] = False
-
-        start_time = time.time()
-
-        nx_test_file = None
-        try:
-            nx_test_file = NexusFile([self.to_process[0]], False, input_data_group=self.input_data.get())
-            process(nx_test_file, **param_dict_single)
-            if process.__name__.removeprefix('process_').replace('_', ' ') == "display":
-                plt.close("all")
-        except Exception as error:
-            self.print_log(
-                f"Error while estimating time :\n{error}"
-            )
-        finally:
-            if nx_test_file is not None:
-                nx_test_file.nexus_close()
-            time_estimate = time.time() - start_time
-
-        del param_dict_single
-
-        time_estimate = np.round(time_estimate, 0)
-        return time_estimate
-
 
 if __name__ == "__main__":
     app = GUI_process()
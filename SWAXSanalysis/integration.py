@@ -0,0 +1,210 @@
+"""
+Batched integration of frames sharing the same geometry. The splitting of
+the pixels over the bins is computed once by pyFAI as a sparse CSR matrix and
+a whole stack of frames is then reduced by a single matrix product
+"""
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+from pyFAI import units
+from scipy import sparse
+
+# Number of pixel to bin assignments that are kept
+CSR_CACHE_SIZE = 16
+_csr_cache = OrderedDict()
+
+
+class CSRIntegrator:
+    """
+    Integrates frames with the full pixel splitting of pyFAI, the one smi_analysis
+    uses. The intensity of a bin is the sum of the intensity of the pixels, weighted
+    by their overlap with the bin, divided by the sum of their weighted solid angle,
+    like the integration of smi_analysis with correctSolidAngle.
+
+    The radial integration gives the intensity as a function of q. The azimuthal
+    integration cakes the frames in (chi, q) bins and averages the cake over q,
+    empty bins counting as 0, as smi_analysis does
+
+    Attributes
+    ----------
+    axis :
+        "radial" or "azimuthal"
+
+    matrix :
+        Sparse matrix of shape (number of bins, number of pixels) splitting the pixels over the bins
+
+    normalization :
+        Weighted sum of the solid angle of the pixels of each bin
+
+    bins :
+        Center of the bins of the result, in A^-1 for q and in degrees for chi
+
+    empty :
+        Value of the bins that contain no pixel
+    """
+
+    def __init__(
+            self,
+            integrator,
+            shape: tuple[int, int],
+            mask: np.ndarray,
+            radial_range: tuple[float, float] | list[float],
+            azimuth_range: tuple[float, float] | list[float],
+            npt_rad: int,
+            npt_azim: int = 1,
+            axis: str = "radial"
+    ) -> None:
+        """
+        Parameters
+        ----------
+        integrator :
+            pyFAI azimuthal integrator describing the geometry
+
+        shape :
+            Shape of the frames
+
+        mask :
+            Pixels to ignore
+
+        radial_range :
+            Range of q used, in A^-1
+
+        azimuth_range :
+            Range of chi used, in degrees
+
+        npt_rad :
+            Number of q bins
+
+        npt_azim :
+            Number of chi bins, only used by the azimuthal integration
+
+        axis :
+            "radial" or "azimuthal"
+        """
+        if axis not in ["radial", "azimuthal"]:
+            raise ValueError(f"Unknown integration axis : {axis}")
+        self.axis = axis
+        self.npt_rad = npt_rad
+        self.npt_azim = npt_azim if axis == "azimuthal" else 1
+        self.empty = -1.0 if axis == "radial" else 0.0
+
+        # pyFAI works in nm^-1 and radians
+        q_unit = units.to_unit("q_A^-1")
+        q_range = (radial_range[0] / q_unit.scale, radial_range[1] / q_unit.scale)
+        chi_range = tuple(np.deg2rad(azimuth_range))
+        if axis == "radial":
+            npt, unit = npt_rad, q_unit
+        else:
+            npt, unit = (npt_rad, self.npt_azim), (q_unit, units.to_unit("chi_deg"))
+        sparse_integrator = integrator.setup_sparse_integrator(
+            shape, npt,
+            mask=np.asarray(mask, dtype=np.int8),
+            pos0_range=q_range,
+            pos1_range=chi_range,
+            unit=unit,
+            split="full",
+            algo="CSR",
+            empty=self.empty,
+            scale=False
+        )
+
+        # The bins of the azimuthal integration are the (q, chi) bins of the cake
+        self.matrix = sparse.csr_matrix(
+            (sparse_integrator.data, sparse_integrator.indices, sparse_integrator.indptr),
+            shape=(self.npt_rad * self.npt_azim, shape[0] * shape[1])
+        )
+        solid_angle = integrator.solidAngleArray(shape, absolute=True).ravel()
+        self.normalization = self.matrix @ solid_angle
+
+        if axis == "radial":
+            self.bins = np.asarray(sparse_integrator.bin_centers) * q_unit.scale
+        else:
+            self.bins = np.rad2deg(sparse_integrator.bin_centers1)
+
+    def integrate(
+            self,
+            frames: np.ndarray
+    ) -> np.ndarray:
+        """
+        Integrates a stack of frames
+
+        Parameters
+        ----------
+        frames :
+            Array of shape (N, H, W), or a single (H, W) frame.
+            Non-finite values count as 0
+
+        Returns
+        -------
+        Array of shape (N, number of bins), or (number of bins,) for a single frame
+        """
+        single_frame = np.ndim(frames) == 2
+        frames = np.reshape(frames, (1 if single_frame else len(frames), -1))
+        frames = np.nan_to_num(frames, nan=0.0, posinf=0.0, neginf=0.0)
+
+        sums = (self.matrix @ frames.T).T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            intensity = sums / self.normalization
+        intensity[:, self.normalization == 0] = self.empty
+
+        if self.axis == "azimuthal":
+            intensity = intensity.reshape(-1, self.npt_rad, self.npt_azim).mean(axis=1)
+
+        if single_frame:
+            return intensity[0]
+        return intensity
+
+
+def get_csr_integrator(
+        integrator,
+        geometry_key: tuple,
+        shape: tuple[int, int],
+        mask: np.ndarray,
+        radial_range: tuple[float, float] | list[float],
+        azimuth_range: tuple[float, float] | list[float],
+        npt_rad: int,
+        npt_azim: int = 1,
+        axis: str = "radial"
+) -> CSRIntegrator:
+    """
+    Gets the CSRIntegrator of a geometry, it is only built the first time
+    a geometry, mask, range and number of bins are used
+
+    Parameters
+    ----------
+    integrator :
+        pyFAI azimuthal integrator describing the geometry
+
+    geometry_key :
+        Key identifying the geometry of the integrator
+
+    shape, mask, radial_range, azimuth_range, npt_rad, npt_azim, axis :
+        See CSRIntegrator
+
+    Returns
+    -------
+    The CSRIntegrator
+    """
+    mask = np.ascontiguousarray(mask, dtype=bool)
+    key = (
+        geometry_key,
+        tuple(shape),
+        hashlib.sha1(mask.tobytes()).hexdigest(),
+        (float(radial_range[0]), float(radial_range[1])),
+        (float(azimuth_range[0]), float(azimuth_range[1])),
+        int(npt_rad),
+        int(npt_azim),
+        axis
+    )
+    csr_integrator = _csr_cache.get(key)
+    if csr_integrator is None:
+        csr_integrator = CSRIntegrator(
+            integrator, shape, mask, radial_range, azimuth_range, npt_rad, npt_azim, axis
+        )
+        _csr_cache[key] = csr_integrator
+        if len(_csr_cache) > CSR_CACHE_SIZE:
+            _csr_cache.popitem(last=False)
+    else:
+        _csr_cache.move_to_end(key)
+    return csr_integrator
@@ -26,7 +26,7 @@ ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
 
 # GUI
 class MainApp(tk.Tk):
-    def __init__(self, ):
+    def __init__(self, raw_data_budget: float | None = None):
         super().__init__()
         self.title("edf2NeXus")
 
@@ -55,7 +55,7 @@ class MainApp(tk.Tk):
         notebook.grid(sticky="news", row=0)
 
         self.tab1 = GUI_generator(notebook)
-        self.tab2 = GUI_process(notebook)
+        self.tab2 = GUI_process(notebook, raw_data_budget=raw_data_budget)
         self.tab3 = GUI_setting(notebook)
 
         notebook.add(
@@ -99,7 +99,7 @@ def launcher_gui():
             )
         QUEUE_PATH.mkdir(parents=True, exist_ok=True)
 
-        app = MainApp(False)
+        app = MainApp()
         app.mainloop()
     except Exception as e:
         print("An error as occured", e)
@@ -122,6 +122,9 @@ if __name__ == "__main__":
 
         arg_parser = argparse.ArgumentParser()
         arg_parser.add_argument("--nogui", type=str)
+        arg_parser.add_argument("--workers", type=int, default=1)
+        arg_parser.add_argument("--watch", action="store_true")
+        arg_parser.add_argument("--raw-data-budget", type=float, default=None)
         arguments = arg_parser.parse_args()
 
         if arguments.nogui:
@@ -138,9 +141,9 @@ if __name__ == "__main__":
             raise ValueError("The argument --nogui must be true or false")
 
         if NO_GUI:
-            auto_generate()
+            auto_generate(workers=arguments.workers, watch=arguments.watch)
         else:
-            app = MainApp()
+            app = MainApp(raw_data_budget=arguments.raw_data_budget)
             app.mainloop()
     except Exception as e:
         print("An error as occured", e)
@@ -13,58 +13,241 @@ import threading
 import time
 import tkinter as tk
 import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from pathlib import Path
 from typing import Tuple
 
 import fabio
-from fabio.edfimage import EdfImage
 import h5py
 import numpy as np
+import psutil
 
 from . import FONT_TITLE, FONT_BUTTON, FONT_LOG
-from . import ICON_PATH, TREATED_PATH, QUEUE_PATH, DTC_PATH
+from . import ICON_PATH, TREATED_PATH, QUEUE_PATH, DTC_PATH, INDEX_PATH
 from .class_nexus_file import NexusFile
-from .utils import string_2_value, save_data, extract_from_h5, convert, long_path_formatting
+from .utils import string_2_value, save_data, extract_from_h5, convert, long_path_formatting, \
+    H5_FILE_SPACE_OPTIONS, COMPRESSION_POLICY, compression_options
 
 import cProfile
 import pstats
 
 
+class ConversionIndex:
+    """
+    Persistent index of the conversions, stored as an append-only JSON-lines
+    file in the DTC folder. Each line maps an edf file (path, size and
+    modification time) to the hdf5 file it produced and the status of the
+    conversion. When an edf is recorded several times, the last line wins.
+
+    Attributes
+    ----------
+    index_path :
+        Path of the JSON-lines file
+
+    entries :
+        key : edf path as a string
+        value : last entry recorded for this edf
+    """
+
+    def __init__(
+            self,
+            index_path: str | Path = INDEX_PATH
+    ) -> None:
+        self.index_path = Path(index_path)
+        self.entries = {}
+        self.load()
+
+    def load(self) -> None:
+        """
+        Loads the index file, the lines that can't be read
+        (interrupted writes) are ignored
+        """
+        self.entries = {}
+        if not self.index_path.exists():
+            return
+
+        line_number = 0
+        with open(self.index_path, "r", encoding="utf-8") as index_file:
+            for line in index_file:
+                line_number += 1
+                try:
+                    entry = json.loads(line)
+                    self.entries[entry["edf"]] = entry
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+
+        # The file is rewritten once it mostly contains outdated lines
+        if line_number > 2 * len(self.entries) + 100:
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Rewrites the index file with only the last entry of each edf
+        """
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as index_file:
+            for entry in self.entries.values():
+                index_file.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.index_path)
+
+    def lookup(
+            self,
+            edf_path: str | Path,
+            edf_stat: os.stat_result | None = None
+    ) -> dict | None:
+        """
+        Get the entry of an edf file if the file did not change since it was recorded
+        and, for a successful conversion, if the hdf5 file it produced still exists
+
+        Parameters
+        ----------
+        edf_path :
+            Path of the edf file
+
+        edf_stat :
+            Result of os.stat on the edf file, computed if not given
+
+        Returns
+        -------
+        The entry of the file, None if it is unknown, has changed or if its
+        hdf5 file was deleted
+        """
+        entry = self.entries.get(str(edf_path))
+        if entry is None:
+            return None
+
+        if edf_stat is None:
+            try:
+                edf_stat = os.stat(edf_path)
+            except OSError:
+                return None
+
+        if entry["size"] != edf_stat.st_size or entry["mtime"] != edf_stat.st_mtime_ns:
+            return None
+        if entry["status"] == "done" and not Path(entry["h5"]).exists():
+            return None
+        return entry
+
+    def record(
+            self,
+            edf_path: str | Path,
+            h5_path: str | Path,
+            status: str = "done",
+            error: str | None = None
+    ) -> None:
+        """
+        Appends the result of a conversion to the index
+
+        Parameters
+        ----------
+        edf_path :
+            Path of the converted edf file
+
+        h5_path :
+            Path of the hdf5 file produced
+
+        status :
+            "done" or "error"
+
+        error :
+            Description of the error, if any
+        """
+        try:
+            edf_stat = os.stat(edf_path)
+        except OSError:
+            return
+
+        entry = {
+            "edf": str(edf_path),
+            "size": edf_stat.st_size,
+            "mtime": edf_stat.st_mtime_ns,
+            "h5": str(h5_path),
+            "status": status
+        }
+        if error is not None:
+            entry["error"] = error
+        self.entries[entry["edf"]] = entry
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.index_path, "a", encoding="utf-8") as index_file:
+            index_file.write(json.dumps(entry) + "\n")
+
+
 def treated_data(
-        settings_path: str | Path
+        settings_path: str | Path,
+        edf_paths: None | list[str] | list[Path] = None,
+        index: ConversionIndex | None = None
 ):
     """
     Function used to build a list of non treated edf
 
     Parameters
     ----------
-    settings_path
+    settings_path :
+        Path of the settings file
+
+    edf_paths :
+        edf files to check. If None, the whole treatment queue is searched
+
+    index :
+        Index of the previous conversions. If given, the edf files it already
+        knows as converted are skipped without being opened and the Treated
+        Data folder is not searched
 
     Returns
     -------
-
+    edf_to_treat :
+        dict of the edf to treat, the keys are the edf paths and the values
+        the paths of the hdf5 files to create. None if there is nothing to treat
     """
     if settings_path is None:
         return None
 
-    with open(settings_path, "r", encoding="utf-8") as config_file:
-        config_dict = json.load(config_file)
+    config_dict, options, _ = load_settings(settings_path)
+    stack = options["output_mode"] == "stack"
 
     # We build the set of existing .h5
-    existing_h5 = set()
-    for filepath in glob.iglob(str(TREATED_PATH / "**/*.h5"), recursive=True):
-        existing_h5.add(Path(filepath).absolute())
+    existing_h5 = None
+    if edf_paths is None:
+        if index is None:
+            existing_h5 = set()
+            for filepath in glob.iglob(str(TREATED_PATH / "**/*.h5"), recursive=True):
+                existing_h5.add(Path(filepath).absolute())
+        edf_paths = glob.iglob(str(QUEUE_PATH / "**/*.edf"), recursive=True)
+
+    # The frames are appended to the stacks in the order of their names
+    if stack:
+        edf_paths = sorted(edf_paths)
+    stacked_edf = {}
 
     edf_to_treat = {}
-    for filepath in glob.iglob(str(QUEUE_PATH / "**/*.edf"), recursive=True):
+    for filepath in edf_paths:
+        filepath = str(filepath)
         if len(filepath) > 200:
             filepath = long_path_formatting(filepath)
         filepath = Path(filepath).absolute()
+
+        if index is not None:
+            entry = index.lookup(filepath)
+            if entry is not None and entry["status"] == "done":
+                continue
+
         target_dir = tree_structure_manager(filepath, settings_path)
-        h5_file_path = generate_h5_path(config_dict, filepath, target_dir).absolute()
-        if h5_file_path not in existing_h5:
+        h5_file_path = generate_h5_path(config_dict, filepath, target_dir, stack).absolute()
+        if stack:
+            if h5_file_path not in stacked_edf:
+                stacked_edf[h5_file_path] = stacked_edf_names(h5_file_path)
+            already_treated = filepath.name in stacked_edf[h5_file_path]
+        elif existing_h5 is None:
+            already_treated = h5_file_path.exists()
+        else:
+            already_treated = h5_file_path in existing_h5
+        if not already_treated:
             edf_to_treat[filepath] = h5_file_path
+        elif index is not None and index.lookup(filepath) is None:
+            index.record(filepath, h5_file_path)
 
     if len(edf_to_treat) == 0:
         edf_to_treat = None
@@ -72,6 +255,157 @@ def treated_data(
     return edf_to_treat
 
 
+class QueueWatcher:
+    """
+    Incremental watcher of the treatment queue. Instead of globbing the whole
+    queue, only the folders whose modification time changed are listed again,
+    the other ones are only stat-ed. An edf file is considered complete once
+    its size and modification time have not changed for stable_time seconds
+    and its header says the whole data block has been written.
+
+    Attributes
+    ----------
+    queue_path :
+        Folder that is watched
+
+    stable_time :
+        Time in seconds during which the size of a file must not change
+
+    poll_time :
+        Time in seconds between two scans
+
+    folders :
+        key : folder path
+        value : (modification time, list of sub folders)
+
+    pending :
+        key : edf path that is not complete yet
+        value : (size, modification time, time since which it is unchanged)
+
+    known :
+        edf files already pushed
+    """
+
+    def __init__(
+            self,
+            queue_path: str | Path = QUEUE_PATH,
+            stable_time: float = 0.5,
+            poll_time: float = 0.25
+    ) -> None:
+        self.queue_path = Path(queue_path)
+        self.stable_time = stable_time
+        self.poll_time = poll_time
+
+        self.folders = {}
+        self.pending = {}
+        self.known = set()
+
+    def prime(self) -> None:
+        """
+        Marks every complete edf file currently in the queue as known so that
+        only the files arriving afterward are pushed by scan. The files still
+        being written are left pending, scan pushes them once they are complete
+        """
+        self._list_new_files()
+        for edf_path in list(self.pending.keys()):
+            if edf_is_complete(edf_path):
+                del self.pending[edf_path]
+                self.known.add(edf_path)
+
+    def _list_new_files(self) -> None:
+        """
+        Walks the queue and lists again the folders that changed
+        """
+        to_visit = [self.queue_path]
+        seen_folders = set()
+        while to_visit:
+            folder = to_visit.pop()
+            seen_folders.add(folder)
+            try:
+                mtime = folder.stat().st_mtime_ns
+            except OSError:
+                continue
+
+            old_mtime, sub_folders = self.folders.get(folder, (None, []))
+            if old_mtime != mtime:
+                sub_folders = []
+                try:
+                    with os.scandir(folder) as entries:
+                        for entry in entries:
+                            if entry.is_dir():
+                                sub_folders.append(Path(entry.path))
+                            elif entry.name.lower().endswith(".edf"):
+                                edf_path = Path(entry.path)
+                                if edf_path not in self.known and edf_path not in self.pending:
+                                    self.pending[edf_path] = (-1, -1, time.time())
+                except OSError:
+                    continue
+                self.folders[folder] = (mtime, sub_folders)
+            to_visit.extend(sub_folders)
+
+        # We forget the folders that were deleted
+        for folder in list(self.folders.keys()):
+            if folder not in seen_folders:
+                del self.folders[folder]
+
+    def scan(self) -> list[Path]:
+        """
+        Scans the queue once
+
+        Returns
+        -------
+        The edf files that arrived and are complete since the last scan
+        """
+        self._list_new_files()
+
+        complete = []
+        now = time.time()
+        for edf_path, (size, mtime, since) in list(self.pending.items()):
+            try:
+                stat = edf_path.stat()
+            except OSError:
+                del self.pending[edf_path]
+                continue
+
+            if stat.st_size != size or stat.st_mtime_ns != mtime:
+                self.pending[edf_path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif stat.st_size > 0 and now - since >= self.stable_time and edf_is_complete(edf_path):
+                del self.pending[edf_path]
+                self.known.add(edf_path)
+                complete.append(edf_path)
+
+        return complete
+
+
+SETTINGS_OPTIONS = {
+    "compact_grids": False,
+    "compression": {},
+    "output_mode": "file"
+}
+
+
+def read_settings_options(
+        config_dict: dict
+) -> dict:
+    """
+    Reads the conversion options of a settings file. They are stored
+    under the "options" key, next to the description of the file.
+
+    Parameters
+    ----------
+    config_dict :
+        Content of the settings file
+
+    Returns
+    -------
+    options :
+        The options of the settings file completed by the default ones
+    """
+    options = dict(SETTINGS_OPTIONS)
+    options.update(config_dict.get("options", {}))
+    return options
+
+
 def data_treatment(
         data: np.ndarray,
         h5_file: h5py.File
@@ -90,7 +424,8 @@ def data_treatment(
     Returns
     -------
     output :
-        A dictionary containing the relevant data
+        A dictionary containing the relevant data, R_data contains
+        the horizontal and vertical axes of the position grid
     """
     # We get the metadata we need
     beam_center_x = h5_file["/ENTRY/INSTRUMENT/DETECTOR/beam_center_x"][()]
@@ -106,17 +441,12 @@ def data_treatment(
     x_list = x_list * x_pixel_size
     y_list = y_list * y_pixel_size
 
-    x_grid, y_grid = np.meshgrid(x_list, y_list)
-    r_grid = np.stack((x_grid, y_grid), axis=-1)
-
-    r_grid = np.moveaxis(r_grid, (0, 1, 2), (1, 2, 0))
-
     data_i = np.array(data, dtype=np.float32)
 
     logical_mask = np.logical_not(data_i > -1)
 
     output = {
-        "R_data": np.array(r_grid),
+        "R_data": (x_list, y_list),
         "I_data": np.array(data_i),
         "mask": np.array([logical_mask])
     }
@@ -143,55 +473,216 @@ def print_log(
         print(message)
 
 
-def auto_generate(gui_class=None) -> None:
+def convert_edf(
+        file_path: Path,
+        h5_file_path: Path,
+        settings_path: str | Path,
+        log=None
+) -> tuple[list[str], str | None]:
+    """
+    Converts one edf file to the NeXus format and reduces it (q space and
+    radial average). This function is defined at the module level so that
+    it can be sent to the workers of a process pool.
+
+    Parameters
+    ----------
+    file_path :
+        Path of the edf file to convert
+
+    h5_file_path :
+        Path of the hdf5 file that will be created
+
+    settings_path :
+        Path of the settings file
+
+    log :
+        Callable used to print the messages as they come. If None, the
+        messages are stored and returned instead
+
+    Returns
+    -------
+    messages :
+        The log messages produced by the conversion (empty if log is not None)
+
+    error :
+        The error that stopped the conversion, None if everything went fine
+    """
+    messages = []
+
+    def report(message):
+        if log is None:
+            messages.append(message)
+        else:
+            log(message)
+
+    report(f"Converting : {file_path.name}, please wait")
+
+    _, options, _ = load_settings(settings_path)
+
+    # The stacked frames are only converted, the q space, radial average and absolute
+    # intensity are not computed, a frame can be reduced with NexusFile(..., frame=...)
+    if options["output_mode"] == "stack":
+        try:
+            append_to_stack(file_path, h5_file_path, settings_path)
+        except Exception as exception:
+            report(str(exception))
+            return messages, str(exception)
+        report(
+            f"{file_path.name} has been added to {Path(h5_file_path).name}\n"
+            f"Warning : the stacked frames are not reduced\n"
+        )
+        return messages, None
+
+    # The raw data is reduced (q space and radial average) in the same write session
+    try:
+        generate_nexus(file_path, h5_file_path, settings_path, reduce=True)
+    except Exception as exception:
+        report(str(exception))
+        return messages, str(exception)
+
+    report(f"{file_path.name} has been converted and reduced successfully\n")
+
+    gc.collect()
+
+    return messages, None
+
+
+# Memory in MB above which auto_generate stops converting, it applies to the
+# memory traced in the conversion process or, with a pool, to the resident
+# memory each worker gained since its first conversion
+MEMORY_LIMIT = 500
+
+
+# Resident memory in bytes of the worker before its first conversion, the memory
+# limit applies to what the conversions add to it
+_WORKER_BASE_MEMORY = None
+
+
+def convert_edf_in_worker(
+        file_path: Path,
+        h5_file_path: Path,
+        settings_path: str | Path
+) -> tuple[list[str], str | None, tuple[int, int]]:
+    """
+    Converts one edf file like convert_edf in a worker of the process pool of
+    auto_generate, the resident memory of the worker is read before and after
+    the conversion so that the memory limit applies to the workers
+
+    Parameters
+    ----------
+    file_path :
+        Path of the edf file to convert
+
+    h5_file_path :
+        Path of the hdf5 file that will be created
+
+    settings_path :
+        Path of the settings file
+
+    Returns
+    -------
+    messages, error :
+        See convert_edf
+
+    memory :
+        Memory in bytes used by the worker before and after the conversion,
+        counted from its resident memory before its first conversion
+    """
+    global _WORKER_BASE_MEMORY
+    process = psutil.Process()
+    memory_before = process.memory_info().rss
+    if _WORKER_BASE_MEMORY is None:
+        _WORKER_BASE_MEMORY = memory_before
+    messages, error = convert_edf(file_path, h5_file_path, settings_path)
+    memory_after = process.memory_info().rss
+    return messages, error, (
+        max(memory_before - _WORKER_BASE_MEMORY, 0),
+        max(memory_after - _WORKER_BASE_MEMORY, 0)
+    )
+
+
+def auto_generate(
+        gui_class=None,
+        workers: int = 1,
+        watch: bool = False
+) -> None:
     """
     This is a thread that runs continuously
     and tries to export edf files found in the parent folder
     into h5 files using the settings file found in the DTC folder.
+
+    Parameters
+    ----------
+    gui_class :
+        GUI in which the logs are printed. If None, they are printed in the console
+
+    workers :
+        Number of files converted and reduced at the same time. If greater
+        than 1, the files are treated by a pool of processes and the memory
+        limit applies to each of them
+
+    watch :
+        If True, the treatment queue is watched and the new edf files are
+        converted as soon as they are complete instead of stopping once the
+        initial list of files is empty
     """
     # profiler = cProfile.Profile()
     # profiler.enable()
 
-    tracemalloc.start()
+    # The workers measure their own memory, tracemalloc is only needed without them
+    if workers <= 1:
+        tracemalloc.start()
     start_time = time.time()
     sleep_time = 10
 
     settings_path = search_setting()
+
+    # The watcher is primed before the list is built so that no file is missed
+    watcher = None
+    if watch:
+        watcher = QueueWatcher(QUEUE_PATH)
+        watcher.prime()
+
     print_log(
         gui_class,
         "Building list of files to process. This may take a while"
     )
-    edf_to_treat = treated_data(settings_path)
+    index = ConversionIndex(INDEX_PATH)
+    edf_to_treat = treated_data(settings_path, index=index)
     print_log(
         gui_class,
         "The list of files to process has been built."
     )
+    if watch and edf_to_treat is None:
+        edf_to_treat = {}
+
+    # The files that were still being written are converted once the watcher pushes them
+    if watcher is not None:
+        for edf_path in watcher.pending:
+            edf_to_treat.pop(edf_path.absolute(), None)
 
     edf_with_error = {}
 
+    # Futures of the files being treated by the pool and the hdf5 files they write,
+    # a target is never given to two workers at the same time
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        print_log(
+            gui_class,
+            f"Converting with {workers} workers"
+        )
+    in_progress = {}
+    targets_in_progress = set()
+
     do_while = True
 
-    while do_while:
+    while do_while or len(in_progress) != 0:
         if gui_class is not None:
-            do_while = gui_class.activate_thread
+            do_while = do_while and gui_class.activate_thread
 
         if gui_class is not None and time.time() - start_time > 3500:
-            break
-        current, peak = tracemalloc.get_traced_memory()
-
-        print_log(
-            gui_class,
-            f"Memory used:\n"
-            f"  - Current: {current / (1024 ** 2):.2f} MB\n"
-            f"  - Peak: {peak / (1024 ** 2):.2f} MB"
-        )
-
-        if peak / (1024 ** 2) > 500 or current / (1024 ** 2) > 500:
-            print_log(
-                gui_class,
-                f"Too much memory used: {current}, {peak}"
-            )
-            break
+            do_while = False
 
         if settings_path is None:
             print_log(
@@ -202,109 +693,120 @@ def auto_generate(gui_class=None) -> None:
             time.sleep(sleep_time)
             continue
 
-        if edf_to_treat is None:
-            print_log(
-                gui_class,
-                f"No edf file found, stopping conversion..."
-            )
-            break
+        if watcher is not None and do_while:
+            new_edf = watcher.scan()
+            if new_edf:
+                new_edf_to_treat = treated_data(settings_path, new_edf, index)
+                if new_edf_to_treat is not None:
+                    edf_to_treat.update(new_edf_to_treat)
+                    print_log(
+                        gui_class,
+                        f"{len(new_edf_to_treat)} new edf file(s) found in the queue"
+                    )
 
-        if len(edf_to_treat.items()) == 0:
+        if (edf_to_treat is None or len(edf_to_treat.items()) == 0) and len(in_progress) == 0:
+            if watcher is not None and do_while:
+                time.sleep(watcher.poll_time)
+                continue
             print_log(
                 gui_class,
                 f"No edf file found, stopping conversion..."
             )
             break
 
-        try:
-            file_path, h5_file_path = next(iter(edf_to_treat.items()))
-        except Exception as exception:
+        if executor is None:
+            current, peak = tracemalloc.get_traced_memory()
+
             print_log(
                 gui_class,
-                f"The list of file to treat is empty."
+                f"Memory used:\n"
+                f"  - Current: {current / (1024 ** 2):.2f} MB\n"
+                f"  - Peak: {peak / (1024 ** 2):.2f} MB"
             )
-            continue
 
-        print_log(
-            gui_class,
-            f"Converting : {file_path.name}, please wait"
-        )
+            if peak / (1024 ** 2) > MEMORY_LIMIT or current / (1024 ** 2) > MEMORY_LIMIT:
+                print_log(
+                    gui_class,
+                    f"Too much memory used: {current}, {peak}"
+                )
+                do_while = False
 
-        try:
-            new_file_path = generate_nexus(file_path, h5_file_path, settings_path)
-        except Exception as exception:
-            print_log(
-                gui_class,
-                str(exception)
+            if not do_while:
+                break
+
+            file_path, h5_file_path = next(iter(edf_to_treat.items()))
+            _, error = convert_edf(
+                file_path,
+                h5_file_path,
+                settings_path,
+                log=lambda message: print_log(gui_class, message)
             )
-            edf_with_error[file_path] = str(exception)
+            if error is not None:
+                edf_with_error[file_path] = error
+                index.record(file_path, h5_file_path, "error", error)
+            else:
+                index.record(file_path, h5_file_path)
             del edf_to_treat[file_path]
             continue
 
-        print_log(
-            gui_class,
-            f"{file_path.name} has been converted successfully\n"
-        )
-
-        # We decide whether we want to do absolute intensity treatment or not
-        if len(str(new_file_path)) > 200:
-            new_file_path = Path(
-                long_path_formatting(
-                    str(new_file_path)
-                )
-            )
-        with h5py.File(new_file_path, "r") as h5obj:
-            do_absolute = h5obj.get("/ENTRY/COLLECTION/do_absolute_intensity", False)[()]
-        if do_absolute == 1:
-            input_group = "DATA_ABS"
-        else:
-            input_group = "DATA"
+        # We fill the pool, skipping the files whose target is already being written
+        if do_while:
+            for file_path, h5_file_path in edf_to_treat.items():
+                if len(in_progress) >= workers:
+                    break
+                if h5_file_path in targets_in_progress or file_path in in_progress.values():
+                    continue
+                future = executor.submit(convert_edf_in_worker, file_path, h5_file_path, settings_path)
+                in_progress[future] = file_path
+                targets_in_progress.add(h5_file_path)
+
+        if len(in_progress) == 0:
+            break
 
-        # We then do the absolute treatment
-        print_log(
-            gui_class,
-            f"Opening {Path(new_file_path).name} using {input_group} as base data"
+        # While watching, we come back regularly to look for new files
+        done, _ = wait(
+            in_progress.keys(),
+            timeout=watcher.poll_time if watcher is not None else None,
+            return_when=FIRST_COMPLETED
         )
-        nx_file = None
-        try:
-            nx_file = NexusFile([new_file_path], input_data_group=input_group)
-            # Do Q space
-            print_log(
-                gui_class,
-                "Doing q space..."
-            )
-            nx_file.process_q_space(save=True)
-            print_log(
-                gui_class,
-                "q space done."
-            )
-
-            # Do radial average
+        for future in done:
+            file_path = in_progress.pop(future)
+            h5_file_path = edf_to_treat[file_path]
+            targets_in_progress.discard(h5_file_path)
+            try:
+                messages, error, (worker_before, worker_after) = future.result()
+            except Exception as exception:
+                messages, error = [str(exception)], str(exception)
+                worker_before, worker_after = 0, 0
+            for message in messages:
+                print_log(gui_class, message)
+
+            # The memory of the parent process does not include the one of its workers
             print_log(
                 gui_class,
-                "Doing radial integration"
+                f"Memory used by the worker:\n"
+                f"  - Before the file: {worker_before / (1024 ** 2):.2f} MB\n"
+                f"  - After the file: {worker_after / (1024 ** 2):.2f} MB"
             )
-            nx_file.process_radial_average(save=True)
-            print_log(
-                gui_class,
-                "radial integration done."
-            )
-        except Exception as exception:
-            print_log(
-                gui_class,
-                str(exception)
-            )
-            continue
-        finally:
-            if nx_file is not None:
-                nx_file.nexus_close()
-
-        del nx_file
-        del edf_to_treat[file_path]
-        gc.collect()
+            if worker_after / (1024 ** 2) > MEMORY_LIMIT:
+                print_log(
+                    gui_class,
+                    f"Too much memory used by a worker: {worker_before}, {worker_after}"
+                )
+                do_while = False
+            if error is not None:
+                edf_with_error[file_path] = error
+                index.record(file_path, h5_file_path, "error", error)
+            else:
+                index.record(file_path, h5_file_path)
+            del edf_to_treat[file_path]
         # print(time.time() - start_time)
 
-    tracemalloc.stop()
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
     print_log(
         gui_class,
         "The program is done! you can close or start it again.\n\n"
@@ -321,11 +823,221 @@ def auto_generate(gui_class=None) -> None:
     # stats.print_stats()
 
 
+# Settings files already loaded, the key is the path of the settings file and the value
+# is (modification time, content, options, template)
+_settings_cache = {}
+
+
+def compile_settings(
+        dict_content: dict,
+        parent_path: str = ""
+) -> list[tuple]:
+    """
+    Compiles the elements described by a settings file into a flat template,
+    the list of the operations that fill_hdf5 applies to every file. The values
+    that do not come from the header are converted once, here.
+
+    Each operation is (element type, h5 path of the parent, name, header key,
+    NeXus type, units, value used when the header key is not in the header)
+
+    Parameters
+    ----------
+    dict_content :
+        Content of the settings file, or of one of its elements
+
+    parent_path :
+        h5 path of the element containing dict_content
+
+    Returns
+    -------
+    The template, the parents are always created before their content
+    """
+    template = []
+    for key, value in dict_content.items():
+        clean_key = key.strip("/").strip("@")
+        path = f"{parent_path}/{clean_key}"
+
+        content = value.get("content")
+        element_type = value.get("element type")
+
+        if element_type == "group":
+            template.append(("group", parent_path, clean_key, None, None, None, None))
+            if content:
+                template += compile_settings(content, path)
+
+        elif element_type == "dataset":
+            units = None
+            if content and content.get("@units"):
+                units = tuple(content["@units"]["value"][:2])
+            literal_value = string_2_value(str(value["value"]), value["type"])
+            if units:
+                literal_value = convert(literal_value, units[0], units[1])
+            template.append(
+                ("dataset", parent_path, clean_key, value["value"], value["type"], units, literal_value)
+            )
+            if content:
+                template += compile_settings(content, path)
+
+        elif element_type == "attribute":
+            if not (isinstance(value["value"], list)):
+                header_key = value["value"]
+                literal_value = value["value"]
+            else:
+                header_key = None
+                literal_value = value["value"][1]
+            unit_type = value["type"] if clean_key != "version" else None
+            if unit_type is not None:
+                literal_value = string_2_value(str(literal_value), unit_type)
+            template.append(("attribute", parent_path, clean_key, header_key, unit_type, None, literal_value))
+
+    return template
+
+
+def load_settings(
+        settings_path: str | Path
+) -> tuple[dict, dict, list[tuple]]:
+    """
+    Loads a settings file, it is only read and compiled again
+    when it has been modified
+
+    Parameters
+    ----------
+    settings_path :
+        Path of the settings file
+
+    Returns
+    -------
+    config_dict :
+        Content of the settings file, it must not be modified
+
+    options :
+        Options of the settings file, see read_settings_options
+
+    template :
+        Compiled template of the settings file, see compile_settings
+    """
+    key = str(Path(settings_path).absolute())
+    settings_mtime = os.stat(settings_path).st_mtime_ns
+    cached = _settings_cache.get(key)
+    if cached is not None and cached[0] == settings_mtime:
+        return cached[1], cached[2], cached[3]
+
+    with open(settings_path, "r", encoding="utf-8") as config_file:
+        config_dict = json.load(config_file)
+    options = read_settings_options(config_dict)
+    template = compile_settings(config_dict)
+
+    _settings_cache[key] = (settings_mtime, config_dict, options, template)
+    return config_dict, options, template
+
+
+def fill_hdf5(
+        file: h5py.File,
+        template: list[tuple],
+        edf_header: dict
+) -> None:
+    """
+    Fills an hdf5 file with the elements of a compiled settings file,
+    the values are taken from the header of the edf file when they refer to it
+
+    Parameters
+    ----------
+    file :
+        File to fill
+
+    template :
+        Compiled settings file, see compile_settings
+
+    edf_header :
+        Header of the edf file
+    """
+    utf8_dtype = h5py.string_dtype(encoding="utf-8")
+
+    elements = {"": file}
+    for element_type, parent_path, name, header_key, unit_type, units, literal_value in template:
+        parent_element = elements[parent_path]
+
+        if element_type == "group":
+            elements[f"{parent_path}/{name}"] = parent_element.create_group(name)
+            continue
+
+        if header_key is not None and header_key in edf_header:
+            element_value = edf_header[header_key]
+            if unit_type is not None:
+                element_value = string_2_value(str(element_value), unit_type)
+            if units:
+                element_value = convert(element_value, units[0], units[1])
+        else:
+            element_value = literal_value
+
+        if element_type == "dataset":
+            if isinstance(element_value, str):
+                dataset = parent_element.create_dataset(name, dtype=utf8_dtype, data=element_value)
+            else:
+                dataset = parent_element.create_dataset(name, data=element_value)
+            elements[f"{parent_path}/{name}"] = dataset
+        else:
+            parent_element.attrs[name] = element_value
+
+
+# Direct beams already converted, the key is (path of the edf, path of the
+# settings) and the value is (modification time of the edf, path of the hdf5)
+DB_CONVERSION_CACHE_SIZE = 64
+_db_conversion_cache = OrderedDict()
+
+
+def convert_direct_beam(
+        db_edf_path: str | Path,
+        hdf5_path: str | Path,
+        settings_path: str | Path
+) -> str:
+    """
+    Converts the edf file of a direct beam. The samples measured against the
+    same direct beam share its hdf5 file, it is only converted again if
+    the edf file has been modified or the hdf5 file has been deleted
+
+    Parameters
+    ----------
+    db_edf_path :
+        Path of the edf file of the direct beam
+
+    hdf5_path :
+        Path of the hdf5 file of the sample, the direct beam is saved next to it
+
+    settings_path :
+        Path of the settings file
+
+    Returns
+    -------
+    The path of the hdf5 file of the direct beam
+    """
+    key = (str(Path(db_edf_path).absolute()), str(Path(settings_path).absolute()))
+    db_mtime = os.stat(db_edf_path).st_mtime_ns
+    cached = _db_conversion_cache.get(key)
+    if cached is not None and cached[0] == db_mtime and Path(cached[1]).exists():
+        _db_conversion_cache.move_to_end(key)
+        return cached[1]
+
+    db_hdf5_path = generate_nexus(
+        db_edf_path,
+        hdf5_path,
+        settings_path,
+        is_db=True
+    )
+
+    _db_conversion_cache[key] = (db_mtime, db_hdf5_path)
+    if len(_db_conversion_cache) > DB_CONVERSION_CACHE_SIZE:
+        _db_conversion_cache.popitem(last=False)
+
+    return db_hdf5_path
+
+
 def generate_nexus(
         edf_path: str | Path,
         hdf5_path: str | Path,
         settings_path: str | Path,
-        is_db: bool = False
+        is_db: bool = False,
+        reduce: bool = False
 ) -> str:
     """
     The main function. it creates the hdf5 file and fills all it's content
@@ -336,6 +1048,11 @@ def generate_nexus(
     is_db :
         flag to know if the data is a direct beam data
 
+    reduce :
+        If True, the data is also put in q space and radially averaged. The
+        reduction is done while the file is still opened, from the data read
+        in the edf file, so that nothing is read back from the hdf5 file
+
     edf_path :
         Path of the original file
 
@@ -348,60 +1065,9 @@ def generate_nexus(
     hdf5_path = Path(hdf5_path)
     edf_path = Path(edf_path)
     edf_name = edf_path.name
-    edf_file = fabio.open(edf_path)
-    edf_header = edf_file.header
-    edf_data = edf_file.data
-
-    def fill_hdf5(file, dict_content, parent_element=None):
-        utf8_dtype = h5py.string_dtype(encoding="utf-8")
-
-        for key, value in dict_content.items():
-            clean_key = key.strip("/").strip("@")
-
-            if parent_element is None:
-                parent_element = file
-
-            content = value.get("content")
-            element_type = value.get("element type")
-
-            current_element = None
-            if element_type == "group":
-                current_element = parent_element.create_group(clean_key)
-                if content:
-                    fill_hdf5(file, content, current_element)
-
-            elif element_type == "dataset":
-                dataset_value = edf_header.get(value["value"], value["value"])
-                dataset_value = string_2_value(str(dataset_value), value["type"])
-                if content:
-                    unit_attribute = content.get("@units")
-                    if unit_attribute:
-                        dataset_value = convert(dataset_value,
-                                                unit_attribute["value"][0],
-                                                unit_attribute["value"][1])
-                if isinstance(dataset_value, str):
-                    dtype = utf8_dtype
-                    current_element = parent_element.create_dataset(
-                        clean_key,
-                        dtype=dtype,
-                        data=dataset_value
-                    )
-                else:
-                    current_element = parent_element.create_dataset(
-                        clean_key,
-                        data=dataset_value
-                    )
-                if content:
-                    fill_hdf5(file, content, current_element)
-
-            elif element_type == "attribute":
-                if not (isinstance(value["value"], list)):
-                    attribute_value = edf_header.get(value["value"], value["value"])
-                else:
-                    attribute_value = value["value"][1]
-                if clean_key != "version":
-                    attribute_value = string_2_value(str(attribute_value), value["type"])
-                parent_element.attrs[clean_key] = attribute_value
+    # The header is usually already in the cache since it was read to generate hdf5_path
+    edf_header = read_edf_header(edf_path)
+    edf_data = read_edf_data(edf_path)
 
     # We save the data
     if hdf5_path.exists():
@@ -415,8 +1081,7 @@ def generate_nexus(
 
     target_dir = hdf5_path.parent
     target_dir.mkdir(parents=True, exist_ok=True)
-    with open(settings_path, "r", encoding="utf-8") as config_file:
-        config_dict = json.load(config_file)
+    _, options, template = load_settings(settings_path)
 
     if len(str(hdf5_path)) > 200:
         hdf5_path = Path(
@@ -425,8 +1090,8 @@ def generate_nexus(
             )
         )
 
-    with h5py.File(hdf5_path, "w") as save_file:
-        fill_hdf5(save_file, config_dict)
+    with h5py.File(hdf5_path, "w", **H5_FILE_SPACE_OPTIONS) as save_file:
+        fill_hdf5(save_file, template, edf_header)
 
         treated_data = data_treatment(edf_data, save_file)
 
@@ -436,7 +1101,9 @@ def generate_nexus(
             "Q",
             treated_data["R_data"],
             treated_data["I_data"],
-            treated_data["mask"]
+            treated_data["mask"],
+            compact_grid=options["compact_grids"],
+            compression_policy=options["compression"]
         )
 
         del save_file["ENTRY/DATA"].attrs["I_axes"]
@@ -461,32 +1128,236 @@ def generate_nexus(
             do_while = True
             while len(db_path.parts[1:]) != 0 and do_while:
                 try:
-                    db_hdf5_path = generate_nexus(
+                    db_hdf5_path = convert_direct_beam(
                         QUEUE_PATH / db_path,
                         hdf5_path,
-                        settings_path,
-                        is_db=True
+                        settings_path
                     )
                     do_while = False
                 except Exception as exception:
                     db_path = pathlib.Path(*db_path.parts[1:])
 
-    if do_absolute == 1 and not is_db:
-        nx_file = NexusFile([hdf5_path], do_batch=False)
-        try:
-            nx_file.process_absolute_intensity(
-                db_hdf5_path,
-                group_name="DATA_ABS",
-                save=True
+        if is_db:
+            return str(hdf5_path)
+
+        # The processes work on the opened file, their raw data is the one already in memory.
+        # The coordinates are kept as the axes of the grid, like a compact grid read from a file
+        raw_data = {
+            "I": treated_data["I_data"],
+            "Q": treated_data["R_data"],
+            "mask": treated_data["mask"]
+        }
+
+        def open_nexus(input_group):
+            nx_file = NexusFile(
+                [save_file],
+                do_batch=False,
+                input_data_group=input_group,
+                compression_policy=options["compression"]
             )
-        except Exception as error:
-            raise error
-        finally:
-            nx_file.nexus_close()
+            for dataset_name, dataset in raw_data.items():
+                # The absolute intensity is only known once it has been computed
+                if input_group == "DATA" or dataset_name == "mask":
+                    nx_file.raw_data.get((hdf5_path.name, dataset_name), lambda: dataset)
+            return nx_file
+
+        if do_absolute == 1:
+            nx_file = open_nexus("DATA")
+            try:
+                nx_file.process_absolute_intensity(
+                    db_hdf5_path,
+                    group_name="DATA_ABS",
+                    save=True
+                )
+            finally:
+                nx_file.nexus_close()
+
+        if reduce:
+            nx_file = open_nexus("DATA_ABS" if do_absolute == 1 else "DATA")
+            try:
+                nx_file.process_q_space(save=True)
+                nx_file.process_radial_average(save=True)
+            finally:
+                nx_file.nexus_close()
 
     return str(hdf5_path)
 
 
+def create_stack(
+        stack_path: Path,
+        template: list[tuple],
+        edf_header: dict,
+        edf_data: np.ndarray,
+        options: dict
+) -> None:
+    """
+    Creates a stack file, its metadata tree is filled with the header of the first
+    frame and its DATA group contains resizable (frame, y, x) datasets for I and
+    the mask, chunked frame by frame. The position grid is shared by every frame.
+    The FRAMES group is a table containing the header of every frame
+
+    Parameters
+    ----------
+    stack_path :
+        Path of the new stack file
+
+    template :
+        Compiled settings file, see compile_settings
+
+    edf_header :
+        Header of the first frame
+
+    edf_data :
+        Data of the first frame
+
+    options :
+        Options of the settings file
+    """
+    policy = dict(COMPRESSION_POLICY)
+    policy.update(options["compression"])
+
+    with h5py.File(stack_path, "w", **H5_FILE_SPACE_OPTIONS) as stack_file:
+        fill_hdf5(stack_file, template, edf_header)
+        treated_data = data_treatment(edf_data, stack_file)
+
+        # The grid and the attributes of the datasets are written as for a single frame
+        save_data(
+            stack_file,
+            "DATA",
+            "Q",
+            treated_data["R_data"],
+            treated_data["I_data"],
+            treated_data["mask"],
+            compact_grid=options["compact_grids"],
+            compression_policy=options["compression"]
+        )
+
+        data_group = stack_file["ENTRY/DATA"]
+        height, width = np.shape(treated_data["I_data"])
+        for dataset_name, dtype, role in [("I", np.float32, "intensity"), ("mask", bool, "mask")]:
+            attributes = dict(data_group[dataset_name].attrs)
+            del data_group[dataset_name]
+            dataset = data_group.create_dataset(
+                dataset_name,
+                shape=(0, height, width),
+                maxshape=(None, height, width),
+                chunks=(1, height, width),
+                dtype=dtype,
+                **compression_options(policy[role])
+            )
+            for attr_name, attr_value in attributes.items():
+                dataset.attrs[attr_name] = attr_value
+        if "Idev" in data_group:
+            del data_group["Idev"]
+            del data_group["I"].attrs["uncertainties"]
+        data_group.create_dataset("frame", shape=(0,), maxshape=(None,), dtype=np.int64)
+
+        data_group.attrs["I_axes"] = ["frame", "Q", "Q"]
+        data_group.attrs["Q_indices"] = [1, 2]
+        data_group.attrs["frame_indices"] = [0]
+        data_group.attrs["mask_indices"] = [0, 1, 2]
+
+        frames_group = stack_file["ENTRY"].create_group("FRAMES")
+        frames_group.attrs["NX_class"] = "NXcollection"
+
+
+def append_to_stack(
+        edf_path: str | Path,
+        stack_path: str | Path,
+        settings_path: str | Path
+) -> str:
+    """
+    Appends a frame to a stack file, the file is created if it does not exist.
+    The frames of a stack must have the same shape
+
+    Parameters
+    ----------
+    edf_path :
+        Path of the edf file of the frame
+
+    stack_path :
+        Path of the stack file
+
+    settings_path :
+        Path of the settings file
+
+    Returns
+    -------
+    The path of the stack file
+    """
+    edf_path = Path(edf_path)
+    stack_path = Path(stack_path)
+    edf_header = read_edf_header(edf_path)
+    edf_data = read_edf_data(edf_path)
+
+    _, options, template = load_settings(settings_path)
+
+    if not stack_path.exists():
+        stack_path.parent.mkdir(parents=True, exist_ok=True)
+        create_stack(stack_path, template, edf_header, edf_data, options)
+
+    utf8_dtype = h5py.string_dtype(encoding="utf-8")
+    with h5py.File(stack_path, "r+") as stack_file:
+        data_group = stack_file["ENTRY/DATA"]
+        frames_group = stack_file["ENTRY/FRAMES"]
+
+        if "edf_name" in frames_group and \
+                edf_path.name in frames_group["edf_name"].asstr()[:]:
+            raise Exception(f"{edf_path.name} is already in {stack_path}")
+
+        frame_index, height, width = data_group["I"].shape
+        if np.shape(edf_data) != (height, width):
+            raise ValueError(
+                f"The shape of {edf_path.name}, {np.shape(edf_data)}, "
+                f"is not the shape of the frames of {stack_path}, {(height, width)}"
+            )
+
+        data_i = np.array(edf_data, dtype=np.float32)
+        for dataset_name, value in [
+            ("I", data_i),
+            ("mask", np.logical_not(data_i > -1)),
+            ("frame", frame_index)
+        ]:
+            data_group[dataset_name].resize(frame_index + 1, axis=0)
+            data_group[dataset_name][frame_index] = value
+
+        # One column per header key, the keys missing from a frame are left empty
+        row = {str(key).replace("/", "_"): value for key, value in edf_header.items()}
+        row["edf_name"] = edf_path.name
+        for key in set(row) | set(frames_group):
+            if key not in frames_group:
+                frames_group.create_dataset(
+                    key, shape=(frame_index,), maxshape=(None,), dtype=utf8_dtype
+                )
+            frames_group[key].resize(frame_index + 1, axis=0)
+            frames_group[key][frame_index] = str(row.get(key, ""))
+
+    return str(stack_path)
+
+
+def stacked_edf_names(
+        stack_path: str | Path
+) -> set[str]:
+    """
+    Gives the names of the edf files already appended to a stack file
+
+    Parameters
+    ----------
+    stack_path :
+        Path of the stack file
+
+    Returns
+    -------
+    The set of edf names, empty if the stack does not exist
+    """
+    if not Path(stack_path).exists():
+        return set()
+    with h5py.File(stack_path, "r") as stack_file:
+        if "ENTRY/FRAMES/edf_name" not in stack_file:
+            return set()
+        return set(stack_file["ENTRY/FRAMES/edf_name"].asstr()[:])
+
+
 def search_setting() -> None | Path:
     """
     This function searches the settings file
@@ -509,10 +1380,205 @@ def search_setting() -> None | Path:
     return Path(settings_path)
 
 
+# Numpy types of the EDF data types and byte orders
+EDF_DATA_TYPES = {
+    "SignedByte": np.int8,
+    "UnsignedByte": np.uint8,
+    "SignedShort": np.int16,
+    "UnsignedShort": np.uint16,
+    "SignedInteger": np.int32,
+    "UnsignedInteger": np.uint32,
+    "SignedLong": np.int32,
+    "UnsignedLong": np.uint32,
+    "Signed64": np.int64,
+    "Unsigned64": np.uint64,
+    "FloatValue": np.float32,
+    "Float": np.float32,
+    "DoubleValue": np.float64,
+    "Double": np.float64
+}
+EDF_BYTE_ORDERS = {
+    "LowByteFirst": "<",
+    "HighByteFirst": ">"
+}
+
+# Headers already read, the key is the path of the edf and the value is
+# (size, modification time, header, header size). The size and modification
+# time are used to detect that a file has changed
+EDF_HEADER_CACHE_SIZE = 4096
+_edf_header_cache = OrderedDict()
+
+
+def _parse_edf_header(
+        edf_file
+) -> tuple[dict[str, str], int]:
+    """
+    Reads the ASCII header block at the start of an opened edf file.
+    The header starts with "{", ends with "}" followed by a new line
+    and is padded to a multiple of 512 bytes.
+
+    Parameters
+    ----------
+    edf_file :
+        File object opened in binary mode, positioned at the start of the file
+
+    Returns
+    -------
+    header :
+        The header as a dict of strings, like fabio
+
+    header_size :
+        Size of the header block in bytes, i.e. offset of the data
+    """
+    header_block = b""
+    end = -1
+    while end == -1:
+        chunk = edf_file.read(512)
+        if not chunk:
+            raise ValueError(f"The header of {edf_file.name} is not complete")
+        header_block += chunk
+        end = header_block.find(b"}\n", max(len(header_block) - len(chunk) - 1, 0))
+
+    header_size = end + 2
+    start = header_block.find(b"{")
+    header = {}
+    for line in header_block[start + 1:end].decode("latin-1").split("\n"):
+        if "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        header[key.strip()] = value.strip().removesuffix(";").strip()
+
+    return header, header_size
+
+
+def _edf_header_entry(
+        edf_path: str | Path
+) -> tuple[dict[str, str], int]:
+    """
+    Get the header of an edf and the size of its header block,
+    from the cache if the file has not changed
+
+    Parameters
+    ----------
+    edf_path :
+        Path of the edf file
+
+    Returns
+    -------
+    header, header_size
+    """
+    key = str(edf_path)
+    edf_stat = os.stat(edf_path)
+    cached = _edf_header_cache.get(key)
+    if cached is not None and cached[0] == edf_stat.st_size and cached[1] == edf_stat.st_mtime_ns:
+        _edf_header_cache.move_to_end(key)
+        return cached[2], cached[3]
+
+    with open(edf_path, "rb") as edf_file:
+        header, header_size = _parse_edf_header(edf_file)
+
+    _edf_header_cache[key] = (edf_stat.st_size, edf_stat.st_mtime_ns, header, header_size)
+    if len(_edf_header_cache) > EDF_HEADER_CACHE_SIZE:
+        _edf_header_cache.popitem(last=False)
+
+    return header, header_size
+
+
+def read_edf_header(
+        edf_path: str | Path
+) -> dict[str, str]:
+    """
+    Reads only the header of an edf file, without decoding the detector frame.
+    The headers are cached so that the conversion can reuse them.
+
+    Parameters
+    ----------
+    edf_path :
+        Path of the edf file
+
+    Returns
+    -------
+    The header as a dict of strings
+    """
+    header, _ = _edf_header_entry(edf_path)
+    return header
+
+
+def read_edf_data(
+        edf_path: str | Path
+) -> np.ndarray:
+    """
+    Reads the data block of an edf file, using the cached header to
+    know where it starts and how to decode it. Compressed data or data
+    types that are not known are read using fabio
+
+    Parameters
+    ----------
+    edf_path :
+        Path of the edf file
+
+    Returns
+    -------
+    The detector frame
+    """
+    header, header_size = _edf_header_entry(edf_path)
+
+    data_type = EDF_DATA_TYPES.get(header.get("DataType"))
+    byte_order = EDF_BYTE_ORDERS.get(header.get("ByteOrder", "LowByteFirst"))
+    compression = header.get("Compression", "None").lower()
+    if data_type is None or byte_order is None or compression not in ["none", ""] \
+            or "Dim_1" not in header or "Dim_2" not in header:
+        return fabio.open(edf_path).data
+
+    dtype = np.dtype(data_type).newbyteorder(byte_order)
+    shape = (int(header["Dim_2"]), int(header["Dim_1"]))
+    with open(edf_path, "rb") as edf_file:
+        edf_file.seek(header_size)
+        data = np.fromfile(edf_file, dtype=dtype, count=shape[0] * shape[1])
+
+    if data.size != shape[0] * shape[1]:
+        raise ValueError(f"The data of {edf_path} is not complete")
+
+    return data.reshape(shape)
+
+
+def edf_is_complete(
+        edf_path: str | Path
+) -> bool:
+    """
+    Checks, using only the header, that the whole data block of an edf file
+    has been written. If the header does not give the size of the data block,
+    it is computed from the dimensions and data type of the frame
+
+    Parameters
+    ----------
+    edf_path :
+        Path of the edf file
+
+    Returns
+    -------
+    True if the file is complete, False if it is not or if the size of
+    its data block can't be known
+    """
+    try:
+        header, header_size = _edf_header_entry(edf_path)
+        if "Size" in header or "EDF_BinarySize" in header:
+            data_size = int(header.get("Size", header.get("EDF_BinarySize")))
+        else:
+            data_type = EDF_DATA_TYPES.get(header.get("DataType"))
+            if data_type is None or "Dim_1" not in header or "Dim_2" not in header:
+                return False
+            data_size = int(header["Dim_1"]) * int(header["Dim_2"]) * np.dtype(data_type).itemsize
+        return os.path.getsize(edf_path) >= header_size + data_size
+    except (OSError, ValueError):
+        return False
+
+
 def generate_h5_path(
         config_dict,
         edf_path,
-        destination_folder
+        destination_folder,
+        stack: bool = False
 ):
     """
     Extremely dependent of how the files are named
@@ -525,6 +1591,10 @@ def generate_h5_path(
     destination_folder :
         Folder where the h5 file is to be saved
 
+    stack :
+        If True, the path of the stack file gathering the frames of the
+        same sample and detector is returned
+
     Returns
     -------
     h5_file_path :
@@ -532,9 +1602,7 @@ def generate_h5_path(
 
     """
     edf_name = edf_path.name
-    edf_file = EdfImage()
-    edf_file.read(edf_path)
-    edf_header = edf_file.header
+    edf_header = read_edf_header(edf_path)
 
     sample_name_key = config_dict["/ENTRY"]["content"]["/SAMPLE"]["content"]["name"]["value"]
     sample_name = edf_header.get(sample_name_key, "defaultSampleName")
@@ -551,7 +1619,10 @@ def generate_h5_path(
     else:
         detector = "other"
 
-    final_name = f"{sample_name}_{detector}_img{split_edf_name[-1]}.h5"
+    if stack:
+        final_name = f"{sample_name}_{detector}_stack.h5"
+    else:
+        final_name = f"{sample_name}_{detector}_img{split_edf_name[-1]}.h5"
     #######################
     ### Xeuss dependent ###
     #######################
@@ -673,6 +1744,35 @@ class GUI_generator(tk.Frame):
         )
         stop_button.grid(padx=10, pady=10, row=2, column=0)
 
+        # Number of workers
+        workers_label = tk.Label(
+            self.control_panel,
+            text="Number of workers",
+            font=FONT_BUTTON
+        )
+        workers_label.grid(padx=10, pady=(10, 0), row=3, column=0)
+
+        self.workers_var = tk.IntVar(value=1)
+        workers_spinbox = tk.Spinbox(
+            self.control_panel,
+            from_=1,
+            to=max(os.cpu_count() or 1, 1),
+            textvariable=self.workers_var,
+            width=5,
+            font=FONT_BUTTON
+        )
+        workers_spinbox.grid(padx=10, pady=(0, 10), row=4, column=0)
+
+        # Watch mode
+        self.watch_var = tk.IntVar(value=0)
+        watch_checkbutton = tk.Checkbutton(
+            self.control_panel,
+            text="Keep watching the queue",
+            variable=self.watch_var,
+            font=FONT_BUTTON
+        )
+        watch_checkbutton.grid(padx=10, pady=10, row=5, column=0)
+
     def _build_log_frame(self) -> None:
         self.log_panel.columnconfigure(0, weight=1)
         self.log_panel.rowconfigure(1, weight=1)
@@ -698,7 +1798,11 @@ class GUI_generator(tk.Frame):
     def start_thread(self) -> None:
         """Start the auto_generate function in a separate thread."""
         self.activate_thread = True
-        thread = threading.Thread(target=auto_generate, args=(self,), daemon=True)
+        thread = threading.Thread(
+            target=auto_generate,
+            args=(self, self.workers_var.get(), bool(self.watch_var.get())),
+            daemon=True
+        )
         thread.start()
         print_log(
             self,
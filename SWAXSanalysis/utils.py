@@ -1,6 +1,7 @@
 """
 Package-wide functions and classes
 """
+import functools
 import re
 import tkinter as tk
 from tkinter import ttk
@@ -8,18 +9,67 @@ from typing import Any
 
 import os
 import pathlib
+import warnings
+
 import h5py
 import numpy as np
 
-from . import DICT_UNIT
+try:
+    # Registers the lz4 and zstd filters, they are needed to read and write
+    # files compressed with them
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
 
+from . import DICT_UNIT
 
+# Options used to create the hdf5 files, the free space is tracked across sessions
+# so that the space of deleted datasets can be reused instead of growing the file
+H5_FILE_SPACE_OPTIONS = {
+    "fs_strategy": "fsm",
+    "fs_persist": True
+}
+
+# Compression used for each role of dataset, written as "name" or "name-level".
+# Available compressions are none, gzip, lzf and, if hdf5plugin is installed, lz4 and zstd
+COMPRESSION_POLICY = {
+    "intensity": "gzip-4",
+    "coordinates": "gzip-4",
+    "mask": "gzip-4",
+    "uncertainties": "gzip-1"
+}
+
+# Role of the datasets of a data group
+DATASET_ROLES = {
+    "I": "intensity",
+    "Q": "coordinates",
+    "Qmean": "coordinates",
+    "mask": "mask",
+    "Idev": "uncertainties",
+    "Qdev": "uncertainties"
+}
+
+
+# Patterns used by string_2_value, in the order they are tried
+NONE_PATTERN = re.compile("(^none$)|(^defaul?t$)|(^$)")
+FLOAT_PATTERN = re.compile("(^-?\\d*[.,]?\\d*$)|([+-]?\\d+(\\.\\d*)?e[+-]?\\d+$)")
+INT_PATTERN = re.compile("^-?\\d+$")
+TRUE_PATTERN = re.compile("^true$")
+FALSE_PATTERN = re.compile("^false$")
+NEXUS_NAME_PATTERN = re.compile("^[a-z]+_[a-z]+(_[a-z]+)*$")
+
+# Number of (string, unit type) whose conversion is kept by string_2_value
+STRING_CACHE_SIZE = 8192
+
+
+@functools.lru_cache(maxsize=STRING_CACHE_SIZE)
 def string_2_value(
         string: str,
         unit_type: str = None
 ) -> str | int | float | None:
     """
     Convert a string to a specific data type based on its format.
+    The conversions are memoised, a string is only parsed once for each unit type.
 
     The conversion rules are as follows:
     - Converts to `float` if the string matches a floating-point or scientific
@@ -56,23 +106,30 @@ def string_2_value(
             value = False
         else:
             value = "None"
+        return value
+
+    lower_string = string.lower()
+
+    # Fast path for the numbers, they can not match the patterns tried before
+    if string and string[0] in "-.0123456789" and FLOAT_PATTERN.search(lower_string):
+        return float(string)
 
-    elif re.search("(^none$)|(^defaul?t$)|(^$)", string.lower()):
+    if NONE_PATTERN.search(lower_string):
         value = None
 
-    elif re.search("(^-?\\d*[.,]?\\d*$)|([+-]?\\d+(\\.\\d*)?e[+-]?\\d+$)", string.lower()):
+    elif FLOAT_PATTERN.search(lower_string):
         value = float(string)
 
-    elif re.search("^-?\\d+$", string):
+    elif INT_PATTERN.search(string):
         value = int(string)
 
-    elif re.search("^true$", string.lower()):
+    elif TRUE_PATTERN.search(lower_string):
         value = True
 
-    elif re.search("^false$", string.lower()):
+    elif FALSE_PATTERN.search(lower_string):
         value = False
 
-    elif re.search("^[a-z]+_[a-z]+(_[a-z]+)*$", string.lower()):
+    elif NEXUS_NAME_PATTERN.search(lower_string):
         value = string.upper()
 
     else:
@@ -81,6 +138,71 @@ def string_2_value(
     return value
 
 
+def build_unit_registry(
+        dict_unit: dict
+) -> dict[str, tuple[str, float, float]]:
+    """
+    Builds the registry of the units, each unit is mapped to its family and to the
+    affine transformation (scale, offset) giving the value in the reference unit
+    of its family : reference value = value * scale + offset
+
+    Parameters
+    ----------
+    dict_unit :
+        Units of each family, as in structure_NXunits.json. The angles are given
+        as a number per turn and the temperatures as an offset to the Kelvin,
+        the other units as their value in the reference unit
+
+    Returns
+    -------
+    The registry, the key is the symbol of the unit
+    """
+    registry = {}
+    for family, units in dict_unit.items():
+        for symbol, value in units.items():
+            if symbol == "arbitrary":
+                continue
+            if family == "NX_ANGLE":
+                registry[symbol] = (family, 1 / value, 0.0)
+            elif family == "NX_TEMPERATURE":
+                registry[symbol] = (family, 1.0, value)
+            else:
+                registry[symbol] = (family, value, 0.0)
+    return registry
+
+
+UNIT_REGISTRY = build_unit_registry(DICT_UNIT)
+
+
+@functools.lru_cache(maxsize=None)
+def unit_factor(
+        unit_start: str,
+        unit_end: str
+) -> tuple[float, float] | None:
+    """
+    Gives the affine transformation converting a value from unit_start to unit_end :
+    converted value = value * scale + offset
+
+    Parameters
+    ----------
+    unit_start :
+        the starting unit of the value
+    unit_end :
+        the unit we want to convert it to
+
+    Returns
+    -------
+    (scale, offset), None if the units are unknown or not of the same family
+    """
+    if unit_start not in UNIT_REGISTRY or unit_end not in UNIT_REGISTRY:
+        return None
+    family_start, scale_start, offset_start = UNIT_REGISTRY[unit_start]
+    family_end, scale_end, offset_end = UNIT_REGISTRY[unit_end]
+    if family_start != family_end:
+        return None
+    return scale_start / scale_end, (offset_start - offset_end) / scale_end
+
+
 def convert(
         number: float | int,
         unit_start: str,
@@ -108,46 +230,59 @@ def convert(
     """
     if unit_start == "arbitrary" or unit_end == "arbitrary" or type(number) not in [int, float]:
         return number
-    unit_type1 = None
-    unit_type2 = None
-    for key, value in DICT_UNIT.items():
-        if unit_start in value:
-            unit_type1 = key
-
-        if unit_end in value:
-            unit_type2 = key
 
-    if unit_type1 is None or unit_type2 is None or unit_type1 != unit_type2 and not testing:
+    factor = unit_factor(unit_start, unit_end)
+    if factor is None:
+        if testing:
+            return "fail"
         tk.messagebox.showerror("Error",
                                 f"The value {number} {unit_start} could not be converted to "
                                 f"{unit_end} :\n")
-    elif unit_type1 is None or unit_type2 is None or unit_type1 != unit_type2 and testing:
-        return "fail"
-
-    unit_type = unit_type1
-
-    if unit_type == "NX_ANGLE":
-        starting_unit = DICT_UNIT[unit_type][unit_start]
-        intermediate_unit = DICT_UNIT[unit_type]["turn"]
-        ending_unit = DICT_UNIT[unit_type][unit_end]
-
-        number = number * (intermediate_unit / starting_unit)
-        number = number * (ending_unit / intermediate_unit)
-    elif unit_type == "NX_TEMPERATURE":
-        starting_unit = DICT_UNIT[unit_type][unit_start]
-        ending_unit = DICT_UNIT[unit_type][unit_end]
-        if unit_end == "C":
-            number = number - ending_unit
-        else:
-            number = number + starting_unit
-    else:
-        starting_unit = DICT_UNIT[unit_type][unit_start]
-        ending_unit = DICT_UNIT[unit_type][unit_end]
+        raise ValueError(f"The value {number} {unit_start} could not be converted to {unit_end}")
+
+    scale, offset = factor
+    if offset:
+        return number * scale + offset
+    return number * scale
+
 
-        # print(number, starting_unit, ending_unit)
-        number = number * (starting_unit / ending_unit)
+def convert_array(
+        values: np.ndarray,
+        unit_start: str,
+        unit_end: str
+) -> np.ndarray:
+    """
+    Converts an array expressed in unit_start into unit_end. Arrays of
+    floats are converted in place, the other ones are converted to floats
+
+    Parameters
+    ----------
+    values :
+        the values that need to be converted
+    unit_start :
+        the starting unit of the values
+    unit_end :
+        the unit we want to convert them to
+
+    Returns
+    -------
+    The converted values
+    """
+    values = np.asarray(values)
+    if unit_start == "arbitrary" or unit_end == "arbitrary":
+        return values
+
+    factor = unit_factor(unit_start, unit_end)
+    if factor is None:
+        raise ValueError(f"The values in {unit_start} could not be converted to {unit_end}")
 
-    return number
+    scale, offset = factor
+    if not np.issubdtype(values.dtype, np.floating):
+        values = values.astype(np.float64)
+    np.multiply(values, scale, out=values)
+    if offset:
+        np.add(values, offset, out=values)
+    return values
 
 
 def get_h5_paths(group, explore_group=False, explore_attribute=False, level=0, base_path=""):
@@ -229,7 +364,11 @@ def extract_from_h5(
         nx_file: h5py.File,
         h5path: str,
         data_type: str = "dataset",
-        attribute_name: str | None = None
+        attribute_name: str | None = None,
+        selection: tuple | slice | None = None,
+        out: np.ndarray | None = None,
+        dtype: np.dtype | type | None = None,
+        grid_as_axes: bool = False
 ) -> Any:
     """
     Method used to extract a dataset or attribute from the .h5 file
@@ -248,6 +387,22 @@ def extract_from_h5(
     attribute_name :
         if it's an attribute, give its name
 
+    selection :
+        Part of the dataset to read, for example np.s_[0, 10:20, :].
+        Only this hyperslab is read from the file. The selection of a compact
+        grid applies to the rebuilt grid. Default is the whole dataset
+
+    out :
+        Array in which the data is read directly, without intermediate copy.
+        Its shape must be the one of the selection, the data is converted to its type
+
+    dtype :
+        Type the data is converted to while it is read
+
+    grid_as_axes :
+        If True, a compact grid read without selection nor out is returned
+        as its axes (x_list, y_list) instead of being rebuilt
+
     Returns
     -------
     Either the attribute or dataset selected
@@ -264,22 +419,151 @@ def extract_from_h5(
     if data_type == "dataset" and np.shape(dataset) == ():
         return dataset[()]
     elif data_type == "dataset" and np.shape(dataset) != ():
-        return dataset[:]
+        if is_compact_grid(dataset):
+            if grid_as_axes and selection is None and out is None:
+                axes = read_compact_grid_axes(dataset)
+                return axes if dtype is None else tuple(axis.astype(dtype, copy=False) for axis in axes)
+            grid = read_compact_grid(dataset)
+            if selection is not None:
+                grid = grid[selection]
+            if out is not None:
+                out[...] = grid
+                return out
+            return grid if dtype is None else grid.astype(dtype, copy=False)
+        if out is not None:
+            dataset.read_direct(out, source_sel=selection)
+            return out
+        if selection is None:
+            selection = ()
+        if dtype is not None:
+            return dataset.astype(dtype)[selection]
+        return dataset[selection]
     elif data_type == "attribute" and attribute_name in attributes.keys():
         return attributes[attribute_name]
     else:
         return None
 
 
+def build_grid(
+        x_list: np.ndarray,
+        y_list: np.ndarray
+) -> np.ndarray:
+    """
+    Builds the coordinates of a regular grid
+
+    Parameters
+    ----------
+    x_list :
+        Horizontal axis, of length W
+
+    y_list :
+        Vertical axis, of length H
+
+    Returns
+    -------
+    Array of shape (2, H, W) containing the x and y coordinates of every point
+    """
+    return np.stack(np.meshgrid(x_list, y_list))
+
+
+def grid_axes(
+        parameter_data: np.ndarray
+) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    Get the 1D axes of a (2, H, W) array of coordinates
+
+    Parameters
+    ----------
+    parameter_data :
+        Coordinates of the grid
+
+    Returns
+    -------
+    (x_list, y_list) if the grid is regular, None otherwise
+    """
+    if np.ndim(parameter_data) != 3 or np.shape(parameter_data)[0] != 2:
+        return None
+
+    x_list = parameter_data[0, 0, :]
+    y_list = parameter_data[1, :, 0]
+    if not np.array_equal(parameter_data[0], np.broadcast_to(x_list, parameter_data.shape[1:])):
+        return None
+    if not np.array_equal(parameter_data[1], np.broadcast_to(y_list[:, None], parameter_data.shape[1:])):
+        return None
+    return x_list, y_list
+
+
+def is_compact_grid(
+        dataset: h5py.Dataset
+) -> bool:
+    """
+    Tells whether a dataset contains the axes of a grid
+    instead of the coordinates of every point
+
+    Parameters
+    ----------
+    dataset :
+        The dataset to check
+    """
+    storage = dataset.attrs.get("grid_storage")
+    if isinstance(storage, bytes):
+        storage = storage.decode("utf-8")
+    return storage == "axes"
+
+
+def read_compact_grid(
+        dataset: h5py.Dataset
+) -> np.ndarray:
+    """
+    Rebuilds the (2, H, W) coordinates of a grid stored as its axes.
+    The dataset contains the horizontal axis followed by the vertical axis
+    and its attribute grid_shape contains (H, W)
+
+    Parameters
+    ----------
+    dataset :
+        The dataset containing the axes
+
+    Returns
+    -------
+    The coordinates of every point of the grid
+    """
+    x_list, y_list = read_compact_grid_axes(dataset)
+    return build_grid(x_list, y_list)
+
+
+def read_compact_grid_axes(
+        dataset: h5py.Dataset
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reads the axes of a grid stored as its axes
+
+    Parameters
+    ----------
+    dataset :
+        The dataset containing the axes
+
+    Returns
+    -------
+    (x_list, y_list)
+    """
+    height, width = dataset.attrs["grid_shape"]
+    axes = dataset[:]
+    return axes[:width], axes[width:width + height]
+
+
 def replace_h5_dataset(
         hdf5_file: h5py.File,
         old_h5path: str,
         new_dataset: int | float | np.ndarray,
-        new_h5path: None | str = None
+        new_h5path: None | str = None,
+        compression: str | None = None
 ) -> None:
     """
     Function used to replace a dataset that's already been created
-    in a hdf5 file without changing the attributes
+    in a hdf5 file without changing the attributes.
+    If the new value has the same shape and type as the old one,
+    it is written in place
 
     Parameters
     ----------
@@ -294,7 +578,21 @@ def replace_h5_dataset(
 
     new_h5path :
         default is None. Change to change the name of the dataset as you replace it
+
+    compression :
+        Compression of the new dataset, see write_h5_dataset
     """
+    # If the dataset keeps its name, shape and type, it is overwritten in place
+    if old_h5path in hdf5_file and new_h5path in [None, old_h5path]:
+        old_dataset = hdf5_file[old_h5path]
+        same_layout = \
+            isinstance(old_dataset, h5py.Dataset) and \
+            old_dataset.shape == np.shape(new_dataset) and \
+            old_dataset.dtype == np.asarray(new_dataset).dtype
+        if same_layout:
+            old_dataset[()] = new_dataset
+            return
+
     # We get the old dataset and it's attributes and then delete it
     if old_h5path in hdf5_file:
         old_dataset = hdf5_file[old_h5path]
@@ -309,38 +607,114 @@ def replace_h5_dataset(
     else:
         h5path = old_h5path
 
+    write_h5_dataset(hdf5_file, h5path, new_dataset, attributes, compression)
+
+
+def compression_options(
+        compression: str | None
+) -> dict:
+    """
+    Translates a compression written as "name" or "name-level" (gzip-4, lzf, lz4, zstd-3, none)
+    into the keyword arguments of h5py's create_dataset
+
+    Parameters
+    ----------
+    compression :
+        The compression, None is the same as "none"
+
+    Returns
+    -------
+    The keyword arguments to use
+    """
+    if compression is None or compression.lower() == "none":
+        return {}
+
+    name, _, level = compression.lower().partition("-")
+    if name == "gzip":
+        return {
+            "compression": "gzip",
+            "compression_opts": int(level) if level else 4,
+            "shuffle": True
+        }
+    if name == "lzf":
+        return {"compression": "lzf", "shuffle": True}
+    if name in ["lz4", "zstd"]:
+        if hdf5plugin is None:
+            warnings.warn(f"hdf5plugin is not installed, {compression} replaced by gzip-4")
+            return compression_options("gzip-4")
+        if name == "lz4":
+            return dict(hdf5plugin.LZ4())
+        if level:
+            return dict(hdf5plugin.Zstd(clevel=int(level)))
+        return dict(hdf5plugin.Zstd())
+    raise ValueError(f"Unknown compression : {compression}")
+
+
+def write_h5_dataset(
+        hdf5_file: h5py.File,
+        h5path: str,
+        data: int | float | np.ndarray,
+        attributes: dict | None = None,
+        compression: str | None = None
+) -> None:
+    """
+    Function used to create a dataset in a hdf5 file, arrays are compressed
+
+    Parameters
+    ----------
+    hdf5_file :
+        File where the dataset is created
+
+    h5path :
+        Path of the new dataset
+
+    data :
+        Value of the dataset
+
+    attributes :
+        Attributes of the new dataset
+
+    compression :
+        Compression of the dataset, written as "name" or "name-level".
+        Default is the compression of the intensity in COMPRESSION_POLICY
+    """
+    if compression is None:
+        compression = COMPRESSION_POLICY["intensity"]
+
     is_scalar = \
-        np.shape(new_dataset) == ()
+        np.shape(data) == ()
 
     if not is_scalar:
         new_dataset = hdf5_file.create_dataset(
             name=h5path,
-            data=new_dataset,
-            compression="gzip",
-            compression_opts=9
+            data=data,
+            **compression_options(compression)
         )
     else:
         new_dataset = hdf5_file.create_dataset(
             name=h5path,
-            data=new_dataset
+            data=data
         )
 
-    # We add the attributes to the new dataset so that we do not lose them
-    for attr_name, attr_value in attributes.items():
-        new_dataset.attrs[attr_name] = attr_value
+    if attributes:
+        for attr_name, attr_value in attributes.items():
+            new_dataset.attrs[attr_name] = attr_value
 
 
 def save_data(
         nx_file: h5py.File,
         new_group_name: str,
         parameter_symbol: str,
-        parameter_data: np.ndarray,
+        parameter_data: np.ndarray | tuple[np.ndarray, np.ndarray],
         value_data: np.ndarray,
-        mask: np.ndarray
+        mask: np.ndarray,
+        compact_grid: bool = False,
+        compression_policy: dict | None = None
 ) -> None:
     """
     Method used to save a dataset in the h5 file.
-    if value_data is 2D, parameter_data needs to be a 3D array containing Qx and Qy.
+    if value_data is 2D, parameter_data needs to be a 3D array containing Qx and Qy,
+    or a tuple (Qx axis, Qy axis) if the grid is regular.
 
     For example :
     value_data =
@@ -376,67 +750,110 @@ def save_data(
 
     value_data :
         Contains the data
+
+    compact_grid :
+        If True and value_data is 2D on a regular grid, only the axes of the grid are
+        saved instead of the coordinates of every point. extract_from_h5 rebuilds the
+        full grid when reading it, unless it is asked for the axes
+
+    compression_policy :
+        Compression of each role of dataset (intensity, coordinates, mask, uncertainties),
+        the roles that are not given use COMPRESSION_POLICY
     """
-    # We create the dataset h5path and if it exists we delete what was previously there
     new_group_name = new_group_name.upper()
     group_path = f"/ENTRY/{new_group_name}"
-    if group_path in nx_file and new_group_name != "DATA":
-        del nx_file[group_path]
-    if new_group_name != "DATA":
-        nx_file.copy("ENTRY/DATA", nx_file["/ENTRY"], new_group_name)
-
-    # we replace the raw data with the new data
-    # Concerning Q
-    replace_h5_dataset(
-        nx_file,
-        f"{group_path}/Q",
-        parameter_data,
-        f"{group_path}/{parameter_symbol}"
-    )
-    replace_h5_dataset(
-        nx_file,
-        f"{group_path}/Qdev",
-        np.zeros(np.shape(parameter_data))
-    )
-    replace_h5_dataset(
-        nx_file,
-        f"{group_path}/Qmean",
-        np.mean(parameter_data)
-    )
-    # Concerning I
-    replace_h5_dataset(
-        nx_file,
-        f"{group_path}/I",
-        value_data
-    )
-    replace_h5_dataset(
-        nx_file,
-        f"{group_path}/Idev",
-        np.zeros(np.shape(value_data))
-    )
-    # Concerning the mask
-    replace_h5_dataset(
-        nx_file,
-        f"{group_path}/mask",
-        mask
-    )
+    source_path = "/ENTRY/DATA"
+
+    # We only need the axes if the grid is to be saved compactly
+    axes = None
+    if isinstance(parameter_data, tuple):
+        axes = parameter_data
+    elif compact_grid:
+        axes = grid_axes(parameter_data)
+
+    if axes is not None and compact_grid:
+        parameter_mean = np.mean([np.mean(axes[0]), np.mean(axes[1])])
+        parameter_data = np.concatenate(axes)
+    else:
+        if axes is not None:
+            parameter_data = build_grid(*axes)
+        parameter_mean = np.mean(parameter_data)
 
     dim = len(np.shape(value_data))
+
+    # The datasets of the group, each one is associated to the dataset of
+    # ENTRY/DATA whose attributes it inherits
+    new_datasets = {
+        parameter_symbol: ("Q", parameter_data),
+        "Qmean": ("Qmean", parameter_mean),
+        "I": ("I", value_data),
+        "Idev": ("Idev", np.zeros(np.shape(value_data)))
+    }
+    if dim == 1:
+        new_datasets["Qdev"] = ("Qdev", np.zeros(np.shape(parameter_data)))
+    else:
+        new_datasets["mask"] = ("mask", mask)
+
+    policy = dict(COMPRESSION_POLICY)
+    if compression_policy:
+        policy.update(compression_policy)
+
+    source_attributes = {}
+    for source_name in ["Q", "Qmean", "Qdev", "I", "Idev", "mask"]:
+        if f"{source_path}/{source_name}" in nx_file:
+            source_attributes[source_name] = dict(nx_file[f"{source_path}/{source_name}"].attrs)
+        else:
+            source_attributes[source_name] = {}
+
+    # The datasets that already exist are overwritten in place when possible, this avoids
+    # leaving unused space in the file when a process is applied again
+    if group_path in nx_file:
+        group = nx_file[group_path]
+        if new_group_name == "DATA":
+            # The raw data group may contain other datasets defined by the settings
+            old_names = ["Q", "Qmean", "Qdev", "I", "Idev", "mask"]
+        else:
+            old_names = list(group.keys())
+        for dataset_name in old_names:
+            if dataset_name in group and dataset_name not in new_datasets:
+                del group[dataset_name]
+    else:
+        group = nx_file.create_group(group_path)
+
+    # The other groups get the attributes of the raw data group
+    if new_group_name != "DATA":
+        for attr_name, attr_value in nx_file[source_path].attrs.items():
+            group.attrs[attr_name] = attr_value
+
+    for dataset_name, (source_name, dataset_value) in new_datasets.items():
+        dataset_path = f"{group_path}/{dataset_name}"
+        compression = policy[DATASET_ROLES[source_name]]
+        if dataset_path in nx_file:
+            replace_h5_dataset(nx_file, dataset_path, dataset_value, compression=compression)
+            for attr_name, attr_value in source_attributes[source_name].items():
+                nx_file[dataset_path].attrs[attr_name] = attr_value
+        else:
+            write_h5_dataset(
+                nx_file,
+                dataset_path,
+                dataset_value,
+                source_attributes[source_name],
+                compression
+            )
+
+    parameter_attributes = group[parameter_symbol].attrs
+    if axes is not None and compact_grid:
+        parameter_attributes["grid_storage"] = "axes"
+        parameter_attributes["grid_shape"] = [len(axes[1]), len(axes[0])]
+    else:
+        for attr_name in ["grid_storage", "grid_shape"]:
+            if attr_name in parameter_attributes:
+                del parameter_attributes[attr_name]
+
     if dim == 1:
-        if f"{group_path}/mask" in nx_file:
-            del nx_file[f"{group_path}/mask"]
-
-        if f"{group_path}" in nx_file:
-            del nx_file[f"{group_path}"].attrs["I_axes"]
-            del nx_file[f"{group_path}"].attrs["Q_indices"]
-            del nx_file[f"{group_path}"].attrs["mask_indices"]
-
-        nx_file[f"{group_path}"].attrs["I_axes"] = [parameter_symbol]
-        nx_file[f"{group_path}"].attrs["Q_indices"] = [0]
-        nx_file[f"{group_path}"].attrs["mask_indices"] = [0]
-    elif dim == 2:
-        if f"{group_path}/Qdev" in nx_file:
-            del nx_file[f"{group_path}/Qdev"]
+        group.attrs["I_axes"] = [parameter_symbol]
+        group.attrs["Q_indices"] = [0]
+        group.attrs["mask_indices"] = [0]
 
 
 def delete_data(
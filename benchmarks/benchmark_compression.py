@@ -0,0 +1,103 @@
+"""
+Benchmark of the compressions available for the datasets of a data group.
+A detector frame and the datasets that go with it are written with every
+compression, the write throughput and the size of each dataset are printed.
+
+Usage :
+    python benchmarks/benchmark_compression.py [--repeat 5]
+"""
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.utils import build_grid, write_h5_dataset, hdf5plugin
+
+COMPRESSIONS = ["none", "gzip-9", "gzip-4", "gzip-1", "lzf"]
+if hdf5plugin is not None:
+    COMPRESSIONS += ["lz4", "zstd-3"]
+
+
+def create_datasets(
+        height: int = 1062,
+        width: int = 1028
+) -> dict[str, np.ndarray]:
+    """
+    Creates datasets resembling the ones of a converted Eiger frame
+
+    Parameters
+    ----------
+    height :
+        Number of rows of the frame
+
+    width :
+        Number of columns of the frame
+
+    Returns
+    -------
+    The datasets, indexed by their role
+    """
+    rng = np.random.default_rng(0)
+    x_list = np.linspace(-0.04, 0.04, width, dtype=np.float32)
+    y_list = np.linspace(0.04, -0.04, height, dtype=np.float32)
+    grid = build_grid(x_list, y_list)
+
+    # Scattering decreasing with the distance to the beam center
+    distance = np.sqrt(grid[0] ** 2 + grid[1] ** 2)
+    intensity = rng.poisson(1e4 / (1 + (distance / 1e-3) ** 2)).astype(np.float32)
+    mask = np.zeros((1, height, width), dtype=bool)
+    mask[0, :, 510:518] = True
+
+    return {
+        "intensity": intensity,
+        "coordinates": grid,
+        "mask": mask,
+        "uncertainties": np.zeros((height, width))
+    }
+
+
+def benchmark(
+        repeat: int
+) -> None:
+    """
+    Writes the datasets with every compression and prints the results
+
+    Parameters
+    ----------
+    repeat :
+        Number of times each dataset is written, the best time is kept
+    """
+    datasets = create_datasets()
+    print(f"{'compression':<12}{'role':<15}{'MB/s':>10}{'size (MB)':>12}{'ratio':>8}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = pathlib.Path(temp_dir) / "benchmark.h5"
+        for compression in COMPRESSIONS:
+            for role, data in datasets.items():
+                best_time = np.inf
+                for _ in range(repeat):
+                    with h5py.File(file_path, "w") as h5_file:
+                        start = time.perf_counter()
+                        write_h5_dataset(h5_file, "data", data, compression=compression)
+                        h5_file.flush()
+                        best_time = min(best_time, time.perf_counter() - start)
+                        stored_size = h5_file["data"].id.get_storage_size()
+
+                print(
+                    f"{compression:<12}{role:<15}"
+                    f"{data.nbytes / best_time / 1e6:>10.1f}"
+                    f"{stored_size / 1e6:>12.2f}"
+                    f"{data.nbytes / max(stored_size, 1):>8.1f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the dataset compressions")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of writes per dataset")
+    arguments = parser.parse_args()
+    benchmark(arguments.repeat)
@@ -0,0 +1,107 @@
+"""
+Benchmark of the display of 2D data. A q-space map the size of an Eiger 1M
+frame is drawn on a grid of panels with pcolormesh, as before, and with
+render_2d, the time to draw one panel is printed.
+
+Usage :
+    python benchmarks/benchmark_display.py [--panels 4] [--repeat 3]
+"""
+import argparse
+import pathlib
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.class_nexus_file import render_2d, display_range_max
+from SWAXSanalysis.utils import build_grid
+
+
+def create_map(
+        height: int = 1062,
+        width: int = 1028
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Creates a q-space map resembling the one of a converted Eiger frame
+
+    Parameters
+    ----------
+    height :
+        Number of rows of the map
+
+    width :
+        Number of columns of the map
+
+    Returns
+    -------
+    The (2, H, W) coordinates and the (H, W) intensity
+    """
+    rng = np.random.default_rng(0)
+    qx_list = np.linspace(-0.3, 0.05, width)
+    qy_list = np.linspace(0.05, -0.3, height)
+    grid = build_grid(qx_list, qy_list)
+    q_norm = np.sqrt(grid[0] ** 2 + grid[1] ** 2)
+    intensity = rng.poisson(1e3 / (1 + (q_norm / 0.01) ** 2)).astype(np.float32)
+    intensity[:, 510:518] = np.nan
+    return grid, intensity
+
+
+def draw_pcolormesh(ax, grid, intensity, percentile):
+    return ax.pcolormesh(
+        grid[0], grid[1], intensity,
+        vmin=0,
+        vmax=np.percentile(intensity[~np.isnan(intensity)], percentile),
+        cmap="plasma"
+    )
+
+
+def draw_render_2d(ax, grid, intensity, percentile):
+    return render_2d(ax, grid, intensity, display_range_max(intensity, percentile))
+
+
+def benchmark(
+        panels: int,
+        repeat: int
+) -> None:
+    """
+    Draws the panels with both methods and prints the time per panel
+
+    Parameters
+    ----------
+    panels :
+        Number of panels of the figure, like a batch display
+
+    repeat :
+        Number of times the figure is drawn, the best time is kept
+    """
+    grid, intensity = create_map()
+    dims = int(np.ceil(np.sqrt(panels)))
+    print(f"{panels} panels of {intensity.shape[0]} x {intensity.shape[1]} pixels")
+    print(f"{'method':<15}{'s/panel':>10}")
+    for name, draw in [("pcolormesh", draw_pcolormesh), ("render_2d", draw_render_2d)]:
+        best_time = np.inf
+        for _ in range(repeat):
+            fig, axes = plt.subplots(dims, dims, figsize=(12, 12), squeeze=False)
+            start = time.perf_counter()
+            for index in range(panels):
+                ax = axes[index // dims, index % dims]
+                fig.colorbar(draw(ax, grid, intensity, 99), ax=ax)
+            fig.canvas.draw()
+            best_time = min(best_time, time.perf_counter() - start)
+            plt.close(fig)
+        print(f"{name:<15}{best_time / panels:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the display of 2D data")
+    parser.add_argument("--panels", type=int, default=4, help="Number of panels of the figure")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times the figure is drawn")
+    arguments = parser.parse_args()
+    benchmark(arguments.panels, arguments.repeat)
@@ -0,0 +1,183 @@
+"""
+Benchmark of string_2_value on the header of a Xeuss edf file. The header
+of a series of frames is converted value by value, like the conversion does,
+with the previous implementation (regular expressions compiled on every call)
+and with the current one (precompiled and memoised). The throughput in values
+per second is printed.
+
+Usage :
+    python benchmarks/benchmark_string_2_value.py [--frames 1000] [--repeat 5]
+"""
+import argparse
+import pathlib
+import re
+import sys
+import time
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.utils import string_2_value
+
+# Header of a frame of the Eiger 1M of a Xeuss, the values marked as changing
+# are different for every frame of a series
+XEUSS_HEADER = {
+    "EDF_DataBlockID": "0.Image.Psd",
+    "EDF_BinarySize": "4366944",
+    "EDF_HeaderSize": "2048",
+    "ByteOrder": "LowByteFirst",
+    "DataType": "SignedInteger",
+    "Dim_1": "1028",
+    "Dim_2": "1062",
+    "Image": "1",
+    "HeaderID": "EH:000001:000000:000000",
+    "Size": "4366944",
+    "Date": "2025-04-29 14:32:17",
+    "count_time": "600.0",
+    "detect_name": "Dectris EIGER2 Si 1M, S/N E-02-0299",
+    "x_p_size": "7.5e-05",
+    "y_p_size": "7.5e-05",
+    "x_center": "512.341",
+    "y_center": "987.126",
+    "x_beam_stop": "0",
+    "y_beam_stop": "0",
+    "SampleDistance": "0.6412",
+    "samp_det_dist": "0.6412",
+    "WaveLength": "1.5419e-10",
+    "incident_wav": "0.15419",
+    "incident_angle": "0",
+    "experiment_geo": "transmission",
+    "rot_x": "0",
+    "rot_y": "0",
+    "rot_z": "0",
+    "s1hl": "0.35",
+    "s1hr": "0.35",
+    "s1vb": "0.35",
+    "s1vt": "0.35",
+    "s2hl": "0.2",
+    "s2hr": "0.2",
+    "s2vb": "0.2",
+    "s2vt": "0.2",
+    "detx": "-12.5",
+    "detz": "3.25",
+    "sample_x": "10.0",
+    "sample_z": "-4.5",
+    "sample_name": "Eprouvette_AluMg",
+    "sample_thickness": "0.2",
+    "pressure": "0.08",
+    "temperature": "25.3",
+    "do_absolute": "false",
+    "dbpath": "default",
+    "comment": "None",
+}
+CHANGING_KEYS = ["Date", "Image", "HeaderID", "pressure", "temperature", "sample_x"]
+
+
+def legacy_string_2_value(
+        string: str,
+        unit_type: str = None
+) -> str | int | float | None:
+    """
+    string_2_value before its patterns were precompiled and its results memoised
+    """
+    if unit_type is not None and string == "":
+        if unit_type == "NX_NUMBER":
+            value = 0.0
+        elif unit_type == "NX_CHAR":
+            value = "N/A"
+        elif unit_type == "NX_DATE_TIME":
+            value = "0000-00-00T00:00:00"
+        elif unit_type == "NX_BOOLEAN":
+            value = False
+        else:
+            value = "None"
+    elif re.search("(^none$)|(^defaul?t$)|(^$)", string.lower()):
+        value = None
+    elif re.search("(^-?\\d*[.,]?\\d*$)|([+-]?\\d+(\\.\\d*)?e[+-]?\\d+$)", string.lower()):
+        value = float(string)
+    elif re.search("^-?\\d+$", string):
+        value = int(string)
+    elif re.search("^true$", string.lower()):
+        value = True
+    elif re.search("^false$", string.lower()):
+        value = False
+    elif re.search("^[a-z]+_[a-z]+(_[a-z]+)*$", string.lower()):
+        value = string.upper()
+    else:
+        value = string
+    return value
+
+
+def create_headers(
+        frames: int
+) -> list[dict[str, str]]:
+    """
+    Creates the headers of a series of frames
+
+    Parameters
+    ----------
+    frames :
+        Number of frames of the series
+
+    Returns
+    -------
+    The headers
+    """
+    headers = []
+    for frame in range(frames):
+        header = dict(XEUSS_HEADER)
+        header["Date"] = f"2025-04-29 14:{frame // 60 % 60:02d}:{frame % 60:02d}"
+        header["Image"] = str(frame + 1)
+        header["HeaderID"] = f"EH:{frame + 1:06d}:000000:000000"
+        header["pressure"] = f"{0.08 + frame * 1e-4:.4f}"
+        header["temperature"] = f"{25 + frame * 0.01:.2f}"
+        header["sample_x"] = f"{10 + frame * 0.05:.2f}"
+        headers.append(header)
+    return headers
+
+
+def benchmark(
+        frames: int,
+        repeat: int
+) -> None:
+    """
+    Converts the headers with both implementations and prints the results
+
+    Parameters
+    ----------
+    frames :
+        Number of frames of the series
+
+    repeat :
+        Number of times the series is converted, the best time is kept
+    """
+    headers = create_headers(frames)
+    values = [value for header in headers for value in header.values()]
+
+    # Both implementations give the same values
+    for value in values[:len(XEUSS_HEADER)]:
+        assert string_2_value(value, "NX_NUMBER") == legacy_string_2_value(value, "NX_NUMBER")
+
+    print(f"{len(values)} values, {len(CHANGING_KEYS)} of the {len(XEUSS_HEADER)} keys change per frame")
+    print(f"{'implementation':<20}{'values/s':>14}{'speed up':>10}")
+    reference = None
+    for name, function in [("legacy", legacy_string_2_value), ("memoised", string_2_value)]:
+        best_time = float("inf")
+        for _ in range(repeat):
+            if function is string_2_value:
+                string_2_value.cache_clear()
+            start = time.perf_counter()
+            for value in values:
+                function(value, "NX_NUMBER")
+            best_time = min(best_time, time.perf_counter() - start)
+
+        if reference is None:
+            reference = best_time
+        print(f"{name:<20}{len(values) / best_time:>14.0f}{reference / best_time:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of string_2_value")
+    parser.add_argument("--frames", type=int, default=1000, help="Number of frames of the series")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of conversions of the series")
+    arguments = parser.parse_args()
+    benchmark(arguments.frames, arguments.repeat)
@@ -0,0 +1,40 @@
+"""
+Testing module for the compact storage of the
+coordinate grids of 2D data
+"""
+
+import h5py
+import numpy as np
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.utils import save_data, extract_from_h5, build_grid, is_compact_grid
+
+
+def test_compact_grid(tmp_path):
+    x_list = np.linspace(-1, 1, 7)
+    y_list = np.linspace(2, -2, 5)
+    intensity = np.arange(35, dtype=np.float32).reshape(5, 7)
+    mask = np.zeros((1, 5, 7), dtype=bool)
+
+    with h5py.File(tmp_path / "test_grid.h5", "w") as h5_file:
+        h5_file.create_group("ENTRY/DATA")
+        save_data(h5_file, "DATA", "Q", build_grid(x_list, y_list), intensity, mask)
+        save_data(h5_file, "DATA_COMPACT", "Q", (x_list, y_list), intensity, mask, compact_grid=True)
+
+        assert not is_compact_grid(h5_file["ENTRY/DATA/Q"])
+        assert is_compact_grid(h5_file["ENTRY/DATA_COMPACT/Q"])
+        assert h5_file["ENTRY/DATA_COMPACT/Q"].shape == (12,)
+
+        # The full grid is rebuilt when reading the data
+        assert np.array_equal(
+            extract_from_h5(h5_file, "ENTRY/DATA_COMPACT/Q"),
+            extract_from_h5(h5_file, "ENTRY/DATA/Q")
+        )
+
+        # Or given as its axes when they are enough
+        compact_x, compact_y = extract_from_h5(h5_file, "ENTRY/DATA_COMPACT/Q", grid_as_axes=True)
+        assert np.array_equal(compact_x, x_list) and np.array_equal(compact_y, y_list)
+        assert extract_from_h5(h5_file, "ENTRY/DATA/Q", grid_as_axes=True).shape == (2, 5, 7)
@@ -13,7 +13,8 @@ import pathlib
 
 sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
-from SWAXSanalysis.nxfile_generator import generate_nexus
+from SWAXSanalysis.nxfile_generator import generate_nexus, read_edf_header, read_edf_data, edf_is_complete
+from SWAXSanalysis.nxfile_generator import QueueWatcher
 from .utils import *
 
 
@@ -27,3 +28,53 @@ def test_basic_conversion():
     )
 
     delete_files()
+
+
+def test_edf_header_only_reading():
+    edf_path = create_file()
+
+    edf_file = fabio.open(edf_path)
+    assert read_edf_header(edf_path) == dict(edf_file.header)
+    assert np.array_equal(read_edf_data(edf_path), edf_file.data)
+    assert edf_is_complete(edf_path)
+
+    delete_files()
+
+
+def test_edf_completeness_without_size(tmp_path):
+    edf_path = create_file()
+    content = pathlib.Path(edf_path).read_bytes()
+    delete_files()
+
+    # The size keys are renamed, the size of the data block comes from the dimensions
+    content = content.replace(b"EDF_BinarySize", b"EDF_BinarySizf").replace(b"\nSize", b"\nSizf")
+    complete_path = tmp_path / "complete_0_00001.edf"
+    complete_path.write_bytes(content)
+    assert "Size" not in read_edf_header(complete_path)
+    assert edf_is_complete(complete_path)
+
+    truncated_path = tmp_path / "truncated_0_00001.edf"
+    truncated_path.write_bytes(content[:-100])
+    assert not edf_is_complete(truncated_path)
+
+
+def test_watcher_prime(tmp_path):
+    edf_path = create_file()
+    content = pathlib.Path(edf_path).read_bytes()
+    delete_files()
+
+    complete_path = tmp_path / "complete_0_00001.edf"
+    complete_path.write_bytes(content)
+    written_path = tmp_path / "written_0_00002.edf"
+    written_path.write_bytes(content[:-100])
+
+    # The file still being written at start-up is pushed once it is complete
+    watcher = QueueWatcher(tmp_path, stable_time=0)
+    watcher.prime()
+    assert watcher.known == {complete_path}
+    assert list(watcher.pending.keys()) == [written_path]
+    assert watcher.scan() == []
+
+    written_path.write_bytes(content)
+    assert watcher.scan() == []
+    assert watcher.scan() == [written_path]
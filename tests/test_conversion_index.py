@@ -0,0 +1,45 @@
+"""
+Testing module for the conversion index used by
+auto_generate to skip the edf already converted
+"""
+
+import os
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.nxfile_generator import ConversionIndex
+
+
+def test_conversion_index(tmp_path):
+    edf_path = tmp_path / "test_0_00001.edf"
+    edf_path.write_bytes(b"0" * 512)
+    index_path = tmp_path / "conversion_index.jsonl"
+
+    index = ConversionIndex(index_path)
+    assert index.lookup(edf_path) is None
+
+    h5_path = tmp_path / "testSample_SAXS_00001.h5"
+    h5_path.write_bytes(b"")
+    index.record(edf_path, h5_path, "error", "test error")
+    index.record(edf_path, h5_path)
+
+    # The index is persistent and the last entry wins
+    entry = ConversionIndex(index_path).lookup(edf_path)
+    assert entry["status"] == "done"
+    assert entry["h5"] == str(h5_path)
+
+    # A deleted hdf5 file has to be converted again
+    h5_path.unlink()
+    assert ConversionIndex(index_path).lookup(edf_path) is None
+    h5_path.write_bytes(b"")
+
+    # A modified edf is not considered as converted anymore
+    edf_path.write_bytes(b"0" * 1024)
+    assert ConversionIndex(index_path).lookup(edf_path) is None
+
+    # Interrupted writes are ignored
+    with open(index_path, "a", encoding="utf-8") as index_file:
+        index_file.write('{"edf": "trunc')
+    assert len(ConversionIndex(index_path).entries) == 1
@@ -0,0 +1,32 @@
+"""
+Testing module for the cost model
+estimating the duration of the processes
+"""
+
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.data_processing import ProcessCostModel, COST_SMOOTHING
+
+
+def test_cost_model(tmp_path):
+    cost_path = tmp_path / "process_costs.json"
+    cost_model = ProcessCostModel(cost_path)
+    assert cost_model.estimate("process_q_space", 10, 10 ** 7) is None
+
+    cost_model.record("process_q_space", 4, 4 * 10 ** 6, 8.0)
+    assert abs(cost_model.estimate("process_q_space", 10, 10 ** 7) - 20.0) < 1e-9
+    assert abs(cost_model.estimate("process_q_space", 10) - 20.0) < 1e-9
+
+    # The costs are kept on disk and the new runs are smoothed in
+    cost_model = ProcessCostModel(cost_path)
+    cost_model.record("process_q_space", 2, 2 * 10 ** 6, 8.0)
+    seconds_per_file = (1 - COST_SMOOTHING) * 2.0 + COST_SMOOTHING * 4.0
+    assert abs(cost_model.estimate("process_q_space", 1) - seconds_per_file) < 1e-9
+    assert ProcessCostModel(cost_path).costs["process_q_space"]["runs"] == 2
+
+    # An unreadable file is ignored
+    cost_path.write_text("{", encoding="utf-8")
+    assert ProcessCostModel(cost_path).costs == {}
@@ -0,0 +1,101 @@
+"""
+Testing module for the decimation
+of the curves of a batch display
+and for the export of the displays
+"""
+
+import shutil
+
+import numpy as np
+import pytest
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from matplotlib.figure import Figure
+
+from SWAXSanalysis.class_nexus_file import NexusFile, decimate_min_max, export_figure, render_2d
+from SWAXSanalysis.nxfile_generator import generate_nexus
+from SWAXSanalysis.utils import build_grid
+from .utils import *
+
+
+def test_decimate_min_max():
+    param_data = np.arange(10000, dtype=np.float64)
+    value_data = np.sin(param_data / 50)
+    value_data[300] = 9
+    value_data[5000:5100] = np.nan
+
+    decimated_param, decimated_value = decimate_min_max(param_data, value_data, 100)
+    assert len(decimated_value) <= 200
+    assert np.all(np.diff(decimated_param) > 0)
+    assert np.nanmax(decimated_value) == 9
+    assert np.nanmin(decimated_value) == np.nanmin(value_data)
+
+    # Short curves are kept as they are
+    short_param, short_value = decimate_min_max(param_data[:150], value_data[:150], 100)
+    assert np.array_equal(short_value, value_data[:150])
+
+
+def test_render_2d_axes():
+    x_list, y_list = np.linspace(-1, 1, 40), np.linspace(1, -1, 30)
+    grid = build_grid(x_list, y_list)
+    values = grid[0] ** 2 + grid[1] ** 2
+
+    # The axes of a grid are drawn like its full coordinates
+    for uneven_x in [x_list, x_list ** 3]:
+        ax_grid, ax_axes = Figure().subplots(1, 2)
+        from_grid = render_2d(ax_grid, build_grid(uneven_x, y_list), values, 1)
+        from_axes = render_2d(ax_axes, (uneven_x, y_list), values, 1)
+        assert type(from_grid) is type(from_axes)
+        assert np.array_equal(from_grid.get_array(), from_axes.get_array())
+        assert ax_grid.get_xlim() == ax_axes.get_xlim()
+
+
+def test_export_figure(tmp_path):
+    param_data = np.linspace(1e-3, 1e-1, 500)
+    curves = [(param_data, param_data ** -index, f"file_{index}", index) for index in range(3)]
+    curve_spec = {
+        "dimension": 1, "items": curves, "file_number": 3, "batch": True,
+        "legend": False, "axes_options": {"title": "Curves"}
+    }
+    assert export_figure(curve_spec, tmp_path / "curves.svg") == str(tmp_path / "curves.svg")
+    assert (tmp_path / "curves.svg").stat().st_size > 0
+
+    grid = build_grid(np.linspace(-1, 1, 40), np.linspace(1, -1, 30))
+    map_spec = {
+        "dimension": 2, "items": [(grid, grid[0] ** 2 + grid[1] ** 2)], "file_number": 1,
+        "batch": False, "percentile": 99, "label_x": "", "label_y": "", "title": "Map"
+    }
+    export_figure(map_spec, tmp_path / "map.png")
+    assert (tmp_path / "map.png").read_bytes().startswith(b"\x89PNG")
+
+
+def test_batch_display_missing_group(tmp_path):
+    processed_path = pathlib.Path(generate_nexus(
+        edf_path=create_file(),
+        hdf5_path=tmp_path / "testSample_SAXS_00001.h5",
+        settings_path=pathlib.Path(".\\settings_EDF2NX_testMachine_202507281529.json").absolute()
+    ))
+    delete_files()
+    unprocessed_path = tmp_path / "testSample_SAXS_00002.h5"
+    shutil.copy(processed_path, unprocessed_path)
+
+    nx_object = NexusFile([processed_path])
+    try:
+        nx_object.process_q_space(save=True)
+        nx_object.process_radial_average(save=True)
+    finally:
+        nx_object.nexus_close()
+
+    # The last file lacks the group, the batch figure still holds the curve of the first one
+    nx_object = NexusFile([processed_path, unprocessed_path], do_batch=True, export_dir=tmp_path / "exports")
+    try:
+        with pytest.warns(UserWarning, match="DATA_RAD_AVG"):
+            nx_object.process_display("DATA_RAD_AVG")
+        exported_paths = nx_object.wait_exports()
+    finally:
+        nx_object.nexus_close()
+
+    assert [pathlib.Path(path).name for path in exported_paths] == ["batch_DATA_RAD_AVG.png"]
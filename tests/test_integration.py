@@ -0,0 +1,102 @@
+"""
+Testing module for the batched integration engine
+"""
+
+import shutil
+
+import numpy as np
+import sys
+import pathlib
+
+from pyFAI import detectors
+from pyFAI.azimuthalIntegrator import AzimuthalIntegrator
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.class_nexus_file import NexusFile
+from SWAXSanalysis.integration import get_csr_integrator
+from SWAXSanalysis.nxfile_generator import generate_nexus
+from .utils import *
+
+
+def test_csr_integrator():
+    detector = detectors.Detector(75e-6, 75e-6, max_shape=(200, 180))
+    integrator = AzimuthalIntegrator(detector=detector)
+    integrator.setFit2D(1000, 90, 100)
+    integrator.wavelength = 1e-10
+
+    shape = (200, 180)
+    mask = np.zeros(shape, dtype=bool)
+    mask[:, :10] = True
+    csr_integrator = get_csr_integrator(
+        integrator, ("test",), shape, mask, (0, 0.05), (-180, 180), 50
+    )
+    assert get_csr_integrator(
+        integrator, ("test",), shape, mask, (0, 0.05), (-180, 180), 50
+    ) is csr_integrator
+
+    # A frame equal to the solid angle of the pixels gives 1 in every bin
+    solid_angle = integrator.solidAngleArray(shape, absolute=True)
+    intensity = csr_integrator.integrate(solid_angle)
+    assert np.allclose(intensity[intensity != csr_integrator.empty], 1)
+
+    # A stack gives the same result as the frames one by one
+    rng = np.random.default_rng(0)
+    frames = rng.random((3, *shape))
+    stack_intensity = csr_integrator.integrate(frames)
+    for frame, frame_intensity in zip(frames, stack_intensity):
+        assert np.allclose(csr_integrator.integrate(frame), frame_intensity)
+
+
+def test_csr_matches_smi(tmp_path):
+    hdf5_path = pathlib.Path(generate_nexus(
+        edf_path=create_file(),
+        hdf5_path=tmp_path / "testSample_SAXS_00001.h5",
+        settings_path=pathlib.Path(".\\settings_EDF2NX_testMachine_202507281529.json").absolute()
+    ))
+    delete_files()
+
+    results = {}
+    for engine in ["smi", "csr"]:
+        nx_object = NexusFile([hdf5_path])
+        try:
+            nx_object.process_radial_average(engine=engine)
+            nx_object.process_azimuthal_average(engine=engine)
+            smi_data = nx_object.list_smi_data[hdf5_path.name]
+            results[engine] = [
+                np.array(data) for data in [smi_data.q_rad, smi_data.I_rad, smi_data.chi_azi, smi_data.I_azi]
+            ]
+        finally:
+            nx_object.nexus_close()
+
+    # The bins left below the float32 precision of smi_analysis are not compared
+    for smi_data, csr_data in zip(results["smi"], results["csr"]):
+        assert smi_data.shape == csr_data.shape
+        assert np.allclose(csr_data, smi_data, rtol=1e-3, atol=1e-6 * np.max(np.abs(smi_data)))
+
+
+def test_integration_progress(tmp_path):
+    hdf5_paths = [pathlib.Path(generate_nexus(
+        edf_path=create_file(),
+        hdf5_path=tmp_path / "testSample_SAXS_00001.h5",
+        settings_path=pathlib.Path(".\\settings_EDF2NX_testMachine_202507281529.json").absolute()
+    ))]
+    delete_files()
+    for index in [2, 3]:
+        hdf5_paths.append(tmp_path / f"testSample_SAXS_0000{index}.h5")
+        shutil.copy(hdf5_paths[0], hdf5_paths[-1])
+
+    # Each file is reported once it is integrated, not only once its result is saved
+    for engine, integrated_numbers in [("smi", [1, 2, 3]), ("csr", [3, 3, 3])]:
+        reports = []
+
+        def progress_handler(done, total):
+            integrated_number = sum(len(smi_data.I_rad) > 0 for smi_data in nx_object.list_smi_data.values())
+            reports.append((done, total, integrated_number))
+
+        nx_object = NexusFile(hdf5_paths, progress_handler=progress_handler)
+        try:
+            nx_object.process_radial_average(engine=engine)
+        finally:
+            nx_object.nexus_close()
+        assert reports == [(done, 3, number) for done, number in zip([1, 2, 3], integrated_numbers)]
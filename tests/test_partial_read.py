@@ -0,0 +1,40 @@
+"""
+Testing module for the partial reads
+of extract_from_h5
+"""
+
+import h5py
+import numpy as np
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.utils import save_data, extract_from_h5, build_grid
+
+
+def test_partial_read(tmp_path):
+    x_list = np.linspace(-1, 1, 7)
+    y_list = np.linspace(2, -2, 5)
+    intensity = np.arange(35, dtype=np.float64).reshape(5, 7)
+    mask = np.zeros((1, 5, 7), dtype=bool)
+
+    with h5py.File(tmp_path / "test_read.h5", "w") as h5_file:
+        h5_file.create_group("ENTRY/DATA")
+        save_data(h5_file, "DATA", "Q", (x_list, y_list), intensity, mask)
+        save_data(h5_file, "DATA_COMPACT", "Q", (x_list, y_list), intensity, mask, compact_grid=True)
+
+        selection = np.s_[1:3, 2:6]
+        assert np.array_equal(extract_from_h5(h5_file, "ENTRY/DATA/I", selection=selection), intensity[selection])
+
+        buffer = np.empty((2, 4), dtype=np.float32)
+        extract_from_h5(h5_file, "ENTRY/DATA/I", selection=selection, out=buffer)
+        assert np.array_equal(buffer, intensity[selection])
+        assert extract_from_h5(h5_file, "ENTRY/DATA/I", dtype=np.float32).dtype == np.float32
+
+        # The selection of a compact grid applies to the rebuilt grid
+        grid_selection = np.s_[:, 1:3, 2:6]
+        assert np.array_equal(
+            extract_from_h5(h5_file, "ENTRY/DATA_COMPACT/Q", selection=grid_selection),
+            build_grid(x_list, y_list)[grid_selection]
+        )
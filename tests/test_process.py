@@ -68,4 +68,8 @@ def test_processes():
         for group in list_created_paths:
             group_obj = h5py_file_obj.get(group, False)
             assert group_obj
+
+        # The default thickness is written as an integer, the transmission with the precision of the intensity
+        assert h5py_file_obj["ENTRY/SAMPLE/thickness"].dtype == np.int64
+        assert h5py_file_obj["ENTRY/SAMPLE/transmission"].dtype == h5py_file_obj["ENTRY/DATA/I"].dtype
     delete_files()
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Testing module for the cache holding the raw
+data read by NexusFile
+"""
+
+import shutil
+import weakref
+
+import numpy as np
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.class_nexus_file import NexusFile, RawDataCache
+from SWAXSanalysis.nxfile_generator import generate_nexus
+from .utils import *
+
+
+def test_raw_data_cache():
+    loaded = []
+
+    def loader(name):
+        def load():
+            loaded.append(name)
+            return np.zeros(250_000)  # 2 MB
+        return load
+
+    cache = RawDataCache(memory_budget=5)
+    cache.get(("file_1", "I"), loader("file_1"))
+    cache.get(("file_2", "I"), loader("file_2"))
+    cache.get(("file_1", "I"), loader("file_1"))
+    assert loaded == ["file_1", "file_2"]
+
+    # file_2 is the least recently used, it is dropped to stay under 5 MB
+    cache.get(("file_3", "I"), loader("file_3"))
+    assert list(cache.entries.keys()) == [("file_1", "I"), ("file_3", "I")]
+    assert cache.memory == 4e6
+
+    cache.get(("file_2", "I"), loader("file_2"))
+    assert loaded == ["file_1", "file_2", "file_3", "file_2"]
+
+
+def test_raw_data_budget(tmp_path):
+    hdf5_paths = [pathlib.Path(generate_nexus(
+        edf_path=create_file(),
+        hdf5_path=tmp_path / "testSample_SAXS_00001.h5",
+        settings_path=pathlib.Path(".\\settings_EDF2NX_testMachine_202507281529.json").absolute()
+    ))]
+    delete_files()
+    hdf5_paths.append(tmp_path / "testSample_SAXS_00002.h5")
+    shutil.copy(hdf5_paths[0], hdf5_paths[1])
+
+    results = {}
+    for raw_data_budget in [None, 1]:
+        nx_object = NexusFile(hdf5_paths, raw_data_budget=raw_data_budget)
+        try:
+            nx_object.process_q_space()
+            nx_object.process_radial_average()
+            first_frame = weakref.ref(nx_object._raw_data(hdf5_paths[0].name, "I"))
+            nx_object.process_radial_average()
+            results[raw_data_budget] = nx_object.list_smi_data[hdf5_paths[0].name].I_rad
+            if raw_data_budget is not None:
+                # The SMI geometries no longer hold the frames, so the evicted ones are freed
+                for smi_data in nx_object.list_smi_data.values():
+                    assert np.array_equal(smi_data.imgs, []) and np.array_equal(smi_data.img_st, [])
+                assert first_frame() is None
+        finally:
+            nx_object.nexus_close()
+
+    assert np.array_equal(results[None], results[1])
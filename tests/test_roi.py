@@ -0,0 +1,50 @@
+"""
+Testing module for the region of interest
+used by the transmission
+"""
+
+import h5py
+import numpy as np
+import pytest
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.class_nexus_file import beam_roi_size, roi_window
+
+
+def write_sizes(h5_file, beam_size_x, beam_size_y, beam_unit):
+    for axis, beam_size in [("x", beam_size_x), ("y", beam_size_y)]:
+        beam_dataset = h5_file.create_dataset(f"ENTRY/INSTRUMENT/SOURCE/beam_size_{axis}", data=beam_size)
+        beam_dataset.attrs["units"] = beam_unit
+        pixel_dataset = h5_file.create_dataset(f"ENTRY/INSTRUMENT/DETECTOR/{axis}_pixel_size", data=7.5e-5)
+        pixel_dataset.attrs["units"] = "m"
+
+
+def test_beam_roi_size(tmp_path):
+    # A 0.5 x 0.3 mm beam on 75 µm pixels
+    with h5py.File(tmp_path / "beam_m.h5", "w") as h5_file:
+        write_sizes(h5_file, 5e-4, 3e-4, "m")
+        assert beam_roi_size(h5_file) == (4, 2)
+
+    with h5py.File(tmp_path / "beam_mm.h5", "w") as h5_file:
+        write_sizes(h5_file, 0.5, 0.3, "mm")
+        assert beam_roi_size(h5_file) == (4, 2)
+
+    # An unknown beam size gives the smallest region of interest
+    with h5py.File(tmp_path / "beam_zero.h5", "w") as h5_file:
+        write_sizes(h5_file, 0.0, 0.0, "m")
+        with pytest.warns(UserWarning):
+            assert beam_roi_size(h5_file) == (1, 1)
+
+
+def test_roi_window():
+    rows, columns = roi_window((10, 20), (0.4, 2.5), (40, 30))
+    assert (rows, columns) == (slice(17, 23), slice(9, 11))
+    assert np.ones((40, 30))[rows, columns].size == 12
+
+    with pytest.raises(ValueError, match="pixels"):
+        roi_window((10, 20), (0, 2), (40, 30))
+    with pytest.raises(ValueError, match="outside"):
+        roi_window((100, 20), (2, 2), (40, 30))
@@ -0,0 +1,61 @@
+"""
+Testing module for the stacking of several frames
+into a single NeXus file
+"""
+
+import json
+import shutil
+
+import h5py
+import numpy as np
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.class_nexus_file import NexusFile
+from SWAXSanalysis.nxfile_generator import append_to_stack, stacked_edf_names, read_edf_data
+from .utils import *
+
+
+def test_stack(tmp_path):
+    with open(".\\settings_EDF2NX_testMachine_202507281529.json", "r", encoding="utf-8") as config_file:
+        config_dict = json.load(config_file)
+    config_dict["options"] = {"output_mode": "stack"}
+    settings_path = tmp_path / "settings.json"
+    with open(settings_path, "w", encoding="utf-8") as config_file:
+        json.dump(config_dict, config_file)
+
+    edf_paths = [tmp_path / f"test_0_0000{index}.edf" for index in range(1, 4)]
+    for edf_path in edf_paths:
+        shutil.copy(create_file(), edf_path)
+    delete_files()
+
+    stack_path = tmp_path / "test_SAXS_stack.h5"
+    for edf_path in edf_paths:
+        append_to_stack(edf_path, stack_path, settings_path)
+
+    assert stacked_edf_names(stack_path) == {edf_path.name for edf_path in edf_paths}
+    with h5py.File(stack_path, "r") as stack_file:
+        assert stack_file["ENTRY/DATA/I"].shape == (3, DIMS[1], DIMS[0])
+        assert stack_file["ENTRY/DATA/I"].chunks == (1, DIMS[1], DIMS[0])
+        assert np.array_equal(stack_file["ENTRY/DATA/frame"][()], [0, 1, 2])
+        assert np.array_equal(
+            stack_file["ENTRY/DATA/I"][2],
+            np.array(read_edf_data(edf_paths[2]), dtype=np.float32)
+        )
+
+    # A frame of the stack is processed like a single file
+    nx_object = NexusFile([stack_path], frame=1)
+    try:
+        assert np.array_equal(
+            nx_object._raw_data(stack_path.name, "I"),
+            np.array(read_edf_data(edf_paths[1]), dtype=np.float32)
+        )
+        assert nx_object._raw_data(stack_path.name, "mask").shape == (1, DIMS[1], DIMS[0])
+        nx_object.process_q_space(save=True)
+    finally:
+        nx_object.nexus_close()
+
+    with h5py.File(stack_path, "r") as stack_file:
+        assert stack_file["ENTRY/DATA_Q_SPACE/I"].shape == (DIMS[1], DIMS[0])
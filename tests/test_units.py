@@ -0,0 +1,27 @@
+"""
+Testing module for the conversion of units
+"""
+
+import numpy as np
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from SWAXSanalysis.utils import convert, convert_array
+
+
+def test_units():
+    assert np.isclose(convert(1.5, "mm", "m"), 1.5e-3)
+    assert np.isclose(convert(180.0, "deg", "rad"), np.pi)
+    assert np.isclose(convert(25.0, "C", "K"), 298.15)
+    assert convert(25.0, "C", "C") == 25.0
+    assert convert(3.0, "arbitrary", "m") == 3.0
+    assert convert(1.0, "m", "s", testing=True) == "fail"
+
+    # The arrays of floats are converted in place
+    values = np.array([0.0, 100.0])
+    converted = convert_array(values, "C", "K")
+    assert converted is values
+    assert np.allclose(values, [273.15, 373.15])
+    assert np.allclose(convert_array(np.array([1, 2]), "1/nm", "1/angstrom"), [0.1, 0.2])